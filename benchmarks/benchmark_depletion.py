@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""benchmark_depletion
+
+Benchmarks of the depletion solvers on the default 1743-nuclide library.
+
+The following cases are executed with the cross sections and composition of
+``pyIsoDep.tests.pregenerated_xs``:
+    - cram_single_step: a single full-library CRAM depletion step
+    - irradiation: an irradiation history of 100 steps
+    - decay_cooling: decay-only cooling up to 1E+06 years
+    - xs_interpolation: ``XsInterface`` interpolation over a 1000-point trace
+    - hdf5_results: HDF5 export and recovery of the irradiation ``Results``
+    - library_load: ``TransmutationData`` read from the HDF5 library, from
+      its memory-mapped cache, and from the process-wide registry
+
+The wall time (best of ``--repeat`` executions), the peak memory allocated
+during an additional execution (traced with ``tracemalloc``), and the
+throughput in steps/s and nuclide-steps/s are written to a JSON file, which
+allows to track performance regressions between versions. The setup of the
+cases (e.g., reading the library) is not timed.
+
+Usage:
+    python benchmarks/benchmark_depletion.py --output benchmarks.json
+    python benchmarks/benchmark_depletion.py --cases cram_single_step \
+        irradiation --steps 20
+
+"""
+
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import scipy
+
+from pyIsoDep.functions.maindepletionsolver import MainDepletion
+from pyIsoDep.functions.generatedata import TransmutationData
+from pyIsoDep.functions.libraryregistry import LIBRARY_REGISTRY
+from pyIsoDep.functions.postprocessresults import Results
+from pyIsoDep.functions.xsinterface import XsInterface
+
+from pyIsoDep.tests.pregenerated_xs import flux, ID, N0, sig_c,\
+    sig_c2m, sig_n2n, sig_n3n, sig_f
+
+STEP_DAYS = 5.0  # length of the irradiation steps in days
+COOLING_YEARS = 1E+06  # longest cooling time in years
+COOLING_STEPS = 40  # number of logarithmic cooling steps
+XS_STATES = [500.0, 600.0, 700.0]  # states (e.g. temperatures) of the xs sets
+XS_PERTURBATION = 0.05  # relative change of the cross sections per state
+VOL = 1.0  # volume in cm**3
+
+
+def _library(scale=1.0):
+    """Full library with the cross sections multiplied by ``scale``"""
+    data = TransmutationData(libraryFlag=True, wgtFY=1.0)
+    data.ReadData(ID, sig_f=scale*sig_f, sig_c=scale*sig_c,
+                  sig_c2m=scale*sig_c2m, sig_n2n=scale*sig_n2n,
+                  sig_n3n=scale*sig_n3n, flagBarns=False)
+    return data
+
+
+def _deplete(data, nsteps, opts):
+    """Depletion with a constant flux for ``nsteps`` steps"""
+    dep = MainDepletion(0.0, data)
+    dep.SetDepScenario(power=None, flux=[flux]*nsteps, timeUnits="days",
+                       timesteps=[STEP_DAYS]*nsteps, timepoints=None)
+    dep.SetInitialComposition(ID, N0, vol=VOL)
+    dep.SolveDepletion(method=opts.method, sparse=opts.sparse)
+    return dep
+
+
+def cramSingleStep(data, opts):
+    """A single CRAM depletion step of the full library"""
+
+    def run():
+        _deplete(data, 1, opts)
+
+    return run, {"steps": 1, "nuclides": data.nIsotopes}
+
+
+def irradiation(data, opts):
+    """Depletion over ``opts.steps`` irradiation steps"""
+
+    def run():
+        _deplete(data, opts.steps, opts)
+
+    return run, {"steps": opts.steps, "nuclides": data.nIsotopes}
+
+
+def decayCooling(data, opts):
+    """Decay-only cooling up to ``COOLING_YEARS`` on a logarithmic mesh"""
+
+    timepoints = np.append(0.0, np.logspace(
+        -3.0, np.log10(COOLING_YEARS*365.25), COOLING_STEPS))
+
+    def run():
+        dep = MainDepletion(0.0, data)
+        dep.SetDepScenario(power=None, flux=[0.0]*COOLING_STEPS,
+                           timeUnits="days", timepoints=timepoints)
+        dep.SetInitialComposition(ID, N0, vol=VOL)
+        dep.SolveDecay(method=opts.method, sparse=opts.sparse)
+
+    return run, {"steps": COOLING_STEPS, "nuclides": data.nIsotopes}
+
+
+def xsInterpolation(data, opts):
+    """Linear interpolation of the xs sets over ``opts.points`` points
+
+    Each interpolated set holds dense matrices of the full library (~50 MB),
+    so the trace is interpolated in chunks of ``opts.chunk`` points and the
+    sets of a chunk are released before the next one.
+
+    """
+
+    xssets = [_library(1.0 + XS_PERTURBATION*idx)
+              for idx in range(len(XS_STATES))]
+    xs = XsInterface(numdepn=1, numpert=len(XS_STATES),
+                     states=[[state] for state in XS_STATES], xssets=xssets)
+    timepoints = np.linspace(0.0, 100.0, opts.points)
+    trace = XS_STATES[1] + 0.99*(XS_STATES[-1] - XS_STATES[1]) *\
+        np.sin(0.1*timepoints)
+
+    def run():
+        for first in range(0, opts.points, opts.chunk):
+            last = first + opts.chunk
+            xs.setTimeTrace(timepoints[first:last], trace[first:last])
+        xs.xsTimeSets = None
+
+    return run, {"steps": opts.points, "nuclides": data.nIsotopes}
+
+
+def hdf5Results(data, opts):
+    """Export and recovery of the results of an irradiation history"""
+
+    dep = _deplete(data, opts.steps, opts)
+    dep.DecayHeat()
+    dep.Radiotoxicity()
+    dep.Activity()
+    dep.Mass()
+    dep.Reactivity()
+    res = Results(dep)
+    info = {"steps": opts.steps, "nuclides": data.nIsotopes}
+
+    def run():
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "results.h5")
+            res.export(filename)
+            Results(filename)
+            info["megabytes"] = os.path.getsize(filename) / 1E+06
+
+    return run, info
+
+
+def libraryLoad(data, opts):
+    """Library data sets read from the HDF5 file, the cache, and registry"""
+
+    tmpdir = tempfile.TemporaryDirectory()  # removed with the case
+    cachedir = tmpdir.name
+    TransmutationData(libraryFlag=True, wgtFY=1.0, cache=cachedir)
+    info = {"steps": 1, "nuclides": data.nIsotopes}
+
+    def run():
+        LIBRARY_REGISTRY.clear()  # the library is read again
+        tic = time.perf_counter()
+        TransmutationData(libraryFlag=True, wgtFY=0.5)
+        info["hdf5Time"] = time.perf_counter() - tic
+        LIBRARY_REGISTRY.clear()
+        tic = time.perf_counter()
+        TransmutationData(libraryFlag=True, wgtFY=0.5, cache=cachedir)
+        info["cacheTime"] = time.perf_counter() - tic
+        tic = time.perf_counter()
+        TransmutationData(libraryFlag=True, wgtFY=0.5)
+        info["registryTime"] = time.perf_counter() - tic
+
+    run.tmpdir = tmpdir
+    return run, info
+
+
+CASES = {"cram_single_step": cramSingleStep,
+         "irradiation": irradiation,
+         "decay_cooling": decayCooling,
+         "xs_interpolation": xsInterpolation,
+         "hdf5_results": hdf5Results,
+         "library_load": libraryLoad}
+
+
+def measure(run, info, repeat=1, memory=True):
+    """Wall time, peak memory, and throughput of a benchmark case
+
+    Parameters
+    ----------
+    run : callable
+        Executes the benchmark case
+    info : dict
+        Number of ``steps`` and ``nuclides`` of the case
+    repeat : int, optional
+        Number of timed executions, of which the fastest is reported
+    memory : bool, optional
+        Flag to trace the peak memory in an additional execution
+
+    Returns
+    -------
+    dict
+        ``walltime`` in s, ``peakMemoryMB``, ``stepsPerSecond``, and
+        ``nuclideStepsPerSecond``, together with the entries of ``info``
+
+    """
+
+    walltimes = []
+    for _ in range(repeat):
+        tic = time.perf_counter()
+        run()
+        walltimes.append(time.perf_counter() - tic)
+    walltime = min(walltimes)
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        run()
+        peak = tracemalloc.get_traced_memory()[1] / 1E+06
+        tracemalloc.stop()
+
+    result = dict(info)
+    result.update({
+        "walltime": walltime,
+        "walltimes": walltimes,
+        "peakMemoryMB": peak,
+        "stepsPerSecond": info["steps"] / walltime,
+        "nuclideStepsPerSecond": info["nuclides"] * info["steps"] / walltime})
+    return result
+
+
+def environment():
+    """Versions of the packages and description of the machine"""
+    try:
+        from importlib.metadata import version
+        pyIsoDepVersion = version("pyIsoDep")
+    except ImportError:  # also raised if the package is not installed
+        pyIsoDepVersion = None
+    return {"pyIsoDep": pyIsoDepVersion,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "scipy": scipy.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpus": os.cpu_count(),
+            "date": datetime.now().isoformat(timespec="seconds")}
+
+
+def main(argv=None):
+    """Execute the selected cases and write the results to a JSON file"""
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--output", default="benchmarks.json",
+                        help="JSON file with the results")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES),
+                        default=list(CASES), help="benchmark cases")
+    parser.add_argument("--method", default="cram",
+                        help="depletion method (default: cram)")
+    parser.add_argument("--sparse", action="store_true",
+                        help="solve with sparse Bateman matrices")
+    parser.add_argument("--steps", type=int, default=100,
+                        help="number of irradiation steps")
+    parser.add_argument("--points", type=int, default=1000,
+                        help="number of points of the xs trace")
+    parser.add_argument("--chunk", type=int, default=10,
+                        help="number of xs trace points kept in memory")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="number of timed executions of each case")
+    parser.add_argument("--no-memory", dest="memory", action="store_false",
+                        help="skip the tracing of the peak memory")
+    opts = parser.parse_args(argv)
+
+    data = _library()
+    results = {"environment": environment(), "method": opts.method,
+               "sparse": opts.sparse, "cases": {}}
+    for name in opts.cases:
+        run, info = CASES[name](data, opts)
+        results["cases"][name] = measure(run, info, opts.repeat, opts.memory)
+        case = results["cases"][name]
+        print("{:<18} {:10.3f} s {:12.1f} steps/s {:14.4g} nuclide-steps/s"
+              .format(name, case["walltime"], case["stepsPerSecond"],
+                      case["nuclideStepsPerSecond"]))
+
+    with open(opts.output, "w") as f:
+        json.dump(results, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,488 @@
+"""batchdepletion
+
+Depletion of multiple materials (e.g., fuel regions) that share the same
+transmutation data and time grid, but have different initial compositions
+and power/flux histories.
+
+All the materials are solved together in each depletion step. Materials
+that share the same flux also share the Bateman matrix, and are solved with a
+single multi right-hand side solve, i.e. the matrix is built and factorized
+only once for all of them. Materials with different fluxes (e.g., different
+powers) have different Bateman matrices, so that each of them is still
+factorized. The ``cram`` solver factorizes and solves the matrices of
+``nthreads`` fluxes in a single pass, in which all their pole systems are
+solved concurrently.
+
+"""
+
+import time
+
+import numpy as np
+from scipy.sparse import csc_matrix
+
+from pyIsoDep.functions.maindepletionsolver import MainDepletion
+from pyIsoDep.functions.instrumentation import Instrumentation
+from pyIsoDep.functions.batemansolvers import CramSolver
+from pyIsoDep.functions.stepstorage import STORAGE_WINDOW
+from pyIsoDep.functions.checkerrors import _inlist, _isequallength,\
+    _anynegative, _is1darray, _exp2dshape, _ispositiveArray, _isint,\
+    _ispositive
+from pyIsoDep.functions.header import TRANSMUATION_ATTR, TIME_UNITS_DICT
+
+BATCH_METHODS = ["cram", "expm"]  # solvers that support multiple materials
+BATCH_INTEGRATORS = ["ce", "cecm"]  # integrators for multiple materials
+
+# results of a solution that are shared by all the materials
+BATCH_SHARED_RESULTS = ["XS", "nsubsteps", "stepSolvers", "solverStats",
+                        "profile", "_solveTime", "_xsintrp"]
+
+
+def _singleMaterial(name):
+    """A method of MainDepletion that is only defined for a single material"""
+
+    def method(self, *args, **kwargs):
+        raise TypeError("{0} is not defined for multiple materials. Use "
+                        "GetRegion(region).{0}() for each material"
+                        .format(name))
+    method.__name__ = name
+    method.__doc__ = """Not defined for multiple materials
+
+        Raises
+        ------
+        TypeError
+            Always. ``GetRegion(region).{}()`` applies the method to a
+            single material.
+
+        """.format(name)
+    return method
+
+
+class BatchDepletion(MainDepletion):
+    """A class to deplete multiple materials with a single solver
+
+    The materials share the transmutation data sets and the time grid,
+    and the initial compositions and power/flux histories are provided for
+    each material. The class inherits the scenario and solution methods of
+    ``MainDepletion``, but stores the concentrations for all the materials.
+    The post-processing methods (e.g., ``DecayHeat`` or ``Reactivity``),
+    ``NoDepletion``, and ``Resume`` are only defined for a single material,
+    and raise a ``TypeError``. ``GetRegion`` returns a ``MainDepletion``
+    object of a single material, to which they can be applied.
+
+    Only the materials with an identical flux in a step share the Bateman
+    matrix and are solved with a single multi right-hand side solve. The
+    materials of a power history usually have different fluxes, so that
+    each of them gets its own factorization, as with separate
+    ``MainDepletion`` objects. With ``solveropts={"nthreads": n}`` the
+    ``cram`` pole systems of ``n`` materials are solved concurrently,
+    instead of only the pole systems of a single material.
+
+    Parameters
+    ----------
+    timeframes : array
+        Time frames for all the stored objects (can be used to interpolate xs)
+    argv : TransmutationData Objects
+        Arguments for all the inputted class object/container that contains
+        the data, such as decay constants, IDs, etc.
+
+    Attributes
+    ----------
+    nregions : int
+        Number of materials depleted together
+    Nt : 3-dim array or StepArray
+        Concentrations for all the isotopes, materials, and time points
+
+    Examples
+    --------
+    >>> dep = BatchDepletion(0.0, data)
+    >>> dep.SetDepScenario(power=[[1E+6, 1E+6], [2E+6, 2E+6]],
+    >>>                    timeUnits="days", timesteps=[10., 10.])
+    >>> dep.SetInitialComposition([922350, 922380], [[0.02, 0.2],
+    >>>                                              [0.03, 0.2]])
+    >>> dep.SolveDepletion("cram", sparse=True)
+    >>> dep1 = dep.GetRegion(1)
+
+    """
+
+    def SetDepScenario(self, power=None, flux=None, timeUnits="seconds",
+                       timesteps=None, timepoints=None):
+        """Define a depletion or decay scenario for all the materials
+
+        Parameters
+        ----------
+        power : 2-dim array
+            Absolute power in Watts for each material (rows) and depletion
+            step (columns). A 1-dim array is used for all the materials.
+        flux : 2-dim array
+            Absolute flux in n/cm**2/s for each material (rows) and
+            depletion step (columns). A 1-dim array is used for all the
+            materials.
+        timesteps : array
+            Depletion time-steps/intervals in sec, min, hr, days
+        timepoints : array
+            Depletion time-points in sec, min, hr, days
+        timeUnits : string
+            Time units {"seconds", "minutes", "hours", "days"}
+
+        Raises
+        ------
+        ValueError
+            If any of the arrays have neagtive values or are not of equal size
+            If timesteps and timepoints are not provided
+            If neither power nor flux are provided
+
+        """
+
+        if power is not None:
+            history = np.array(power, dtype=float, ndmin=2)
+        elif flux is not None:
+            history = np.array(flux, dtype=float, ndmin=2)
+        else:
+            raise ValueError("Either power or flux must be provided")
+
+        # time-steps and power/flux of the first material are checked here
+        MainDepletion.SetDepScenario(
+            self, power=None if power is None else list(history[0]),
+            flux=None if power is not None else list(history[0]),
+            timeUnits=timeUnits, timesteps=timesteps, timepoints=timepoints)
+
+        _anynegative(history, "power/flux history")
+        if history.shape[1] != self.nsteps:
+            raise ValueError("power/flux history must have {} steps and not "
+                             "{}".format(self.nsteps, history.shape[1]))
+        if self.flagPower:
+            self.power = history
+            self.flux = np.zeros(history.shape)
+        else:
+            self.flux = history
+            self.power = np.zeros(history.shape)
+
+    def SetInitialComposition(self, ID, N0, vol=1.0):
+        """Set initial composition for all the materials
+
+        Parameters
+        ----------
+        ID : array
+            Identification of isotopes following ZZAAA0/1 format
+        N0 : 2-dim array
+            Isotopic concentrations #/cm/b for each material (rows) and
+            isotope (columns)
+        vol : float or array
+            Volume of each material in cm**3
+
+        Attributes
+        ----------
+        N0 : 2-dim array
+            Initial concentrations for all the isotopes (rows) and
+            materials (columns)
+        nregions : int
+            Number of materials
+
+        Raises
+        ------
+        ValueError
+            If ID or N0 contain negative values
+            If the number of columns in N0 differs from the length of ID
+            If the volumes are not positive
+
+        """
+
+        ID = np.array(ID, dtype=int)
+        _is1darray(ID, "Isotopic IDs")
+        _anynegative(ID, "Isotopic IDs")
+        _isequallength(ID, len(np.unique(ID)),
+                       "ID contains identical isotopes")
+        N0 = np.array(N0, dtype="float64", ndmin=2)
+        nregions = N0.shape[0]
+        _exp2dshape(N0, (nregions, len(ID)), "Isotopic Concentrations")
+        _anynegative(N0, "Isotopic Concentrations")
+        vol = np.array(vol, dtype="float64", ndmin=1)
+        if len(vol) == 1:
+            vol = vol[0] * np.ones(nregions)
+        _isequallength(vol, nregions, "Volumes")
+        _ispositiveArray(vol, "Volumes")
+
+        # Remap provided isotopes to the full list pre-generated in datafile
+        vals, idxFull, idxPart =\
+            np.intersect1d(self.fullId, ID, assume_unique=True,
+                           return_indices=True)
+        self.N0 = np.zeros((self.nIsotopes, nregions))
+        self.N0[idxFull, :] = N0[:, idxPart].transpose()
+        self.providedN0 = N0
+        self.providedID = ID
+        self.volume = vol
+        self.nregions = nregions
+
+    def SolveDepletion(self, method="cram", xsinterp=False, rtol=1E-10,
+                       sparse=False, solveropts=None, integrator="ce",
+                       substeps=1, storage=None, window=STORAGE_WINDOW):
+        """Solve the Bateman equations for all the materials
+
+        Parameters
+        ----------
+        method : str
+            Method used to solve the Bateman equations {"cram", "expm"}
+        xsinterp : bool
+            Flag to indicate whether interpolation in between timesteps is
+            allowed to be performed for the transmutation data.
+        rtol : float, optional
+            Not used by the batch solvers. Kept for a consistent interface.
+        sparse : bool, optional
+            Flag to indicate whether the Bateman matrices are passed to the
+            solver in a sparse (CSC) format.
+        solveropts : dict, optional
+            Additional keyword arguments passed to the solver of ``method``
+        integrator : str, optional
+            Time integration scheme {"ce", "cecm"}. The default is "ce".
+        substeps : int, optional
+            Number of substeps in each depletion step. The flux of each
+            material is re-normalized to its power in each substep. The
+            default is 1.
+        storage : str, optional
+            Name of an HDF5 file to which ``Nt`` is streamed step by step.
+            The default is None, i.e. ``Nt`` is kept in memory.
+        window : int, optional
+            Number of time points of ``Nt`` kept in memory when ``storage``
+            is used. The default is ``STORAGE_WINDOW``.
+
+        Attributes
+        ----------
+        Nt : 3-dim array or StepArray
+            Concentrations for all the isotopes, materials, and time points
+        XS : XsHistory
+            Weighted cross sections for all the isotopes as a function of
+            time (shared by all the materials)
+        nsubsteps : 1-dim array
+            Number of substeps used in each depletion step
+
+        Raises
+        ------
+        KeyError
+            If ``method`` or ``integrator`` do not support multiple
+            materials.
+        ValueError
+            If the power/flux or initial compositions are not defined for
+            the same number of materials.
+
+        """
+
+        _inlist(method, "Method to solve multiple materials", BATCH_METHODS)
+        _inlist(integrator, "Integrator for multiple materials",
+                BATCH_INTEGRATORS)
+        _isint(substeps, "Number of substeps")
+        _ispositive(substeps, "Number of substeps")
+        singleDepletion = self._setSolver(method, rtol, solveropts)
+        if self.power.shape[0] == 1:
+            self.power = np.tile(self.power, (self.nregions, 1))
+            self.flux = np.tile(self.flux, (self.nregions, 1))
+        _isequallength(self.power, self.nregions, "power/flux history")
+
+        # All data sets must contain the required attributes
+        for key, data in self._xsDataSets.items():
+            for attr in TRANSMUATION_ATTR:
+                if not hasattr(data, attr):
+                    raise ValueError("No attribute <{}> in data for time={}"
+                                     .format(attr, key))
+
+        # Nt will store the concentrations as a function of time
+        # XS will store all the weighted cross sections as a function of time
+        self._allocateSteps(storage, window, xs=True)
+        self.profile = Instrumentation(self.nsteps)
+        profile = self.profile
+        self.nsubsteps = np.full(self.nsteps, substeps)
+        self.stepSolvers = [method] * self.nsteps
+
+        tic = time.perf_counter()  # start timer
+        for idx, dt in enumerate(self.timesteps):
+            profile.startStep(idx, singleDepletion)
+
+            # Obtain the interpolated fission energy, xs, and transmutation mtx
+            # -----------------------------------------------------------------
+            with profile.timer("xs"):
+                fissE, sigf, transmutationmtx, _ =\
+                    self._getInterpXS(self.timepoints[idx], xsinterp)
+            self._recordXS(idx, xsinterp)
+
+            # Power/flux normalization for all the materials
+            # -----------------------------------------------------------------
+            n0 = self.Nt[..., idx]
+            self.flux[:, idx] = self._regionFlux(idx, n0, sigf, fissE)
+            if not self.flagPower:
+                with profile.timer("normalization"):
+                    self.power[:, idx] = self.flux[:, idx] *\
+                        ((sigf * fissE) @ n0 * self.volume)
+
+            # Solve all the materials
+            # -----------------------------------------------------------------
+            ddt = dt / substeps
+            rates = (self.flux[:, idx], transmutationmtx)
+            for sub in range(substeps):
+                if sub > 0:  # the cross sections of the step are kept
+                    rates = (self._regionFlux(idx, n0, sigf, fissE),
+                             transmutationmtx)
+                if integrator == "cecm":
+                    # predictor to the middle of the substep, corrector with
+                    # the rates of the middle
+                    nMid = self._solveBatch(singleDepletion, *rates, n0,
+                                            ddt/2, sparse)
+                    rates = self._batchRates(nMid, idx, (sub+0.5)*ddt,
+                                             xsinterp)
+                n0 = self._solveBatch(singleDepletion, *rates, n0, ddt,
+                                      sparse)
+            self.Nt[..., idx+1] = n0
+            profile.endStep(singleDepletion)
+
+        self._flushSteps()
+        toc = time.perf_counter()
+        self._solveTime = toc - tic
+        self._xsintrp = xsinterp
+        self.solverStats = getattr(singleDepletion, "stats", None)
+
+    def SolveDecay(self, method="cram", rtol=1E-10, sparse=False,
+                   solveropts=None, storage=None, window=STORAGE_WINDOW):
+        """Solve the Bateman equations with only the decay chains
+
+        All the materials are solved with a single multi right-hand side
+        solve in each step.
+
+        Parameters
+        ----------
+        method : str
+            Method used to solve the decay chains {"cram", "expm"}
+        rtol : float, optional
+            Not used by the batch solvers. Kept for a consistent interface.
+        sparse : bool, optional
+            Flag to indicate whether the decay matrix is passed to the
+            solver in a sparse (CSC) format.
+        solveropts : dict, optional
+            Additional keyword arguments passed to the solver of ``method``
+        storage : str, optional
+            Name of an HDF5 file to which ``Nt`` is streamed step by step.
+            The default is None, i.e. ``Nt`` is kept in memory.
+        window : int, optional
+            Number of time points of ``Nt`` kept in memory when ``storage``
+            is used. The default is ``STORAGE_WINDOW``.
+
+        """
+
+        _inlist(method, "Method to solve multiple materials", BATCH_METHODS)
+        singleDepletion = self._setSolver(method, rtol, solveropts)
+
+        self._allocateSteps(storage, window, xs=False)
+        self.profile = Instrumentation(self.nsteps)
+        profile = self.profile
+        self.stepSolvers = [method] * self.nsteps
+
+        tic = time.perf_counter()
+        with profile.timer("matrix"):
+            mtxA = self.decaymtx
+            if sparse:
+                mtxA = csc_matrix(mtxA)
+        for idx, dt in enumerate(self.timesteps):
+            profile.startStep(idx, singleDepletion)
+            with profile.timer("solver"):
+                self.Nt[..., idx+1] =\
+                    singleDepletion.solve(mtxA, self.Nt[..., idx], dt)
+            profile.endStep(singleDepletion)
+        self._flushSteps()
+        toc = time.perf_counter()
+        self._solveTime = toc - tic
+        self.solverStats = getattr(singleDepletion, "stats", None)
+
+    def GetRegion(self, region):
+        """Obtain a depletion object for a single material
+
+        The returned object is a ``MainDepletion`` container with the results
+        of a single material, so that all the post-processing methods (e.g.
+        ``DecayHeat``) and the ``Results`` container can be used. The cross
+        sections (``XS``), profile, and substeps are shared with the batch.
+
+        Parameters
+        ----------
+        region : int
+            Index of the material
+
+        Returns
+        -------
+        MainDepletion
+            Depletion object of the material
+
+        """
+
+        _isint(region, "Index of the material")
+        if not 0 <= region < self.nregions:
+            raise ValueError("Index of the material must be in the [0,{}] "
+                             "range and not {}"
+                             .format(self.nregions-1, region))
+
+        datasets = [self._xsDataSets[timeframe]
+                    for timeframe in self._timeframes]
+        dep = MainDepletion(self._timeframes, *datasets)
+        dep.SetInitialComposition(self.providedID, self.providedN0[region],
+                                  vol=self.volume[region])
+
+        # the scenario is copied, since the flux of a power history is solved
+        for attr in ["usertimesteps", "timesteps", "timepoints", "timeunits",
+                     "nsteps", "flagPower"]:
+            setattr(dep, attr, getattr(self, attr))
+        dep.power = self.power[region, :].copy()
+        dep.flux = self.flux[region, :].copy()
+
+        if hasattr(self, "Nt"):
+            dep.Nt = np.array(self.Nt[:, region, :])
+            for attr in BATCH_SHARED_RESULTS:
+                if hasattr(self, attr):
+                    setattr(dep, attr, getattr(self, attr))
+        return dep
+
+    PostProcess = _singleMaterial("PostProcess")
+    DecayHeat = _singleMaterial("DecayHeat")
+    Radiotoxicity = _singleMaterial("Radiotoxicity")
+    Activity = _singleMaterial("Activity")
+    Mass = _singleMaterial("Mass")
+    Reactivity = _singleMaterial("Reactivity")
+    NoDepletion = _singleMaterial("NoDepletion")
+    Resume = _singleMaterial("Resume")
+
+    def _regionFlux(self, idx, n, sigf, fissE):
+        """Flux of each material for the concentrations n in step idx"""
+        if not self.flagPower:
+            return self.flux[:, idx]
+        with self.profile.timer("normalization"):
+            return self.power[:, idx] / ((sigf * fissE) @ n * self.volume)
+
+    def _batchRates(self, n, idx, t, xsinterp):
+        """Flux of each material and transmutation matrix at time t [s]"""
+        currtime = self.timepoints[idx] + t / TIME_UNITS_DICT[self.timeunits]
+        with self.profile.timer("xs"):
+            fissE, sigf, transmutationmtx, _ =\
+                self._getInterpXS(currtime, xsinterp)
+        return self._regionFlux(idx, n, sigf, fissE), transmutationmtx
+
+    def _solveBatch(self, singleDepletion, flux, transmutationmtx, Nt, dt,
+                    sparse):
+        """Solve all the materials for a single depletion step"""
+
+        uniqFlux, regionIdx = np.unique(flux, return_inverse=True)
+        Nt1 = np.zeros(Nt.shape)
+
+        # materials with an identical flux share the same Bateman matrix,
+        # and the matrices of nthreads fluxes are solved in a single pass
+        chunk = getattr(singleDepletion, "nthreads", 1)
+        for first in range(0, len(uniqFlux), chunk):
+            fluxIdxs = range(first, min(first + chunk, len(uniqFlux)))
+            regions = [regionIdx == fluxIdx for fluxIdx in fluxIdxs]
+            with self.profile.timer("matrix"):
+                matrices = [self._getBatemanMtx(transmutationmtx,
+                                                uniqFlux[fluxIdx], sparse)
+                            for fluxIdx in fluxIdxs]
+            with self.profile.timer("solver"):
+                if isinstance(singleDepletion, CramSolver):
+                    results = singleDepletion.solveMany(
+                        matrices, [Nt[:, rows] for rows in regions], dt)
+                else:
+                    results = [singleDepletion.solve(mtxA, Nt[:, rows], dt)
+                               for mtxA, rows in zip(matrices, regions)]
+            for rows, result in zip(regions, results):
+                Nt1[:, rows] = result
+        return Nt1
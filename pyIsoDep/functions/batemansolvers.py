@@ -1,5 +1,6 @@
 """batemansolvers
-Three solvers are enabled here to solve the Bateman equations:
+Six solvers are enabled here to solve the Bateman equations, and a seventh
+selects between these:
 
 (1) ODEINT solver
 -----------------
@@ -17,6 +18,39 @@ a vector: y = exp(H)*x. It uses the partial fraction expansion of
 the uniform rational Chebyshev approximation of type (14,14).
 About 14-digit accuracy is expected if the matrix H is symmetric
 negative definite. The algorithm may behave poorly otherwise.
+Approximations of order 8, 16, and 48 are also available. The orders 16
+and 48 are applied in the incomplete partial factorization (IPF) form, which
+keeps the round-off errors close to machine precision. A lower order can be
+selected for short time steps.
+If H is provided as a scipy.sparse matrix, each of the pole systems is
+solved with a sparse LU decomposition instead of a dense solver.
+The LU factorizations of the pole systems are cached for the last matrices
+and time steps, so that repeated steps only require triangular solves.
+
+(4) KRYLOV solver
+-----------------
+Compute the action of the matrix exponential on a vector, exp(H)*x, in a
+shift-and-invert Krylov subspace spanned by (I - gamma*H)^-1. Only a single
+LU decomposition is needed, and the number of iterations does not depend on
+the norm of the (stiff) burnup matrix.
+
+(5) STIFF solver
+----------------
+Integrate the system with an implicit BDF/Radau scheme (solve_ivp), where the
+Bateman matrix is passed as the analytic (sparse) Jacobian.
+
+(6) TTA solver
+--------------
+Transmutation trajectory analysis: the transmutation graph is decomposed into
+linear chains, which are solved analytically. Chains whose contribution is
+below a cutoff are not followed, and the propagator columns are kept for
+repeated steps with the same matrix and time step.
+
+(7) AUTO solver
+---------------
+Select expm or CRAM (order and sparse/dense LU) for each step, based on the
+size, density, and norm of the matrix times the time step, and on the
+requested accuracy.
 
 See also PADM, EXPOKIT.
 
@@ -25,17 +59,50 @@ EXPOKIT: Software Package for Computing Matrix Exponentials.
 ACM - Transactions On Mathematical Software, 24(1):130-156, 1998
 """
 
+from collections import OrderedDict
+from math import exp
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
-from pyIsoDep.functions.checkerrors import _ispositive
-from scipy.linalg import solve as linsolver
+from pyIsoDep.functions.checkerrors import _ispositive, _isint,\
+    _isnonnegative, _inlist
+from pyIsoDep.functions.header import CRAM_CACHE_SIZE,\
+    CRAM_DENSE_CACHE_SIZE, CRAM_ORDERS,\
+    STIFF_INTEGRATORS, TTA_CUTOFF, TTA_TIE, TTA_MAX_CHAINS, CRAM_ERRORS,\
+    TTA_MAX_NUCLIDES,\
+    AUTO_DENSE_SIZE, AUTO_DECAY_DENSE_SIZE, AUTO_DENSE_FILL, AUTO_EXPM_NORM,\
+    IDX_XS, BARN_2_CM2, TIME_UNITS_DICT
+from scipy.linalg import lu_factor, lu_solve
+from scipy.sparse import issparse, csc_matrix
+from scipy.sparse import identity as spidentity
+from scipy.sparse.linalg import splu
 from scipy.linalg import expm
-from scipy.integrate import odeint
+from scipy.integrate import odeint, solve_ivp
+
+ODEINT_SUCCESS = "Integration successful."  # message of a complete odeint
 
 # -----------------------------------------------------------------------------
-# Coefficients and poles of the partial fraction expansion
+# Coefficients and poles of the rational approximations
 # -----------------------------------------------------------------------------
 
-# Coefficients for IPF Cram 14
+# Coefficients for Cram 8 (partial fraction decomposition)
+C8_ALPHA = np.array([
+    -0.366354341154304059E+01 - 0.190512161481286718E+02j,
+    +0.487248145156352989E+01 + 0.743351122701664808E+01j,
+    -0.126517610262314880E+01 - 0.887846193895793637E+00j,
+    +0.562595140465979781E-01 + 0.231547684178474135E-01j, ],
+    dtype=np.complex128)
+
+C8_THETA = np.array([
+    +0.322094523994511337E+01 + 0.119361960462065195E+01j,
+    +0.229224914230486700E+01 + 0.360077149348338106E+01j,
+    +0.269490980912751498E+00 + 0.608203258749354317E+01j,
+    -0.340853950966365280E+01 + 0.877303455357903934E+01j, ],
+    dtype=np.complex128)
+
+C8_ALPHA0 = 0.117226521163349069E-07
+
+# Coefficients for Cram 14 (partial fraction decomposition)
 C14_ALPHA = np.array([
     +0.557503973136501826E+02 - 0.204295038779771857E+03j,
     -0.938666838877006739E+02 + 0.912874896775456363E+02j,
@@ -58,6 +125,95 @@ C14_THETA = np.array([
 
 C14_ALPHA0 = 0.183216998528140087E-11
 
+# Coefficients for IPF Cram 16
+C16_ALPHA = np.array([
+    +0.120947351986399348E+05 - 0.111178428884392344E+08j,
+    +0.683555980833632584E+03 - 0.294014938334645062E+05j,
+    +0.249100159771641628E+03 - 0.249845298085019817E+04j,
+    +0.134134364635225765E+03 - 0.516940352975814018E+03j,
+    +0.845422779358303518E+02 - 0.151441383687214069E+03j,
+    +0.667507440071103741E+02 - 0.702207711468162316E+02j,
+    +0.524482890295757260E+02 - 0.317816953739738357E+02j,
+    +0.320864553707201681E+02 - 0.682736131320812688E+01j, ],
+    dtype=np.complex128)
+
+C16_THETA = np.array([
+    +0.641617769909943419E+01 + 0.119412239337013867E+01j,
+    +0.594815226895117748E+01 + 0.358745736201832232E+01j,
+    +0.499317473771799642E+01 + 0.599688171360394220E+01j,
+    +0.350910360841491807E+01 + 0.843619898588437509E+01j,
+    +0.141937589718566599E+01 + 0.109253634844967226E+02j,
+    -0.141392846248888621E+01 + 0.134977256988927454E+02j,
+    -0.526497134344264689E+01 + 0.162202214731679273E+02j,
+    -0.108439170786969880E+02 + 0.192774461671816523E+02j, ],
+    dtype=np.complex128)
+
+C16_ALPHA0 = 0.212485371049522375E-15
+
+# Coefficients for IPF Cram 48
+C48_ALPHA = np.array([
+    -0.205659547586321491E+26 - 0.331574494410675837E+28j,
+    +0.144833549048856878E+03 - 0.146269119396175334E+04j,
+    +0.144209751910263672E+03 - 0.879483072020900844E+03j,
+    +0.143275368962218521E+03 - 0.635071648221109351E+03j,
+    +0.142025565328888850E+03 - 0.503576666807842448E+03j,
+    +0.140453664051028737E+03 - 0.423387941594887646E+03j,
+    +0.138551018871196300E+03 - 0.370804069681705129E+03j,
+    +0.136306857718526259E+03 - 0.334760296880813434E+03j,
+    +0.133708028027072029E+03 - 0.309396444477582931E+03j,
+    +0.130726652502857497E+03 - 0.291309674488187230E+03j,
+    -0.382363712482672329E+03 - 0.154224115575053068E+04j,
+    +0.123282402682532515E+03 - 0.240007079472931842E+03j,
+    +0.117568727826917172E+03 - 0.232815245321111513E+03j,
+    +0.108891309086594224E+03 - 0.229807865859526552E+03j,
+    +0.964804059215861099E+02 - 0.233693519896022725E+03j,
+    +0.791470989755781447E+02 - 0.245951352663837169E+03j,
+    -0.356150928851059083E+03 - 0.100131640703107057E+04j,
+    +0.479750643369984664E+02 - 0.242160193705431889E+03j,
+    +0.142613170692591949E+02 - 0.277915925334885142E+03j,
+    -0.302529002597324539E+03 - 0.788377113175151385E+03j,
+    -0.412254844652163362E+02 - 0.308373208815505157E+03j,
+    -0.102252908287795654E+03 - 0.381402782740689800E+03j,
+    -0.255870908737080069E+03 - 0.606495914496484758E+03j,
+    -0.198234959815855309E+03 - 0.467495746847984744E+03j, ],
+    dtype=np.complex128)
+
+C48_THETA = np.array([
+    +0.190132348906025053E+02 + 0.119428205827140792E+01j,
+    +0.188550833155257664E+02 + 0.358342856442787886E+01j,
+    +0.185380717690791648E+02 + 0.597433256310053865E+01j,
+    +0.180607668478308878E+02 + 0.836820058009981976E+01j,
+    +0.174209759738589263E+02 + 0.107662930571441983E+02j,
+    +0.166156936793954421E+02 + 0.131699493002468754E+02j,
+    +0.156410250885863413E+02 + 0.155806161637223691E+02j,
+    +0.144920817044183914E+02 + 0.179998821005180902E+02j,
+    +0.131628423712518954E+02 + 0.204295187482775918E+02j,
+    +0.116459690954205503E+02 + 0.228715330414021699E+02j,
+    +0.993256270450518280E+01 + 0.253282340997296219E+02j,
+    +0.801183616797472152E+01 + 0.278023211130941048E+02j,
+    +0.587067215465924867E+01 + 0.302970015904012108E+02j,
+    +0.349301312427921503E+01 + 0.328161545317358445E+02j,
+    +0.859001412168089688E+00 + 0.353645619429434948E+02j,
+    -0.205626754199822905E+01 + 0.379482478891435365E+02j,
+    -0.528461624156896353E+01 + 0.405749938131105900E+02j,
+    -0.886771566762445800E+01 + 0.432551575416672392E+02j,
+    -0.128619292574447873E+02 + 0.460030490283365216E+02j,
+    -0.173468970817498211E+02 + 0.488394110110820697E+02j,
+    -0.224422387176718753E+02 + 0.517963360031216168E+02j,
+    -0.283446675518065330E+02 + 0.549284102464872446E+02j,
+    -0.354293881965974700E+02 + 0.583438170180001323E+02j,
+    -0.446573193416570190E+02 + 0.623322519069543681E+02j, ],
+    dtype=np.complex128)
+
+C48_ALPHA0 = 0.225803818274398244E-46
+
+# Residues, poles, limit at infinity, and whether the IPF form is used
+CRAM_COEFFICIENTS = {
+    8: (C8_ALPHA, C8_THETA, C8_ALPHA0, False),
+    14: (-C14_ALPHA, -C14_THETA, C14_ALPHA0, False),
+    16: (C16_ALPHA, C16_THETA, C16_ALPHA0, True),
+    48: (C48_ALPHA, C48_THETA, C48_ALPHA0, True), }
+
 
 class CramSolver:
     """CRAM depletion solver that uses incomplete partial factorization
@@ -68,15 +224,44 @@ class CramSolver:
     Application to Burnup Equations
     <https://doi.org/10.13182/NSE15-26>`_," Nucl. Sci. Eng., 182:3, 297-318.
 
+    The order of the approximation is selected with ``order``. The tables of
+    order 16 and 48 are applied in the IPF form, in which the pole systems
+    are solved one after the other. Time steps up to ``fastdt`` are solved
+    with the (cheaper) order ``fastorder``, e.g. the short decay steps
+    of a cooling transient.
+
+    The LU factorizations of the ``H - theta*I`` pole systems are cached
+    using the identity of the matrix, the time step, and the order as a key.
+    The least recently used factorizations are evicted once more than
+    ``cachesize`` sets are stored.
+
+    The pole systems are independent, and can be factorized and solved
+    concurrently by a pool of ``nthreads`` threads (the LU decompositions
+    and triangular solves release the GIL). The contributions of the poles
+    are always summed in the same order, so the results are identical to
+    the ones of a single thread. In the IPF form only the factorizations
+    are concurrent. ``solveMany`` solves several matrices (e.g., the
+    materials of a batch with different fluxes) with the same pool, so
+    that the pole systems of all the matrices are concurrent.
+
     Parameters
     ----------
-    alpha : numpy.ndarray
-        Complex residues of poles used in the factorization. Must be a
-        vector with even number of items.
-    theta : numpy.ndarray
-        Complex poles. Must have an equal size as ``alpha``.
-    alpha0 : float
-        Limit of the approximation at infinity
+    cachesize : int, optional
+        Maximal number of (matrix, time step) pairs for which the
+        factorizations of all the poles are kept. Caching is disabled
+        if zero. The default (None) is ``CRAM_CACHE_SIZE`` for sparse
+        matrices and ``CRAM_DENSE_CACHE_SIZE`` for dense ones, whose
+        factors of all the poles take ~340 MB for the full library.
+    nthreads : int, optional
+        Number of threads used to solve the pole systems. The default is 1.
+    order : int, optional
+        Order of the rational approximation {8, 14, 16, 48}. The default
+        is 14.
+    fastorder : int, optional
+        Order used for the time steps up to ``fastdt``. The default
+        (None) uses ``order`` for all the steps.
+    fastdt : float, optional
+        Longest time step [s] solved with ``fastorder``. The default is 0.
 
     Attributes
     ----------
@@ -87,23 +272,261 @@ class CramSolver:
         Complex poles :math:`\theta` of the rational approximation
     alpha0 : float
         Limit of the approximation at infinity
+    order : int
+        Order of the rational approximation
+    cachesize : int or None
+        Maximal number of cached (matrix, time step) factorizations, or None
+        for the default of the matrix format
+    nthreads : int
+        Number of threads used to solve the pole systems
+    stats : dict
+        Number of pole systems solved (``poles``) and factorized
+        (``factorizations``), and the non-zero entries of the new LU factors
+        (``nnzLU``) and of the factorized matrices (``nnzH``) in each
+        solution. ``nnzLU/nnzH`` is the fill-in of the LU decompositions.
 
     """
 
-    def __init__(self):
+    def __init__(self, cachesize=None, nthreads=1, order=14,
+                 fastorder=None, fastdt=0.0):
         """reset the number of partial factorization"""
-        self.alpha = -C14_ALPHA
-        self.theta = -C14_THETA
-        self.alpha0 = C14_ALPHA0
+        if cachesize is not None:
+            _isint(cachesize, "Size of the factorization cache")
+            _isnonnegative(cachesize, "Size of the factorization cache")
+        _isint(nthreads, "Number of threads")
+        _ispositive(nthreads, "Number of threads")
+        _inlist(order, "Order of CRAM", CRAM_ORDERS)
+        if fastorder is not None:
+            _inlist(fastorder, "Order of CRAM for short steps", CRAM_ORDERS)
+        _isnonnegative(fastdt, "Longest time step of the fast order")
+        self.alpha, self.theta, self.alpha0, _ = CRAM_COEFFICIENTS[order]
+        self.order = order
+        self.fastorder = fastorder
+        self.fastdt = fastdt
+        self.cachesize = cachesize
+        self.nthreads = nthreads
+        self._factors = OrderedDict()
+        self._pool = None  # thread pool created on the first parallel call
+        self.stats = {"poles": [], "factorizations": [], "nnzLU": [],
+                      "nnzH": []}
+
+    def __del__(self):
+        """release the threads of the pool"""
+        if getattr(self, "_pool", None) is not None:
+            self._pool.shutdown(wait=False)
+
+    def _map(self, func, *iterables):
+        """Apply func to all the poles, with threads if requested
+
+        The results are returned in the order of the poles.
+
+        """
+        if self.nthreads == 1:
+            return list(map(func, *iterables))
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.nthreads)
+        return list(self._pool.map(func, *iterables))
 
     def solve(self, A, n0, dt):
         """Solve depletion equations using IPF CRAM
 
         Parameters
         ----------
-        A : scipy.sparse.csr_matrix
-            Sparse transmutation matrix ``A[j, i]`` desribing rates at
-            which isotope ``i`` transmutes to isotope ``j``
+        A : numpy.ndarray or scipy.sparse matrix
+            Transmutation matrix ``A[j, i]`` desribing rates at
+            which isotope ``i`` transmutes to isotope ``j``. Sparse
+            matrices (CSC or CSR) are solved using a sparse LU
+            decomposition for each pole.
+        n0 : numpy.ndarray
+            Initial compositions, typically given in number of atoms in some
+            material or an atom density. A 2-dim array with a column for each
+            material is solved with all the columns as right-hand sides.
+        dt : float
+            Time [s] of the specific interval to be solved
+
+        Returns
+        -------
+        numpy.ndarray
+            Final compositions after ``dt``
+
+        """
+        return self.solveMany([A], [n0], dt)[0]
+
+    def solveMany(self, matrices, n0s, dt):
+        """Solve the depletion equations of several matrices in one pass
+
+        The pole systems of all the matrices are factorized and solved by
+        the same pool of threads, so that more than ``len(theta)`` threads
+        can be used. The results are identical to the ones of a separate
+        ``solve`` for each matrix.
+
+        Parameters
+        ----------
+        matrices : list
+            Transmutation matrices, see ``solve``
+        n0s : list
+            Initial compositions (1-dim or 2-dim arrays) for each matrix
+        dt : float
+            Time [s] of the specific interval to be solved
+
+        Returns
+        -------
+        list
+            Final compositions after ``dt`` for each matrix
+
+        """
+        order = self.order
+        if self.fastorder is not None and dt <= self.fastdt:
+            order = self.fastorder
+        alpha, theta, alpha0, ipf = CRAM_COEFFICIENTS[order]
+        factors = self._factorize(matrices, dt, order, theta)
+        self.stats["poles"].extend([len(theta)] * len(matrices))
+
+        def poleSolve(alpha, lu, n):
+            if isinstance(lu, tuple):  # dense factors
+                return np.real(lu_solve(lu, alpha*n))
+            return np.real(lu.solve(alpha*n))
+
+        if ipf:
+            # each factor is applied to the result of the previous one
+            def ipfSolve(luPoles, n):
+                y = n * alpha0
+                for alphaj, lu in zip(alpha, luPoles):
+                    y = y + poleSolve(alphaj, lu, y)
+                return y
+            ys = self._map(ipfSolve, factors, n0s)
+        else:
+            npoles = len(theta)
+            terms = self._map(
+                poleSolve, list(alpha) * len(matrices),
+                [lu for luPoles in factors for lu in luPoles],
+                [n for n in n0s for _ in range(npoles)])
+            ys = []
+            for i, n0 in enumerate(n0s):
+                # the contributions are summed in a fixed order
+                y = n0 * alpha0
+                for term in terms[i*npoles:(i+1)*npoles]:
+                    y += term
+                ys.append(y)
+        for y in ys:
+            y[y < 1E-25] = 0
+        return ys
+
+    def _factorize(self, matrices, dt, order, theta):
+        """LU factorizations of all the pole systems H - theta*I
+
+        Returns a list with the factors of all the poles for each matrix.
+        The systems that are not cached are factorized in a single pass.
+
+        """
+
+        keys = [(id(A), dt, order) for A in matrices]
+        # the matrix is stored with its factors, so that its id is not reused
+        cached = [key in self._factors and self._factors[key][0] is A
+                  for key, A in zip(keys, matrices)]
+        newMatrices = [A for A, hit in zip(matrices, cached) if not hit]
+
+        # shifted matrices H - theta*I for all the poles of the new matrices
+        systems = []
+        for A in newMatrices:
+            if issparse(A):
+                systems.append((splu, csc_matrix(A * dt, dtype=np.complex128),
+                                spidentity(A.shape[0], dtype=np.complex128,
+                                           format="csc")))
+            else:
+                systems.append((lu_factor, A * dt, np.eye(A.shape[0])))
+
+        def poleFactorize(system, pole):
+            factorizer, H, ident = system
+            return factorizer(H - pole*ident)
+
+        npoles = len(theta)
+        newFactors = self._map(poleFactorize,
+                               [system for system in systems for _ in theta],
+                               list(theta) * len(systems))
+
+        factors = []
+        for key, A, hit in zip(keys, matrices, cached):
+            if hit:
+                self._factors.move_to_end(key)
+                for stat in ["factorizations", "nnzLU", "nnzH"]:
+                    self.stats[stat].append(0)
+                factors.append(self._factors[key][1])
+                continue
+            luPoles, newFactors = newFactors[:npoles], newFactors[npoles:]
+            _, H, ident = systems.pop(0)
+            if issparse(A):
+                nnzLU = sum(lu.L.nnz + lu.U.nnz - A.shape[0]
+                            for lu in luPoles)
+                nnzH = (H - theta[0]*ident).nnz * npoles
+            else:
+                nnzLU = A.shape[0]**2 * npoles  # dense factors
+                nnzH = np.count_nonzero(H - theta[0]*ident) * npoles
+            self.stats["factorizations"].append(npoles)
+            self.stats["nnzLU"].append(int(nnzLU))
+            self.stats["nnzH"].append(int(nnzH))
+
+            cachesize = self.cachesize
+            if cachesize is None:
+                cachesize = CRAM_CACHE_SIZE if issparse(A)\
+                    else CRAM_DENSE_CACHE_SIZE
+            if cachesize:
+                self._factors[key] = (A, luPoles)
+                while len(self._factors) > cachesize:
+                    self._factors.popitem(last=False)
+            factors.append(luPoles)
+        return factors
+
+
+class krylovSolver:
+    """Shift-and-invert Krylov solver for the action of the matrix exponential
+
+    The Arnoldi process is applied to the operator ``(I - gamma*H)^-1``, where
+    ``H = A*dt``, as described in:
+    J. van den Eshof and M. Hochbruck, "Preconditioning Lanczos
+    Approximations to the Matrix Exponential," SIAM J. Sci. Comput., 27:4,
+    1438-1457 (2006).
+    The solution is ``beta*V*exp(T)*e1``, where ``T = (I - Hm^-1)/gamma`` is
+    the projection of ``H``. Iterations stop once the change in the solution
+    between two iterations is lower than ``tol`` relative to its norm.
+
+    Parameters
+    ----------
+    tol : float, optional
+        Relative tolerance of the solution. The default is 1E-10.
+    maxiter : int, optional
+        Maximal dimension of the Krylov subspace. The default is 64.
+    gamma : float, optional
+        Shift relative to the time step. The default is 0.1.
+
+    Attributes
+    ----------
+    stats : dict
+        ``iterations`` holds the dimension of the Krylov subspace used for
+        each of the solutions
+
+    """
+
+    def __init__(self, tol=1E-10, maxiter=64, gamma=0.1):
+        """reset the solver parameters and statistics"""
+        _ispositive(tol, "Tolerance of the Krylov solver")
+        _isint(maxiter, "Maximal number of Krylov iterations")
+        _ispositive(maxiter, "Maximal number of Krylov iterations")
+        _ispositive(gamma, "Shift of the Krylov solver")
+        self.tol = tol
+        self.maxiter = maxiter
+        self.gamma = gamma
+        self.stats = {"iterations": []}
+        self._lu = None  # (matrix, time step, factorization)
+
+    def solve(self, A, n0, dt):
+        """Solve depletion equations using shift-and-invert Krylov
+
+        Parameters
+        ----------
+        A : numpy.ndarray or scipy.sparse matrix
+            Transmutation matrix ``A[j, i]`` desribing rates at
+            which isotope ``i`` transmutes to isotope ``j``.
         n0 : numpy.ndarray
             Initial compositions, typically given in number of atoms in some
             material or an atom density
@@ -115,15 +538,91 @@ class CramSolver:
         numpy.ndarray
             Final compositions after ``dt``
 
+        Raises
+        ------
+        ValueError
+            If the tolerance is not reached within ``maxiter`` iterations
+            If the exponential of the projected matrix is not finite
+
         """
-        H = A * dt
-        y = n0 * self.alpha0
-        ident = np.eye(A.shape[0])
-        for alpha, theta in zip(self.alpha, self.theta):
-            y += np.real(linsolver(H - theta*ident, alpha*n0))
+
+        beta = np.linalg.norm(n0)
+        if beta == 0.0:
+            self.stats["iterations"].append(0)
+            return np.zeros(len(n0))
+        invop = self._factorize(A, dt)
+
+        V = np.zeros((len(n0), self.maxiter + 1))
+        Hm = np.zeros((self.maxiter + 1, self.maxiter))
+        V[:, 0] = n0 / beta
+        cprev = np.zeros(0)
+        for j in range(self.maxiter):
+            w = invop(V[:, j])
+            for _ in range(2):  # Gram-Schmidt with re-orthogonalization
+                h = V[:, :j+1].T @ w
+                w -= V[:, :j+1] @ h
+                Hm[:j+1, j] += h
+            Hm[j+1, j] = np.linalg.norm(w)
+            m = j + 1
+            c = _shiftInvertExp(Hm[:m, :m], self.gamma)
+            if not np.isfinite(c).all():
+                raise ValueError("Krylov solver obtained non-finite values "
+                                 "in iteration {}".format(m))
+            # change in the solution (V is orthonormal)
+            err = np.linalg.norm(c - np.append(cprev, 0.0))
+            if Hm[j+1, j] <= 1E-14 * np.abs(Hm[:m, :m]).max() or\
+                    (j > 0 and err <= self.tol * np.linalg.norm(c)):
+                break
+            V[:, j+1] = w / Hm[j+1, j]
+            cprev = c
+        else:
+            raise ValueError("Krylov solver did not reach tol={} in {} "
+                             "iterations".format(self.tol, self.maxiter))
+
+        self.stats["iterations"].append(m)
+        y = beta * (V[:, :m] @ c)
         y[y < 1E-25] = 0
         return y
 
+    def _factorize(self, A, dt):
+        """LU factorization of I - gamma*A*dt, kept for the last (A, dt)"""
+
+        if self._lu is not None and self._lu[0] is A and self._lu[1] == dt:
+            return self._lu[2]
+        if issparse(A):
+            lu = splu(csc_matrix(spidentity(A.shape[0], format="csc") -
+                                 self.gamma * dt * A))
+            invop = lu.solve
+        else:
+            lu = lu_factor(np.eye(A.shape[0]) - self.gamma * dt * A)
+            def invop(v):
+                return lu_solve(lu, v)
+        self._lu = (A, dt, invop)
+        return invop
+
+
+def _shiftInvertExp(Hm, gamma):
+    """First column of exp(T), with T = (I - Hm^-1)/gamma
+
+    The eigenvalues of ``T`` approximate the ones of ``A*dt``, which have no
+    positive real part. For stiff chains, round-off in the eigenvalues of
+    ``Hm`` close to zero (the fastest decays) can give ``T`` a large positive
+    eigenvalue that overflows ``expm(T)``. ``exp(T)`` is then evaluated from
+    the eigenvalues ``mu`` of ``Hm`` with the real parts limited to zero.
+
+    """
+
+    with np.errstate(over="ignore", invalid="ignore"):
+        c = expm((np.eye(len(Hm)) - np.linalg.inv(Hm)) / gamma)[:, 0]
+    if np.isfinite(c).all():
+        return c
+    mu, S = np.linalg.eig(Hm)
+    z = (1.0 - 1.0 / mu) / gamma
+    z = np.minimum(z.real, 0.0) + 1j * z.imag
+    e1 = np.zeros(len(mu))
+    e1[0] = 1.0
+    return (S @ (np.exp(z) * np.linalg.solve(S, e1))).real
+
 
 class expmSolver:
     """Built-in expm solver that relies on the pade approximation"""
@@ -134,75 +633,134 @@ class expmSolver:
     
     def solve(self, mtx, n0, dt):
         """Solve the exponential of a matrix"""
+        if issparse(mtx):
+            mtx = mtx.toarray()  # the exponential of the matrix is dense
         n1 = np.dot(expm(mtx * dt), n0)
         return n1
 
 
 class adaptiveOdeintSolver:
-    
-    def __dNdt(self, n0, t, idx):
-        """function produces time rate of change for each isotope"""
-        
-        # Obtain the interpolated fission energy, xs, and transmutation mtx
-        # -----------------------------------------------------------------
-        fissE, sigf, transmutationmtx = self.dep._getInterpXS(t,\
-            self.xsinterp)
-
-        # flux is used directly
-        # -----------------------------------------------------------------
-        if not self.dep.flagPower:
-            # calculate power for this step
-            self.dep.power[idx] = (self.dep.flux[idx] * sigf * n0\
-                * fissE * self.dep.volume).sum()
+    """Solve with odeint while the flux and cross sections vary in each step
 
-        # power is provided and needs to be converted to flux
-        # -----------------------------------------------------------------
-        else:
-            self.dep.flux[idx] = self.dep.power[idx] / (
-                        sigf * n0 * fissE * self.dep.volume).sum()
-
-        # define the overall matrix to represent Bateman equations
-        # -----------------------------------------------------------------
-        mtxA = transmutationmtx*self.dep.flux[idx] + self.dep.decaymtx
+    The flux is normalized to the power on-the-fly and the transmutation data
+    is interpolated at the actual time of each right-hand side evaluation.
+    The transmutation matrices at both ends of a time window (i.e. between
+    two ``timeframes``) are cached, and the interpolated matrix is applied
+    as a weighted sum of their matrix-vector products, so that no matrix is
+    assembled in the right-hand side.
 
-        # solve and obtain the concentrations after a single depletion
-        # -----------------------------------------------------------------
-        dNdt = np.dot(mtxA, n0)
-        
-        return dNdt
-    
-    
-    def __init__(self, dep, xsinterp, rtol=1E-10):
-        """function initalized apdative time mesh odeint solver
-        
+    Parameters
+    ----------
+    dep : object
+        depletion solver object.
+    xsinterp : bool
+        flag for cross section interpolation.
+    rtol : float, optional
+        relative convergence tolerance of isotopic concentration. The
+        default is 1E-10.
 
-        Parameters
-        ----------
-        dep : object
-            depletion solver object.
-        xsinterp : bool
-            flag for cross section interpolation.
-        rtol : float, optional
-            relative convergence tolerance of isotopic concentration. The
-            default is 1E-10.
+    Attributes
+    ----------
+    stats : dict
+        Number of internal steps (``nst``), right-hand side evaluations
+        (``nfe``), and Jacobian evaluations (``nje``) for each step
 
-        Returns
-        -------
-        None.
+    """
 
-        """
+    def __init__(self, dep, xsinterp, rtol=1E-10):
+        """function initalized apdative time mesh odeint solver"""
         _ispositive(rtol, "relative convergence tolerance")
         self.dep = dep
         self.rtol = rtol
         self.xsinterp = xsinterp
-    
-    
-    def solve(self, rtol=1.0e-10):
+        self.stats = {"nst": [], "nfe": [], "nje": []}
+        self._windows = {}  # transmutation data at the ends of each window
+        self._decaymtx = None  # dense decay matrix used in the Jacobian
+
+    def _window(self, idx0, idx1):
+        """Fission energy*xs and transmutation matrices at the window ends"""
+
+        key = (idx0, idx1)
+        if key not in self._windows:
+            ends = []
+            for idx in key:
+                data = self.dep._xsDataSets[self.dep._timeframes[idx]]
+                sigf = data.xsData[:, IDX_XS["f"]] / BARN_2_CM2
+                ends.append([sigf, data.EfissJoule, data.transmutationmtx,
+                             None])  # dense matrix is set for the Jacobian
+            self._windows[key] = ends
+        return self._windows[key]
+
+    def _state(self, n0, t, idx):
+        """Interpolation weight, window data, and flux at time t of step idx"""
+
+        dep = self.dep
+        currtime = dep.timepoints[idx] + t / TIME_UNITS_DICT[dep.timeunits]
+        idx0, idx1, wgt = dep._getFrames(currtime, self.xsinterp)
+        ends = self._window(idx0, idx1)
+        if not dep.flagPower:
+            return wgt, ends, dep.flux[idx]
+        if dep.power[idx] == 0.0:
+            return wgt, ends, 0.0
+        # power is provided and needs to be converted to flux
+        sigf = (1-wgt)*ends[0][0] + wgt*ends[1][0]
+        fissE = (1-wgt)*ends[0][1] + wgt*ends[1][1]
+        flux = dep.power[idx] / (sigf * n0 * fissE * dep.volume).sum()
+        return wgt, ends, flux
+
+    def __dNdt(self, n0, t, idx):
+        """function produces time rate of change for each isotope"""
+
+        wgt, ends, flux = self._state(n0, t, idx)
+        dNdt = self.dep.decaymtx.dot(n0)
+        if flux != 0.0:
+            dNdt += (flux*(1-wgt)) * ends[0][2].dot(n0)
+            if wgt != 0.0:
+                dNdt += (flux*wgt) * ends[1][2].dot(n0)
+        return dNdt
+
+    def __jac(self, n0, t, idx):
+        """Bateman matrix at time t (flux derivatives are neglected)"""
+
+        wgt, ends, flux = self._state(n0, t, idx)
+        if self._decaymtx is None:
+            self._decaymtx = _dense(self.dep.decaymtx)
+        for end in ends:
+            if end[3] is None:
+                end[3] = _dense(end[2])
+        return flux*((1-wgt)*ends[0][3] + wgt*ends[1][3]) + self._decaymtx
+
+    def solve(self):
         """solve change in concentration with adaptive time mesh scheme"""
-        for idx, dt in enumerate(self.dep.timesteps):
-            self.dep.Nt[:, idx+1] = odeint(self.__dNdt,\
-                tuple(self.dep.Nt[:, idx]), np.array([0,dt]), args=(idx,),\
-                    rtol=rtol)[1,:]
+
+        dep = self.dep
+        profile = dep.profile
+        for idx, dt in enumerate(dep.timesteps):
+            profile.startStep(idx, self)
+            # cross sections and flux/power at the beginning of the step
+            with profile.timer("xs"):
+                fissE, sigf, transmutationmtx, _ =\
+                    dep._getInterpXS(dep.timepoints[idx], self.xsinterp)
+            dep._recordXS(idx, self.xsinterp)
+            with profile.timer("normalization"):
+                if not dep.flagPower:
+                    dep.power[idx] = (dep.flux[idx] * sigf * dep.Nt[:, idx] *
+                                      fissE * dep.volume).sum()
+                else:
+                    dep.flux[idx] = self._state(dep.Nt[:, idx], 0.0, idx)[2]
+
+            # the interpolation and normalization within the step are timed
+            # with the solver
+            with profile.timer("solver"):
+                nt, info = odeint(self.__dNdt, dep.Nt[:, idx],
+                                  np.array([0, dt]), args=(idx,),
+                                  Dfun=self.__jac, rtol=self.rtol,
+                                  full_output=True)
+            _odeintStatus(info)
+            dep.Nt[:, idx+1] = nt[1, :]
+            for key in self.stats:
+                self.stats[key].append(int(info[key][-1]))
+            profile.endStep(self)
 
 
 class odeintSolver:
@@ -225,14 +783,426 @@ class odeintSolver:
         """
         _ispositive(rtol, "relative convergence tolerance")
         self.rtol = rtol
+        self.stats = {"nst": [], "nfe": [], "nje": []}
     
-    def __dNdt(self, n0, dt, flt_mtx):
+    def __dNdt(self, n0, dt, mtx):
         """function produces time rate of change for each isotope"""
-        mtx = flt_mtx.reshape(int(len(flt_mtx)**0.5), int(len(flt_mtx)**0.5))
-        return np.dot(mtx, n0)
-    
+        return mtx.dot(n0)
+
+    def __jac(self, n0, dt, mtx):
+        """the Jacobian is the Bateman matrix itself"""
+        return mtx
+
     def solve(self, mtx, n0, dt):
-        """solve change in concentration"""
-        return odeint(self.__dNdt, tuple(n0), np.array([0, dt]),\
-            args=(mtx.flatten(),), rtol=self.rtol)[1,:]
-    
\ No newline at end of file
+        """solve change in concentration
+
+        Raises
+        ------
+        ValueError
+            If the integration failed (e.g., the maximal number of steps
+            was reached)
+
+        """
+        mtx = _dense(mtx)  # odeint only accepts a dense Jacobian
+        nt, info = odeint(self.__dNdt, tuple(n0), np.array([0, dt]),\
+            args=(mtx,), Dfun=self.__jac, rtol=self.rtol, full_output=True)
+        _odeintStatus(info)
+        for key in self.stats:
+            self.stats[key].append(int(info[key][-1]))
+        return nt[1, :]
+
+
+def _odeintStatus(info):
+    """Raise an error if odeint did not integrate the whole interval
+
+    odeint only warns on failures (e.g., too many steps), in which case the
+    returned concentrations are not the ones at the end of the interval.
+
+    """
+    if info["message"] != ODEINT_SUCCESS:
+        raise ValueError("odeint integration failed: {}"
+                         .format(info["message"]))
+
+
+def _dense(mtx):
+    """dense copy of a sparse matrix, dense matrices are returned as is"""
+    if issparse(mtx):
+        return mtx.toarray()
+    return mtx
+
+
+class stiffSolver:
+    """Implicit BDF/Radau solver with the Bateman matrix as the Jacobian
+
+    The equations are integrated with ``scipy.integrate.solve_ivp``. The
+    Bateman matrix (dense or sparse) is passed as a constant analytic
+    Jacobian, so that sparse matrices are factorized with a sparse LU
+    decomposition and the right-hand side is a single matrix-vector product.
+    LSODA only accepts a callable dense Jacobian, which returns the dense
+    Bateman matrix.
+
+    Parameters
+    ----------
+    rtol : float, optional
+        Isotopic concentration convergence criteria, relative difference.
+        The default is 1E-10.
+    atol : float, optional
+        Absolute convergence criteria of the concentrations. The default
+        is 1E-20.
+    integrator : str, optional
+        Implicit method of ``solve_ivp`` {"BDF", "Radau", "LSODA"}. The
+        default is "BDF".
+
+    Attributes
+    ----------
+    stats : dict
+        Number of evaluations of the right-hand side (``nfev``), the Jacobian
+        (``njev``), and LU decompositions (``nlu``) for each solution
+
+    """
+
+    def __init__(self, rtol=1E-10, atol=1E-20, integrator="BDF"):
+        """reset the integrator parameters and statistics"""
+        _ispositive(rtol, "relative convergence tolerance")
+        _ispositive(atol, "absolute convergence tolerance")
+        _inlist(integrator, "Stiff integrator", STIFF_INTEGRATORS)
+        self.rtol = rtol
+        self.atol = atol
+        self.integrator = integrator
+        self.stats = {"nfev": [], "njev": [], "nlu": []}
+
+    @staticmethod
+    def _dNdt(t, n0, mtx):
+        """function produces time rate of change for each isotope"""
+        return mtx.dot(n0)
+
+    def solve(self, mtx, n0, dt):
+        """Solve depletion equations using an implicit integrator
+
+        Parameters
+        ----------
+        mtx : numpy.ndarray or scipy.sparse matrix
+            Bateman matrix
+        n0 : numpy.ndarray
+            Initial compositions
+        dt : float
+            Time [s] of the specific interval to be solved
+
+        Returns
+        -------
+        numpy.ndarray
+            Final compositions after ``dt``
+
+        Raises
+        ------
+        ValueError
+            If the integration failed
+
+        """
+        jac = mtx
+        if self.integrator == "LSODA":
+            dense = mtx.toarray() if issparse(mtx) else np.asarray(mtx)
+            def jac(t, n0, mtx):
+                return dense
+        sol = solve_ivp(self._dNdt, (0.0, dt), n0, method=self.integrator,
+                        t_eval=[dt], args=(mtx,), jac=jac, rtol=self.rtol,
+                        atol=self.atol)
+        if not sol.success:
+            raise ValueError("{} integration failed: {}"
+                             .format(self.integrator, sol.message))
+        for key in self.stats:
+            self.stats[key].append(getattr(sol, key))
+        return sol.y[:, -1]
+
+
+class ttaSolver:
+    """Transmutation trajectory analysis (TTA) solver of linear chains
+
+    The transmutation graph of the Bateman matrix is followed from each of
+    the initial nuclides, and is decomposed into linear chains. The analytic
+    solution of each chain is added to the concentration of its last
+    nuclide. The solution of a chain ``1 -> ... -> m`` is the entry ``(m, 1)``
+    of the exponential of the bidiagonal chain matrix, which is obtained from
+    the solution of the parent chain with the recursion of the divided
+    differences. Chains with (nearly) repeated removal rates, e.g. loops
+    through the same nuclide, are solved with ``expm`` instead.
+
+    A chain is not followed further once an upper bound of the fraction of
+    the initial nuclide that passes through it is lower than ``cutoff``. The
+    bound is the lowest of the product of the branching ratios and
+    ``prod(b*dt)/(m-1)!``, where ``b`` are the transmutation rates along the
+    chain.
+
+    The contributions of each initial nuclide (a column of the propagator
+    ``exp(A*dt)``) are kept for the last matrix and time step, so that
+    repeated steps (e.g. decay steps) only add the stored columns.
+
+    TTA is meant for condensed chains (tens to hundreds of nuclides). The
+    number of chains grows with the size of the graph and with the norm of
+    ``A*dt``, so that a step of the full library takes from seconds (1 day)
+    to minutes (300 days), compared to a fraction of a second for CRAM.
+    Larger matrices than ``maxnuclides`` are therefore rejected.
+
+    Parameters
+    ----------
+    cutoff : float, optional
+        Relative contribution below which the chains are not followed. The
+        default is ``TTA_CUTOFF``.
+    maxchains : int, optional
+        Maximal number of chains followed from a single nuclide. The default
+        is ``TTA_MAX_CHAINS``.
+    maxnuclides : int, optional
+        Maximal number of nuclides of the Bateman matrix. The default is
+        ``TTA_MAX_NUCLIDES``.
+
+    Attributes
+    ----------
+    stats : dict
+        ``chains`` holds the number of linear chains that were solved for
+        each solution
+
+    """
+
+    def __init__(self, cutoff=TTA_CUTOFF, maxchains=TTA_MAX_CHAINS,
+                 maxnuclides=TTA_MAX_NUCLIDES):
+        """reset the cutoff and statistics"""
+        _ispositive(cutoff, "Cutoff of the TTA chains")
+        _isint(maxchains, "Maximal number of TTA chains")
+        _ispositive(maxchains, "Maximal number of TTA chains")
+        _isint(maxnuclides, "Maximal number of TTA nuclides")
+        _ispositive(maxnuclides, "Maximal number of TTA nuclides")
+        self.cutoff = cutoff
+        self.maxchains = maxchains
+        self.maxnuclides = maxnuclides
+        self.stats = {"chains": []}
+        self._columns = None  # (matrix, time step, graph, columns)
+
+    def solve(self, A, n0, dt):
+        """Solve depletion equations by following the linear chains
+
+        Parameters
+        ----------
+        A : numpy.ndarray or scipy.sparse matrix
+            Transmutation matrix ``A[j, i]`` desribing rates at
+            which isotope ``i`` transmutes to isotope ``j``.
+        n0 : numpy.ndarray
+            Initial compositions, typically given in number of atoms in some
+            material or an atom density
+        dt : float
+            Time [s] of the specific interval to be solved
+
+        Returns
+        -------
+        numpy.ndarray
+            Final compositions after ``dt``
+
+        Raises
+        ------
+        ValueError
+            If more than ``maxchains`` chains are followed from a nuclide,
+            e.g. for loops in the graph that are not cut off
+            If ``A`` has more than ``maxnuclides`` nuclides
+
+        """
+
+        if A.shape[0] > self.maxnuclides:
+            raise ValueError("TTA solver is meant for condensed chains of up "
+                             "to {} nuclides and not {} (use cram, or "
+                             "condense the data)"
+                             .format(self.maxnuclides, A.shape[0]))
+        if self._columns is None or self._columns[0] is not A or\
+                self._columns[1] != dt:
+            H = csc_matrix(A * dt)
+            graph = (H.diagonal().tolist(), H.indptr.tolist(),
+                     H.indices.tolist(), H.data.tolist())
+            self._columns = (A, dt, graph, {})
+        graph, columns = self._columns[2:]
+
+        y = np.zeros(len(n0))
+        nchains = 0
+        for src in np.flatnonzero(n0).tolist():
+            if src not in columns:
+                columns[src], nsrc = self._followChains(src, *graph)
+                nchains += nsrc
+            nodes, values = columns[src]
+            y[nodes] += n0[src] * values
+        self.stats["chains"].append(nchains)
+        y[y < 1E-25] = 0
+        return y
+
+    def _followChains(self, src, z, indptr, indices, rates):
+        """Column of the propagator for the nuclide src
+
+        ``z`` are the diagonal entries of ``A*dt`` (minus the removal rates),
+        and ``indptr``, ``indices``, and ``rates`` describe the CSC structure
+        of ``A*dt``. Returns the nuclides and their contributions, and the
+        number of chains that were followed.
+
+        """
+
+        column = {}
+        nchains = 0
+        # chain nuclides, their z, rates*dt of the links, last row of the
+        # chain exponential, and the bounds of the branching and time
+        stack = [([src], [z[src]], [], [exp(z[src])], 1.0, 1.0)]
+        while stack:
+            chain, zs, links, row, brBound, tBound = stack.pop()
+            parent = chain[-1]
+            column[parent] = column.get(parent, 0.0) + row[0]
+            nchains += 1
+            if nchains > self.maxchains:
+                raise ValueError("TTA solver followed more than {} chains "
+                                 "from a single nuclide"
+                                 .format(self.maxchains))
+            for idx in range(indptr[parent], indptr[parent+1]):
+                child, link = indices[idx], rates[idx]
+                if child == parent or link <= 0.0:
+                    continue
+                brChild = brBound
+                if z[parent] < 0.0:
+                    brChild *= min(link / -z[parent], 1.0)
+                tChild = tBound * link / len(chain)
+                if min(brChild, tChild) < self.cutoff:
+                    continue
+                stack.append((chain + [child], zs + [z[child]],
+                              links + [link],
+                              _chainRow(zs, links, row, z[child], link),
+                              brChild, tChild))
+        nodes = np.array(list(column.keys()), dtype=int)
+        return (nodes, np.array(list(column.values()))), nchains
+
+
+def _chainRow(zs, links, row, znew, link):
+    """Last row of the exponential of a chain extended by one nuclide
+
+    ``zs`` and ``links`` are the diagonal and sub-diagonal of the chain
+    matrix, and ``row`` is the last row of its exponential. The entry ``k`` of
+    the new row is obtained from the divided differences of ``exp`` over the
+    nuclides ``k, ..., m+1``.
+
+    """
+
+    links = links + [link]
+    diff = [znew - zk for zk in zs]
+    # the round-off of the recursion is about eps*max(1, rates*dt)/diff
+    if any(abs(d) < TTA_TIE * max(1.0, link, c) for d, c in zip(diff, links)):
+        # (nearly) repeated rates are not separated by the recursion
+        m = len(zs)
+        mtx = np.diag(zs + [znew])
+        mtx[np.arange(1, m+1), np.arange(m)] = links
+        return expm(mtx)[-1, :].tolist()
+    newRow = [0.0] * len(zs) + [exp(znew)]
+    for k in range(len(zs)-1, -1, -1):
+        newRow[k] = (links[k] * newRow[k+1] - link * row[k]) / diff[k]
+    return newRow
+
+
+class autoSolver:
+    """Select the solver of each step from the matrix and time step
+
+    The size, density, and norm (an upper bound of the spectral radius) of
+    the matrix times ``dt`` are inspected for each solution:
+
+    - Small matrices, up to ``densesize`` isotopes, are solved with ``expm``,
+      unless the norm times ``dt`` exceeds ``AUTO_EXPM_NORM``, where the
+      number of squarings makes ``expm`` slower than CRAM. ``expm`` is
+      accurate to round-off.
+    - Otherwise, CRAM is used with the lowest order whose approximation
+      error (``CRAM_ERRORS``) meets ``rtol``. The pole systems are solved
+      with a sparse LU decomposition, unless more than ``AUTO_DENSE_FILL``
+      of the matrix entries are non-zero.
+
+    Decay-only matrices are the same for all the steps, and are triangular
+    up to a permutation of the nuclides, so their sparse LU decompositions
+    have no fill-in and are cached. These are solved with CRAM from a
+    smaller size (``AUTO_DECAY_DENSE_SIZE``).
+
+    Parameters
+    ----------
+    rtol : float, optional
+        Accuracy target, relative to the concentrations. The default is 1E-10
+    decay : bool, optional
+        Flag to indicate that only decay-only matrices are solved. The
+        default is False
+    densesize : int, optional
+        Largest number of isotopes solved with ``expm``. The default is
+        ``AUTO_DENSE_SIZE`` (``AUTO_DECAY_DENSE_SIZE`` for decay-only).
+
+    Attributes
+    ----------
+    stats : dict
+        ``solver`` holds the name of the solver (e.g. "expm" or "cram16")
+        used in each solution
+
+    """
+
+    def __init__(self, rtol=1E-10, decay=False, densesize=None):
+        """reset the solvers and statistics"""
+        _ispositive(rtol, "Accuracy target of the auto solver")
+        if densesize is None:
+            densesize = AUTO_DECAY_DENSE_SIZE if decay else AUTO_DENSE_SIZE
+        _isint(densesize, "Largest size solved with expm")
+        _isnonnegative(densesize, "Largest size solved with expm")
+        self.rtol = rtol
+        self.decay = decay
+        self.densesize = densesize
+        # lowest order that meets the accuracy target (or the most accurate)
+        orders = [order for order in CRAM_ORDERS
+                  if CRAM_ERRORS[order] <= rtol]
+        self.order = orders[0] if orders else\
+            min(CRAM_ORDERS, key=lambda order: CRAM_ERRORS[order])
+        self.stats = {"solver": []}
+        self._solvers = {}  # solvers created on the first use (own caches)
+        self._sparse = (None, None)  # last matrix and its CSC format
+
+    def solve(self, A, n0, dt):
+        """Solve depletion equations with the selected solver
+
+        Parameters
+        ----------
+        A : numpy.ndarray or scipy.sparse matrix
+            Transmutation matrix ``A[j, i]`` desribing rates at
+            which isotope ``i`` transmutes to isotope ``j``.
+        n0 : numpy.ndarray
+            Initial compositions, typically given in number of atoms in some
+            material or an atom density
+        dt : float
+            Time [s] of the specific interval to be solved
+
+        Returns
+        -------
+        numpy.ndarray
+            Final compositions after ``dt``
+
+        """
+
+        name, A = self._select(A, dt)
+        self.stats["solver"].append(name)
+        if name not in self._solvers:
+            if name == "expm":
+                self._solvers[name] = expmSolver()
+            else:
+                self._solvers[name] = CramSolver(order=self.order)
+        return self._solvers[name].solve(A, n0, dt)
+
+    def _select(self, A, dt):
+        """Name of the solver and the matrix in the format it is solved"""
+
+        n = A.shape[0]
+        if issparse(A):
+            nnz = A.nnz
+            norm = abs(A).sum(axis=0).max() * dt
+        else:
+            nnz = np.count_nonzero(A)
+            norm = np.abs(A).sum(axis=0).max() * dt
+        if n <= self.densesize and norm <= AUTO_EXPM_NORM:
+            return "expm", A
+        name = "cram{}".format(self.order)
+        if nnz > AUTO_DENSE_FILL * n * n:
+            return name, A.toarray() if issparse(A) else A
+        if not issparse(A):
+            # the same matrix is converted once (keeps the CRAM cache)
+            if self._sparse[0] is not A:
+                self._sparse = (A, csc_matrix(A))
+            A = self._sparse[1]
+        return name, A
@@ -0,0 +1,231 @@
+"""checkpoint
+
+Checkpoints of a depletion solution that allow to resume it after the last
+completed step.
+
+``Checkpoint`` writes the state of ``MainDepletion.SolveDepletion`` to an
+HDF5 file every ``every`` completed steps: the concentrations of the
+completed time points, the flux and power history, the number of substeps
+and solvers of each step, the time frames and weights of the cross sections
+(``XsHistory``), the timings and counters of the profile, and the rates of
+the last substep that are extrapolated by the ``leqi`` integrator. The
+options of the solution are stored with the state, so that
+``MainDepletion.Resume`` continues the solution with the same options from
+the last completed step, without recomputing the previous ones.
+
+The datasets have a value for each step (or time point) and are allocated
+when the checkpoint is created. Each checkpoint only writes the values of
+the new steps in place, and the number of completed steps is written last.
+A run that is killed while writing a checkpoint is resumed from the previous
+one, since the values of the steps after it are never read.
+
+The transmutation data sets are referenced by their time frames and are not
+stored, i.e. the depletion object must be created with the same data sets to
+resume the solution. The caches of the solvers (e.g., the factorizations of
+``cram``) are rebuilt on the first resumed step.
+
+"""
+
+import json
+
+import numpy as np
+import h5py
+
+from pyIsoDep.functions.checkerrors import _isstr, _isint, _ispositive
+from pyIsoDep.functions.header import TIME_UNITS_DICT
+from pyIsoDep.functions.instrumentation import PROFILE_STAGES
+
+CHECKPOINT_EVERY = 10  # number of completed steps between checkpoints
+
+
+class Checkpoint:
+    """HDF5 checkpoint of the state of a depletion solution
+
+    Parameters
+    ----------
+    filename : str
+        Name of the HDF5 checkpoint file
+    every : int, optional
+        Number of completed steps between the checkpoints. The last step is
+        always written. The default is ``CHECKPOINT_EVERY``
+
+    Attributes
+    ----------
+    options : dict
+        Options of ``SolveDepletion`` (e.g., ``method`` and ``integrator``)
+    step : int
+        Number of completed steps stored in the file
+
+    Examples
+    --------
+    >>> dep.SolveDepletion("cram", checkpoint="run.chk", checkevery=20)
+    >>> # ... the run is killed and a new object is created
+    >>> dep.Resume("run.chk")
+
+    """
+
+    def __init__(self, filename, every=CHECKPOINT_EVERY):
+        """Reset the checkpoint without writing the file"""
+        _isstr(filename, "Checkpoint file name")
+        _isint(every, "Number of steps between checkpoints")
+        _ispositive(every, "Number of steps between checkpoints")
+        self.filename = filename
+        self.every = every
+        self.options = None
+        self.step = 0
+        self._solveTime0 = 0.0  # solution time before the restart
+
+    @classmethod
+    def load(cls, filename, every=None):
+        """Checkpoint of an existing file
+
+        Parameters
+        ----------
+        filename : str
+            Name of the HDF5 checkpoint file
+        every : int, optional
+            Number of completed steps between the next checkpoints. The
+            default is None, i.e. the one stored in the file
+
+        """
+        _isstr(filename, "Checkpoint file name")
+        with h5py.File(filename, "r") as f:
+            chk = cls(filename, int(f.attrs["every"]) if every is None
+                      else every)
+            chk.options = json.loads(f.attrs["options"])
+            chk.step = int(f.attrs["step"])
+        return chk
+
+    def create(self, dep, options):
+        """Write the scenario and the initial concentrations of a solution"""
+        self.options = options
+        self.step = 0
+        self._solveTime0 = 0.0
+        nsteps = dep.nsteps
+        shapeNt = (dep.nIsotopes, nsteps + 1)
+        with h5py.File(self.filename, "w") as f:
+            f.attrs["options"] = json.dumps(options)
+            f.attrs["every"] = self.every
+            f.attrs["step"] = 0
+            f.create_dataset("timepoints", data=dep.timepoints)
+            f.create_dataset("timeframes", data=dep._timeframes)
+            f.create_dataset("scenario", data=self._scenario(dep))
+            Nt = f.create_dataset("Nt", shape=shapeNt, dtype=float,
+                                  chunks=(shapeNt[0],
+                                          min(shapeNt[1], self.every)))
+            Nt[:, 0] = dep.N0
+            # values of each step, or of each number of completed steps
+            for name in ["flux", "power"]:
+                f.create_dataset(name, shape=(nsteps,), dtype=float)
+            f.create_dataset("nsubsteps", shape=(nsteps,), dtype=int)
+            f.create_dataset("stepSolvers", shape=(nsteps,),
+                             dtype=h5py.string_dtype())
+            f.create_dataset("frames", shape=dep.XS.frames.shape, dtype=int)
+            f.create_dataset("weights", shape=(nsteps + 1,), dtype=float)
+            f.create_dataset("solveTime", shape=(nsteps + 1,), dtype=float)
+            for stage in PROFILE_STAGES:
+                f.create_dataset("profile/timings/" + stage,
+                                 shape=(nsteps,), dtype=float)
+            f.create_group("profile/counters")
+            if options["integrator"] == "leqi":
+                for name in ["flux", "dt", "time"]:
+                    f.create_dataset("prevRates/" + name,
+                                     shape=(nsteps + 1,), dtype=float,
+                                     fillvalue=np.nan)
+
+    def due(self, step, nsteps):
+        """Flag whether the state after ``step`` completed steps is written"""
+        return step % self.every == 0 or step == nsteps
+
+    def write(self, dep, step, prevRates, solveTime):
+        """Append the state of the completed ``step`` steps
+
+        ``prevRates`` are the rates and time step of the last substep, and
+        ``solveTime`` the time spent since the solution was (re)started.
+
+        """
+        new = slice(self.step, step)  # steps completed since the last one
+        with h5py.File(self.filename, "a") as f:
+            for idx in range(self.step + 1, step + 1):  # new time points
+                f["Nt"][:, idx] = dep.Nt[:, idx]
+            f["flux"][new] = dep.flux[new]
+            f["power"][new] = dep.power[new]
+            f["nsubsteps"][new] = dep.nsubsteps[new]
+            f["stepSolvers"][new] = dep.stepSolvers[new]
+            f["frames"][:, new] = dep.XS.frames[:, new]
+            f["weights"][new] = dep.XS.weights[new]
+            f["solveTime"][step] = self._solveTime0 + solveTime
+            for key in ["timings", "counters"]:
+                for name, data in getattr(dep.profile, key).items():
+                    dataset = f["profile"][key].require_dataset(
+                        name, shape=data.shape, dtype=float)
+                    dataset[new] = data[new]
+            if prevRates is not None and "prevRates" in f:
+                # the transmutation matrix is obtained again from its time
+                (flux, _), ddt = prevRates
+                nsub = dep.nsubsteps[step-1]
+                f["prevRates/flux"][step] = flux
+                f["prevRates/dt"][step] = ddt
+                f["prevRates/time"][step] = dep.timepoints[step-1] +\
+                    (nsub - 1)*ddt / TIME_UNITS_DICT[dep.timeunits]
+            f.attrs["step"] = step  # written last, the state is complete
+        self.step = step
+
+    def restore(self, dep):
+        """Restore the state of the completed steps to the depletion object
+
+        Returns
+        -------
+        prevRates : tuple
+            Rates and time step of the last substep or None
+
+        Raises
+        ------
+        ValueError
+            If the scenario, time frames, or initial concentrations of the
+            depletion object differ from the ones of the checkpoint.
+
+        """
+        step = self.step
+        with h5py.File(self.filename, "r") as f:
+            for name, data in [("timepoints", dep.timepoints),
+                               ("timeframes", dep._timeframes),
+                               ("scenario", self._scenario(dep))]:
+                if not np.array_equal(f[name][()], data):
+                    raise ValueError("The {} of the depletion differ from "
+                                     "the ones of the checkpoint {}"
+                                     .format(name, self.filename))
+            if not np.array_equal(f["Nt"][:, 0], dep.N0):
+                raise ValueError("The initial composition differs from the "
+                                 "one of the checkpoint {}"
+                                 .format(self.filename))
+            self._solveTime0 = float(f["solveTime"][step])
+            for idx in range(1, step + 1):
+                dep.Nt[:, idx] = f["Nt"][:, idx]
+            if not step:
+                return None
+            # the values after step are of an incomplete checkpoint
+            dep.flux[:step] = f["flux"][:step]
+            dep.power[:step] = f["power"][:step]
+            dep.nsubsteps[:step] = f["nsubsteps"][:step]
+            dep.stepSolvers[:] = [str(name, "utf-8")
+                                  for name in f["stepSolvers"][:step]]
+            dep.XS.frames[:, :step] = f["frames"][:, :step]
+            dep.XS.weights[:step] = f["weights"][:step]
+            for key in ["timings", "counters"]:
+                values = getattr(dep.profile, key)
+                for name, data in f["profile"][key].items():
+                    values.setdefault(name, np.zeros(dep.nsteps))
+                    values[name][:step] = data[:step]
+            if "prevRates" not in f:
+                return None
+            rates = {name: f["prevRates"][name][step]
+                     for name in ["flux", "dt", "time"]}
+            _, _, transmutationmtx, _ = dep._getInterpXS(
+                rates["time"], self.options["xsinterp"])
+            return (rates["flux"], transmutationmtx), rates["dt"]
+
+    @staticmethod
+    def _scenario(dep):
+        """Power or flux provided for the depletion steps"""
+        return dep.power if dep.flagPower else dep.flux
@@ -0,0 +1,242 @@
+"""decaytable
+
+Decay-only propagators for cooling-time tables.
+
+The propagators ``exp(D*t)`` of the decay matrix ``D`` are computed once for
+a set of cooling times and stored as sparse matrices, since each column only
+holds the descendants of a nuclide. The cooling times are either provided,
+in which case the propagators are solved with CRAM (order 16) for each of
+the times, or are a sequence of doublings ``tmin*2**k`` obtained by squaring
+the propagator of the previous time. The doublings are much faster to
+compute, but the round-off errors of the propagators grow in proportion to
+``2**k``.
+
+The rows of the decay heat and activity responses, ``(Q*lmbda)^T exp(D*t)``
+and ``lmbda^T exp(D*t)``, are kept for all the cooling times. The total decay
+heat or activity of any number of discharged compositions is then obtained
+with a single matrix multiplication.
+
+"""
+
+import numpy as np
+from scipy.sparse import csc_matrix, identity, hstack
+
+from pyIsoDep.functions.batemansolvers import CramSolver
+from pyIsoDep.functions.checkerrors import _isint, _ispositive,\
+    _isnonNegativeArray, _inlist, _isequallength
+from pyIsoDep.functions.header import TIME_UNITS_DICT, TIME_UNITS_LIST,\
+    BARN_2_CM2, BQ_2_CURIE
+
+PROPAGATOR_CUTOFF = 1E-20  # entries of the propagators that are not stored
+PROPAGATOR_CRAM_ORDER = 16  # order of CRAM used to compute the propagators
+PROPAGATOR_BLOCK = 512  # number of propagator columns solved together
+DECAY_TABLE_ATTR = ["fullId", "nIsotopes", "decaymtx", "lmbda", "Q"]
+
+
+class DecayTable:
+    """Propagators of the decay matrix for a set of cooling times
+
+    Parameters
+    ----------
+    data : TransmutationData object
+        Container with the decay matrix, decay constants, and Q-values
+    timepoints : array, optional
+        Cooling times in ``timeUnits``. The time zero is added if missing.
+    timeUnits : string, optional
+        Time units {"seconds", "minutes", "hours", "days"}. The default is
+        "seconds"
+    tmin : float, optional
+        Shortest cooling time of the doublings ``tmin*2**k``, used if
+        ``timepoints`` are not provided
+    ndoublings : int, optional
+        Number of doublings of ``tmin``
+
+    Attributes
+    ----------
+    timepoints : 1-dim array
+        Cooling times in ``timeUnits``, starting at zero
+    propagators : list
+        ``exp(D*t)`` (scipy.sparse.csc_matrix) for all the cooling times
+    heatResponse : 2-dim array
+        Decay heat in W/Bq weighted by the decay constant for each cooling
+        time (rows) and initial nuclide (columns)
+    activityResponse : 2-dim array
+        Decay constants in 1/s for each cooling time (rows) and initial
+        nuclide (columns)
+
+    Raises
+    ------
+    ValueError
+        If the data does not contain the decay data
+        If neither timepoints nor tmin and ndoublings are provided
+
+    Examples
+    --------
+    >>> table = DecayTable(data, tmin=1.0, ndoublings=30)
+    >>> table.DecayHeat(dep.Nt[:, -1], vol=dep.volume)
+    array([4.10E+05, 4.07E+05, ...])
+
+    """
+
+    def __init__(self, data, timepoints=None, timeUnits="seconds",
+                 tmin=None, ndoublings=None):
+        """Compute the propagators for all the cooling times"""
+
+        for attr in DECAY_TABLE_ATTR:
+            if getattr(data, attr, None) is None:
+                raise ValueError("No attribute <{}> in data".format(attr))
+        _inlist(timeUnits, "Time units", TIME_UNITS_LIST)
+
+        self.fullId = np.array(data.fullId)
+        self.nIsotopes = data.nIsotopes
+        self.timeUnits = timeUnits
+        unitConv = TIME_UNITS_DICT[timeUnits]
+
+        decaymtx = csc_matrix(data.decaymtx)
+
+        if timepoints is not None:
+            timepoints = np.array(timepoints, dtype=float)
+            _isnonNegativeArray(timepoints, "Cooling times")
+            timepoints = np.unique(np.append(0.0, timepoints))
+            self.propagators = self._directPropagators(
+                decaymtx, timepoints[1:] * unitConv)
+        elif tmin is not None and ndoublings is not None:
+            _ispositive(tmin, "Shortest cooling time")
+            _isint(ndoublings, "Number of doublings")
+            timepoints = np.append(0.0, tmin * 2.0**np.arange(ndoublings+1))
+            self.propagators = self._doublePropagators(
+                decaymtx, tmin * unitConv, ndoublings)
+        else:
+            raise ValueError("Either timepoints or tmin and ndoublings must "
+                             "be provided")
+        self.timepoints = timepoints
+
+        lmbda = np.array(data.lmbda, dtype=float)
+        heat = lmbda * np.array(data.Q, dtype=float)  # W/Bq times 1/s
+        self.heatResponse = np.array([P.T @ heat for P in self.propagators])
+        self.activityResponse =\
+            np.array([P.T @ lmbda for P in self.propagators])
+
+    def Compositions(self, N0):
+        """Concentrations of the decayed compositions
+
+        Parameters
+        ----------
+        N0 : array
+            Concentrations in #/b/cm of all the isotopes (ordered as
+            ``fullId``). A 2-dim array has a row for each composition.
+
+        Returns
+        -------
+        Nt : array
+            Concentrations for all the isotopes and cooling times. A 3-dim
+            array (isotopes, compositions, cooling times) for several
+            compositions.
+
+        """
+
+        N0 = self._checkComposition(N0)
+        Nt = np.array([P @ N0.T for P in self.propagators])
+        return np.moveaxis(Nt, 0, -1)
+
+    def DecayHeat(self, N0, vol=1.0):
+        """Total decay heat in Watts of the decayed compositions
+
+        Parameters
+        ----------
+        N0 : array
+            Concentrations in #/b/cm of all the isotopes (ordered as
+            ``fullId``). A 2-dim array has a row for each composition.
+        vol : float or array, optional
+            Volume in cm**3 of each composition. The default is 1.0
+
+        Returns
+        -------
+        totalQt : array
+            Total decay heat in Watts for all the cooling times. A 2-dim
+            array (compositions, cooling times) for several compositions.
+
+        """
+
+        return self._response(self.heatResponse, N0, vol)
+
+    def Activity(self, N0, vol=1.0):
+        """Total activity in Curie of the decayed compositions
+
+        Parameters
+        ----------
+        N0 : array
+            Concentrations in #/b/cm of all the isotopes (ordered as
+            ``fullId``). A 2-dim array has a row for each composition.
+        vol : float or array, optional
+            Volume in cm**3 of each composition. The default is 1.0
+
+        Returns
+        -------
+        totalAtCurie : array
+            Total activity in Curie for all the cooling times. A 2-dim
+            array (compositions, cooling times) for several compositions.
+
+        """
+
+        return self._response(self.activityResponse, N0, vol) / BQ_2_CURIE
+
+    def _response(self, response, N0, vol):
+        """Total response of the compositions for all the cooling times"""
+
+        N0 = self._checkComposition(N0)
+        vol = np.array(vol, dtype=float)
+        if N0.ndim == 2 and vol.ndim:
+            _isequallength(vol, N0.shape[0], "Volumes")
+            vol = vol[:, None]
+        return vol * (N0 @ response.T) / BARN_2_CM2
+
+    def _checkComposition(self, N0):
+        """Checks the size of the compositions"""
+
+        N0 = np.array(N0, dtype=float)
+        if N0.shape[-1] != self.nIsotopes:
+            raise ValueError("Compositions must have {} isotopes and not {}"
+                             .format(self.nIsotopes, N0.shape[-1]))
+        return N0
+
+    @staticmethod
+    def _directPropagators(decaymtx, times):
+        """Propagators obtained directly for each cooling time"""
+
+        solver = CramSolver(order=PROPAGATOR_CRAM_ORDER)
+        return [identity(decaymtx.shape[0], format="csc")] +\
+            [_propagator(solver, decaymtx, t) for t in times]
+
+    @staticmethod
+    def _doublePropagators(decaymtx, tmin, ndoublings):
+        """Propagators of the doublings obtained by squaring"""
+
+        solver = CramSolver(order=PROPAGATOR_CRAM_ORDER)
+        propagators = [identity(decaymtx.shape[0], format="csc"),
+                       _propagator(solver, decaymtx, tmin)]
+        for _ in range(ndoublings):
+            propagators.append(_sparsify(propagators[-1] @ propagators[-1]))
+        return propagators
+
+
+def _propagator(solver, decaymtx, dt):
+    """Sparse exp(D*dt) solved for blocks of the identity matrix"""
+
+    n = decaymtx.shape[0]
+    blocks = []
+    for first in range(0, n, PROPAGATOR_BLOCK):
+        last = min(first + PROPAGATOR_BLOCK, n)
+        unit = np.zeros((n, last - first))
+        unit[first:last, :] = np.eye(last - first)
+        blocks.append(_sparsify(solver.solve(decaymtx, unit, dt)))
+    return hstack(blocks, format="csc")
+
+
+def _sparsify(P):
+    """Sparse propagator without the negligible (or negative) entries"""
+
+    P = csc_matrix(P)
+    P.data[P.data < PROPAGATOR_CUTOFF] = 0.0
+    P.eliminate_zeros()
+    return P
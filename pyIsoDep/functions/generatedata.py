@@ -23,9 +23,10 @@ Last updated on Sat Oct 16 00:30:00 2021 @author: Dan Kotlyar
 
 import numpy as np
 import numbers
+from scipy.sparse import issparse, coo_matrix, csc_matrix, diags
 
 from pyIsoDep import setDataPath
-from pyIsoDep.functions.loaddecaydata import DecayData
+from pyIsoDep.functions.libraryregistry import LIBRARY_REGISTRY
 from pyIsoDep.functions.checkerrors import _exp2dshape, _is1darray,\
     _isequallength, _isnonNegativeArray, _is2darray, _inrange, _inlist
 from pyIsoDep.functions.header import H5_PATH, BARN_2_CM2, JOULE_2MEV,\
@@ -54,6 +55,17 @@ class TransmutationData:
         fission yield weighting factor between the thermal and fast fission
         yields, i.e. <fy> = wgt*fyThermal + (1-wgt)*fyFast. Provided, the
         pre-generated library is used, otherwise it is a redundant parameter.
+    sparse : bool
+        A flag to indicate whether the decay, fission yields, and
+        transmutation matrices are stored as sparse (CSC) matrices.
+    cache : bool or str
+        A flag to read the library from its memory-mapped cache (see
+        ``LibraryCache``), which is created on the first use, or the
+        directory of the cache. The data sets of the library are then
+        read-only arrays shared by all the objects and processes.
+        Without the cache, the library is read once per process (see
+        ``LIBRARY_REGISTRY``) and its data sets are also shared read-only
+        arrays.
 
     Attributes
     ----------
@@ -71,14 +83,16 @@ class TransmutationData:
         decay constants in 1/sec
     nu : 1-dim array
         number of neutrons emitted per fission
-    decaymtx : 2-dim array
+    decaymtx : 2-dim array or scipy.sparse.csc_matrix
         Decay matrix
     ingestion : 1-dim array
         Ingestion coefficients in Sv/Bq
     inhalation : 1-dim array
         Inhalattion coefficients in Sv/Bq
-    fymtx : 2-dim array
+    fymtx : 2-dim array or scipy.sparse.csc_matrix
         fission yields matrix for all the fathers-daughters isotopes
+    sparse : bool
+        A flag to indicate whether the matrices are stored as sparse
 
     Returns
     -------
@@ -88,35 +102,31 @@ class TransmutationData:
     Examples
     --------
     >>> xs = TransmutationData(libraryFlag=True)
+    >>> xs = TransmutationData(libraryFlag=True, sparse=True)
+    >>> xs = TransmutationData(libraryFlag=True, cache=True)
 
     """
 
-    def __init__(self, libraryFlag=True, h5path=None, wgtFY=0.0):
+    def __init__(self, libraryFlag=True, h5path=None, wgtFY=0.0,
+                 sparse=False, cache=False):
         """reset values with a complete list of all the nuclides"""
 
         self.libraryFlag = libraryFlag
+        self.sparse = sparse
         # load the decay data
         if libraryFlag:
             if h5path is None:
-                h5DefaultPath = setDataPath(H5_PATH)
-                datalib = DecayData(h5DefaultPath)
-            else:
-                datalib = DecayData(h5path)
+                h5path = setDataPath(H5_PATH)
+            h5path = str(h5path)
 
             _inrange(wgtFY, "Fission yield weight", [0.0, 1.0])
-            self.fullId = np.array(datalib.getvalues("IDlist"), dtype=int)
+            # shared read-only arrays, read once per library and process
+            values = LIBRARY_REGISTRY.library(h5path, cache, sparse)
+            for attr, vals in values.items():
+                setattr(self, attr, vals)
             self.nIsotopes = len(self.fullId)
-            self.AW = datalib.getvalues("AW")
-            self.Q = datalib.getvalues("Q")
-            self.BR = datalib.getvalues("BR")
-            self.lmbda = datalib.getvalues("lambda")
-            self.decaymtx = datalib.getvalues("decayMatrix")
-            self.ingestion = datalib.getvalues("ingestion")
-            self.inhalation = datalib.getvalues("inhalation")
-            self.fymtx = wgtFY*datalib.getvalues("thermalFY") +\
-                (1-wgtFY)*datalib.getvalues("fastFY")
-            self.nu = wgtFY*datalib.getvalues("nu_thermal") +\
-                (1-wgtFY)*datalib.getvalues("nu_fast")
+            self.fymtx, self.nu =\
+                LIBRARY_REGISTRY.blend(h5path, wgtFY, cache, sparse)
         else:
             self.fullId = None
             self.nIsotopes = None
@@ -242,19 +252,29 @@ class TransmutationData:
 
         # Create the 1-g transmutation matrix (without fission components)
         # ---------------------------------------------------------------------
-        trmtx = np.zeros((self.nIsotopes, self.nIsotopes))
-        # fill diagonal with negative absorption values
-        np.fill_diagonal(trmtx, -xsData[:, IDX_XS["abs"]])
-
-        for idxrow in range(self.nIsotopes):
-            for idxcol, product in enumerate(prodcutsIDs[idxrow, :]):
-                trmtx[self.fullId == product, idxrow] =\
-                    xsData[idxrow, idxcol+idxC]
+        # indices of the products (rows) for each parent (columns)
+        rows = _productRows(np.array(self.fullId, dtype=int),
+                            prodcutsIDs.astype(int).ravel())
+        cols = np.repeat(np.arange(self.nIsotopes), prodcutsIDs.shape[1])
+        vals = xsData[:, idxC:].ravel()
+        # diagonal with negative absorption values
+        rows = np.append(rows, np.arange(self.nIsotopes))
+        cols = np.append(cols, np.arange(self.nIsotopes))
+        vals = np.append(vals, -xsData[:, IDX_XS["abs"]])
+        # scatter all the non-zero reaction rates in a single pass
+        nnz = (rows >= 0) & (vals != 0.0)
+        trmtx = coo_matrix((vals[nnz], (rows[nnz], cols[nnz])),
+                           shape=(self.nIsotopes, self.nIsotopes))
 
         # Create the product between fission yields and fission cross sections
         # ---------------------------------------------------------------------
-        fissmtrx = np.tile(xsData[:, IDX_XS["f"]], (self.nIsotopes, 1))
-        fissmtrx *= self.fymtx
+        if self.sparse:
+            fissmtrx = csc_matrix(self.fymtx @ diags(xsData[:, IDX_XS["f"]]))
+            trmtx = trmtx.tocsc()
+        else:
+            fissmtrx = np.tile(xsData[:, IDX_XS["f"]], (self.nIsotopes, 1))
+            fissmtrx *= self.fymtx
+            trmtx = trmtx.toarray()
 
         # Final transmutation matrix
         # ---------------------------------------------------------------------
@@ -335,6 +355,10 @@ class TransmutationData:
             self.EfissJoule = EfissMeVPart / JOULE_2MEV
             self.fymtx = fymtxPart
             self.decaymtx = decaymtxPart
+            if self.sparse and fymtxPart is not None:
+                self.fymtx = csc_matrix(fymtxPart)
+            if self.sparse and decaymtxPart is not None:
+                self.decaymtx = csc_matrix(decaymtxPart)
             if nu is not None:
                 self.nu = nuPart
             return xsDataPart
@@ -366,18 +390,13 @@ class TransmutationData:
 
         # Overwrite a pre-generated fission matrix
         if fymtxPart is not None:
-            fymtx = np.zeros((self.nIsotopes, self.nIsotopes))
-            for idx in range(len(idxFull)):
-                fymtx[idxFull, idxFull[idx]] = fymtxPart[idxPart, idxPart[idx]]
-            self.fymtx = fymtx
+            self.fymtx = _scattermtx(fymtxPart, idxFull, idxPart,
+                                     self.nIsotopes, self.sparse)
 
         # Overwrite a pre-generated decay matrix
         if decaymtxPart is not None:
-            decaymtx = np.zeros((self.nIsotopes, self.nIsotopes))
-            for idx in range(len(idxFull)):
-                decaymtx[idxFull, idxFull[idx]] =\
-                    decaymtxPart[idxPart, idxPart[idx]]
-            self.decaymtx = decaymtx
+            self.decaymtx = _scattermtx(decaymtxPart, idxFull, idxPart,
+                                        self.nIsotopes, self.sparse)
 
         # Store the matrix with the cross sections
         self.xsData = xsData
@@ -442,10 +461,11 @@ def _checkmtx(ID, fymtx, decaymtx, EfissMeV, nu):
         EfissMeV = np.array(EfissMeV, dtype=float)
 
     if fymtx is not None:
-        fymtx = np.array(fymtx)
+        fymtx = fymtx.toarray() if issparse(fymtx) else np.array(fymtx)
         _is2darray(fymtx, "Fission yields matrix")
     if decaymtx is not None:
-        decaymtx = np.array(decaymtx)
+        decaymtx =\
+            decaymtx.toarray() if issparse(decaymtx) else np.array(decaymtx)
         _is2darray(decaymtx, "Decay matrix")
 
     if nu is not None:
@@ -470,6 +490,34 @@ def _checkmtx(ID, fymtx, decaymtx, EfissMeV, nu):
     return EfissMeV, fymtx, decaymtx, nu
 
 
+def _productRows(fullId, products):
+    """indices of the products in the list of nuclides (-1 if missing)
+
+    The products are located with a binary search in the sorted list of
+    nuclides, which does not need to be sorted itself.
+    """
+
+    order = np.argsort(fullId, kind="stable")
+    sortedId = fullId[order]
+    pos = np.searchsorted(sortedId, products)
+    pos[pos == len(sortedId)] = 0  # beyond the last nuclide
+    found = sortedId[pos] == products
+    return np.where(found, order[pos], -1)
+
+
+def _scattermtx(mtxPart, idxFull, idxPart, nIsotopes, sparse):
+    """place a partial matrix within a matrix for the full list of nuclides"""
+
+    subMtx = mtxPart[np.ix_(idxPart, idxPart)]
+    if sparse:
+        rows, cols = np.nonzero(subMtx)
+        return csc_matrix((subMtx[rows, cols], (idxFull[rows], idxFull[cols])),
+                          shape=(nIsotopes, nIsotopes))
+    mtx = np.zeros((nIsotopes, nIsotopes))
+    mtx[np.ix_(idxFull, idxFull)] = subMtx
+    return mtx
+
+
 # Obtain the energy per fission for the defined isotopes
 # -------------------------------------------------------------------------
 def _FissionEnergy(ID):
@@ -43,7 +43,26 @@ TIME_UNITS_CONV_MTX = [[1.0,       60.0,     3600.0, 86400.0],
 # -----------------------------------------------------------------------------
 
 # current depletion options
-DEPLETION_METHODS = ["cram", "expm", "odeint", "adaptive"]
+DEPLETION_METHODS = ["cram", "expm", "odeint", "adaptive", "krylov",
+                     "stiff", "tta", "auto"]
+STIFF_INTEGRATORS = ["BDF", "Radau", "LSODA"]  # solve_ivp implicit methods
+# time integration schemes (constant extrapolation and predictor-corrector)
+DEPLETION_INTEGRATORS = ["ce", "cecm", "celi", "leqi"]
+MAX_SUBSTEPS = 256  # maximal number of substeps in a depletion step
+SUBSTEP_ATOL = 1E-10  # absolute error floor (relative to max concentration)
+CRAM_CACHE_SIZE = 2  # number of cached CRAM factorizations (matrix, dt)
+CRAM_DENSE_CACHE_SIZE = 0  # dense factors of the full library take ~340 MB
+CRAM_ORDERS = [8, 14, 16, 48]  # orders of the CRAM coefficient tables
+# absolute error of the CRAM approximations (round-off for 16 and 48)
+CRAM_ERRORS = {8: 2E-8, 14: 5E-12, 16: 1E-15, 48: 1E-15}
+TTA_CUTOFF = 1E-12  # relative contribution of the chains followed by TTA
+TTA_TIE = 1E-3  # relative difference of repeated rates*dt in a TTA chain
+TTA_MAX_CHAINS = 1000000  # maximal number of TTA chains of a nuclide
+TTA_MAX_NUCLIDES = 300  # largest (condensed) chain matrix solved with TTA
+AUTO_DENSE_SIZE = 128  # largest matrix solved with expm by the auto method
+AUTO_DECAY_DENSE_SIZE = 48  # largest decay-only matrix solved with expm
+AUTO_DENSE_FILL = 0.25  # fraction of non-zero entries for a dense CRAM LU
+AUTO_EXPM_NORM = 1E+12  # largest norm*dt solved with expm
 H5_PATH = "bgcore_data.h5"              # Pre-generated librray
 
 # -----------------------------------------------------------------------------
@@ -124,14 +143,26 @@ RADIOTOXICITY_ATTR = ["Nt", "lmbda", "inhalation", "ingestion", "volume"]
 # Attributes that must exist to calculate mass
 MASS_ATTR = ["Nt", "AW", "volume"]
 
+# Attributes that must exist for each of the post-processing methods
+POSTPROCESS_ATTR = {"Activity": ACTIVITY_ATTR, "DecayHeat": DECAY_HEAT_ATTR,
+                    "Radiotoxicity": RADIOTOXICITY_ATTR, "Mass": MASS_ATTR}
+POSTPROCESS_METHODS = list(POSTPROCESS_ATTR)
+
+# Totals of the isotopic post-processed quantities
+ISOTOPIC_TOTALS = {"massgr": "totalMassgr", "AtCurie": "totalAtCurie",
+                   "Qt": "totalQt", "toxicityIngestion": "totalToxIngestion",
+                   "toxicityInhalation": "totalToxInhalation"}
+
 # Data required for interpolation
 INTRP_ATTR = ["fymtx", "EfissJoule", "xsData", "transmutationmtx"]
 
 # Attributes that should not be weighted
 NOT_WEIGHT_ATTR = ['_xsintrp', 'fullId', 'nIsotopes', 'AW', 'Q', 'BR', 'lmbda',
                    'decaymtx', 'nu', '_xsDataSets',
-                   '_timeframes', '_solveTime', 'flagPower', 'usertimesteps',
-                   'timesteps', 'timepoints', 'timeunits', 'nsteps', 'volume']
+                   '_timeframes', '_solveTime', 'solverStats', 'stepSolvers',
+                   'nsubsteps', 'profile', 'storage', 'flagPower',
+                   'usertimesteps', 'timesteps', 'timepoints', 'timeunits',
+                   'nsteps', 'volume']
 
 # hdf5 output file atrributes list
 HDF5_GROUPS = {"metaData": ["nIsotopes", "AW", "fullId", "timepoints",
@@ -0,0 +1,137 @@
+"""instrumentation
+
+Timings of the stages of each depletion step and counters of the solvers.
+
+``MainDepletion`` records the time spent in the interpolation of the
+transmutation data, the assembly of the Bateman matrices, the normalization
+of the flux/power, and the solver, separately for each step. The statistics
+of the solver (e.g., poles and LU fill-in of CRAM, or right-hand side
+evaluations of odeint) are summed over the solutions of each step. The
+post-processing methods add their total time.
+
+The ``adaptive`` method interpolates the transmutation data and normalizes
+the flux within the integration, so that this time is included in the
+``solver`` stage, and no matrices are assembled (``matrix`` is zero).
+
+"""
+
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+# stages of a depletion step that are timed
+PROFILE_STAGES = ["xs", "matrix", "normalization", "solver"]
+
+
+class Instrumentation:
+    """Timings and solver counters of the depletion steps
+
+    Parameters
+    ----------
+    nsteps : int
+        Number of depletion steps
+
+    Attributes
+    ----------
+    timings : dict
+        Time in seconds spent in each stage (``PROFILE_STAGES``) for each
+        step
+    counters : dict
+        Solver statistics (e.g. ``poles``, ``nnzLU``, ``nnzH``, ``nfe``)
+        summed for each step
+    postprocess : dict
+        Time in seconds of each post-processing method (e.g. ``DecayHeat``)
+    step : int
+        Index of the step that is currently timed
+
+    Examples
+    --------
+    >>> dep.SolveDepletion("cram", sparse=True)
+    >>> dep.profile.timings["solver"].sum()
+    0.0641
+    >>> dep.profile.counters["nnzLU"]
+    array([37856., 0.])
+    >>> dep.profile.fill()
+    array([1.73, 0.  ])
+
+    """
+
+    def __init__(self, nsteps):
+        """reset the timings and counters of all the steps"""
+        self.nsteps = nsteps
+        self.timings = {stage: np.zeros(nsteps) for stage in PROFILE_STAGES}
+        self.counters = {}
+        self.postprocess = {}
+        self.step = 0
+
+    @contextmanager
+    def timer(self, stage):
+        """Add the time of the enclosed block to a stage of the step"""
+        tic = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage][self.step] += time.perf_counter() - tic
+
+    def startStep(self, idx, solver):
+        """Start timing a step and store the size of the solver stats"""
+        self.step = idx
+        self._nstats = {key: len(vals)
+                        for key, vals in _solverStats(solver).items()}
+
+    def endStep(self, solver):
+        """Sum the solver statistics recorded during the step"""
+        for key, vals in _solverStats(solver).items():
+            newVals = vals[self._nstats.get(key, 0):]
+            if not all(isinstance(val, (int, float, np.number))
+                       for val in newVals):
+                continue  # e.g., names of the solvers used by "auto"
+            if key not in self.counters:
+                self.counters[key] = np.zeros(self.nsteps)
+            self.counters[key][self.step] += sum(newVals)
+
+    def fill(self):
+        """Fill-in of the LU decompositions of CRAM in each step
+
+        Returns
+        -------
+        1-dim array
+            Ratio of the non-zero entries of the LU factors (``nnzLU``) and
+            of the factorized matrices (``nnzH``), which is zero for the
+            steps that only reuse cached factorizations
+
+        Raises
+        ------
+        KeyError
+            If the solver did not record ``nnzLU`` and ``nnzH``.
+
+        """
+        if "nnzLU" not in self.counters or "nnzH" not in self.counters:
+            raise KeyError("The solver did not record the LU fill-in")
+        nnzLU, nnzH = self.counters["nnzLU"], self.counters["nnzH"]
+        return np.divide(nnzLU, nnzH, out=np.zeros(self.nsteps),
+                         where=nnzH > 0)
+
+    def summary(self):
+        """Total time of each stage and post-processing method
+
+        Returns
+        -------
+        dict
+            Total time in seconds of the stages and post-processing methods
+
+        """
+        totals = {stage: vals.sum() for stage, vals in self.timings.items()}
+        totals.update(self.postprocess)
+        return totals
+
+
+def _solverStats(solver):
+    """Statistics of the solver and of the solvers selected by auto"""
+
+    stats = dict(getattr(solver, "stats", None) or {})
+    for name, subsolver in getattr(solver, "_solvers", {}).items():
+        for key, vals in getattr(subsolver, "stats", {}).items():
+            stats["{}_{}".format(name, key)] = vals
+    return stats
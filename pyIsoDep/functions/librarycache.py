@@ -0,0 +1,199 @@
+"""librarycache
+
+Memory-mapped cache of the pre-generated decay and fission yield library.
+
+Reading the HDF5 library (e.g. ``bgcore_data.h5``) copies all its data sets,
+including the dense decay and fission yields matrices, into new arrays for
+every ``TransmutationData`` object. ``LibraryCache`` converts the library once
+into uncompressed ``.npy`` files, which are then memory-mapped. The pages of
+the mapped files are shared by all the objects and processes that read the
+same library, and are only loaded from the disk when used.
+
+The cache of a library is stored in a directory named after the path, size,
+and modification time of the HDF5 file, so that a modified library is
+converted again. The directory is ``LIBRARY_CACHE_DIR``, unless set by the
+``PYISODEP_CACHE`` environment variable.
+
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import h5py
+
+from pyIsoDep.functions.checkerrors import _isstr
+
+LIBRARY_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache",
+                                 "pyIsoDep")
+LIBRARY_CACHE_ENV = "PYISODEP_CACHE"  # environment variable of the directory
+DESCRIPTIONS_FILE = "descriptions.json"
+
+
+class LibraryCache:
+    """Interface into the memory-mapped cache of an HDF5 library
+
+    The interface is identical to the one of ``DecayData``, but the values
+    are read-only arrays mapped from the cached files.
+
+    Parameters
+    ----------
+    h5path : str
+        Path of the HDF5 library
+    cachedir : str, optional
+        Directory of the caches. The default is None, i.e. the
+        ``PYISODEP_CACHE`` environment variable or ``LIBRARY_CACHE_DIR``
+
+    Attributes
+    ----------
+    path : str
+        Directory with the cached data sets of the library
+
+    Raises
+    ------
+    OSError
+        If the ``h5path`` is not valid.
+
+    Examples
+    --------
+    >>> table = LibraryCache("bgcore_data.h5")
+    >>> table.getvalues("decayMatrix").flags.writeable
+    False
+
+    """
+
+    def __init__(self, h5path, cachedir=None):
+        """Convert the library if it is not cached yet"""
+        _isstr(h5path, "Library path")
+        if cachedir is None:
+            cachedir = os.environ.get(LIBRARY_CACHE_ENV, LIBRARY_CACHE_DIR)
+        _isstr(cachedir, "Library cache directory")
+        self.path = os.path.join(cachedir, _cacheName(h5path))
+        if not os.path.isdir(self.path):
+            _convert(h5path, cachedir, self.path)
+        with open(os.path.join(self.path, DESCRIPTIONS_FILE)) as f:
+            self._descriptions = json.load(f)
+
+    def properties(self):
+        """Obtain all existing properties / data fields
+
+        Returns
+        -------
+        list
+            All the data fields that exist
+
+        Raises
+        ------
+        KeyError
+            If the data file has no properties.
+
+        """
+
+        if not self._descriptions:
+            raise KeyError("No properties in the current database")
+        return list(self._descriptions)
+
+    def getvalues(self, pty):
+        """Obtain a read-only mapped data set for a specific property
+
+        Parameters
+        ----------
+        pty : string
+            name of the property in the databse, e.g. "AW"
+
+        Returns
+        -------
+        Array (2-dim or 1-dim)
+            vals
+
+        Raises
+        ------
+        KeyError
+            If the material ``pty`` does not exist.
+        TypeError
+            If the material ``pty`` is not a string
+
+        """
+
+        if not isinstance(pty, str):
+            raise TypeError("property must be a string and not {}".format(pty))
+        if pty not in self._descriptions:
+            raise KeyError("Property {} does not exist".format(pty))
+        values = np.load(os.path.join(self.path, pty + ".npy"),
+                         mmap_mode="r")
+        # plain arrays, which keep the mapped file open
+        return values.view(np.ndarray) if values.ndim else values[()]
+
+    def description(self, pty):
+        """Obtain the description for a specific property
+
+        Parameters
+        ----------
+        pty : string
+            name of the property in the databse, e.g. "AW"
+
+        Returns
+        -------
+        str
+            Description of the property
+
+        Raises
+        ------
+        KeyError
+            If the property or its description does not exist.
+        TypeError
+            If ``pty`` is not str type.
+
+        """
+
+        if not isinstance(pty, str):
+            raise TypeError("property must be a string and not {}".format(pty))
+        if pty not in self._descriptions:
+            raise KeyError("Property {} does not exist".format(pty))
+        description = self._descriptions[pty]
+        if description is None:
+            raise KeyError("No description for property {}".format(pty))
+        return description
+
+
+def _cacheName(h5path):
+    """Name of the cache from the path, size, and time of the library"""
+    stat = os.stat(h5path)
+    key = "{}:{}:{}".format(os.path.abspath(h5path), stat.st_size,
+                            stat.st_mtime_ns)
+    name = os.path.splitext(os.path.basename(h5path))[0]
+    return "{}-{}".format(name, hashlib.sha1(key.encode()).hexdigest()[:16])
+
+
+def _convert(h5path, cachedir, path):
+    """Write each data set of the library to an uncompressed npy file
+
+    The files are written to a temporary directory that is renamed once
+    complete, so that concurrent processes never read a partial cache.
+
+    """
+    os.makedirs(cachedir, exist_ok=True)
+    tmpdir = tempfile.mkdtemp(dir=cachedir)
+    try:
+        descriptions = {}
+        with h5py.File(h5path, "r") as f:
+            for pty, dataset in f.items():
+                if not isinstance(dataset, h5py.Dataset):
+                    continue
+                np.save(os.path.join(tmpdir, pty + ".npy"), dataset[()],
+                        allow_pickle=False)
+                description = dataset.attrs.get("description")
+                if isinstance(description, bytes):
+                    description = str(description, "utf-8")
+                descriptions[pty] = None if description is None\
+                    else str(description)
+        with open(os.path.join(tmpdir, DESCRIPTIONS_FILE), "w") as f:
+            json.dump(descriptions, f)
+        os.rename(tmpdir, path)
+    except OSError:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        if not os.path.isdir(path):  # not converted by another process
+            raise
@@ -0,0 +1,178 @@
+"""libraryregistry
+
+Process-wide registry of the pre-generated libraries and blended yields.
+
+Every ``TransmutationData`` object with ``libraryFlag=True`` used to read the
+complete library and blend the thermal and fast fission yields (a dense
+nIsotopes x nIsotopes matrix) and neutrons per fission with ``wgtFY``.
+``LIBRARY_REGISTRY`` reads the data sets of each library once per process
+and keeps the blended fission yields and nu of the last ``REGISTRY_BLENDS``
+weights (least recently used are evicted). The objects reference these
+shared arrays, which are read-only, instead of owning copies.
+
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import h5py
+from scipy.sparse import csc_matrix
+
+from pyIsoDep.functions.loaddecaydata import DecayData
+from pyIsoDep.functions.librarycache import LibraryCache
+from pyIsoDep.functions.checkerrors import _isint, _ispositive
+
+REGISTRY_BLENDS = 16  # blended fission yields and nu kept in the registry
+
+# attributes of the data sets and their properties in the library
+LIBRARY_ATTR = {"fullId": "IDlist", "AW": "AW", "Q": "Q", "BR": "BR",
+                "lmbda": "lambda", "decaymtx": "decayMatrix",
+                "ingestion": "ingestion", "inhalation": "inhalation"}
+# properties of the thermal and fast fission yields and nu
+BLEND_PROPERTIES = ["thermalFY", "fastFY", "nu_thermal", "nu_fast"]
+
+
+class LibraryRegistry:
+    """Shared read-only data sets of the libraries and blended yields
+
+    Parameters
+    ----------
+    maxblends : int, optional
+        Number of blended fission yields and nu (for different libraries,
+        ``wgtFY``, or ``sparse``) that are kept. The default is
+        ``REGISTRY_BLENDS``
+
+    Examples
+    --------
+    >>> values = LIBRARY_REGISTRY.library("bgcore_data.h5")
+    >>> fymtx, nu = LIBRARY_REGISTRY.blend("bgcore_data.h5", wgtFY=0.5)
+    >>> LIBRARY_REGISTRY.clear()  # release the memory
+
+    """
+
+    def __init__(self, maxblends=REGISTRY_BLENDS):
+        """Reset an empty registry"""
+        _isint(maxblends, "Number of blended yields in the registry")
+        _ispositive(maxblends, "Number of blended yields in the registry")
+        self.maxblends = maxblends
+        self._libraries = {}
+        self._blends = OrderedDict()
+        self._lock = threading.RLock()
+
+    def library(self, h5path, cache=False, sparse=False):
+        """Data sets of a library, which is read on the first use
+
+        Parameters
+        ----------
+        h5path : str
+            Path of the HDF5 library
+        cache : bool or str, optional
+            Flag to read the library from its memory-mapped cache, or the
+            directory of the cache (see ``LibraryCache``)
+        sparse : bool, optional
+            Flag to return the decay matrix as a CSC matrix
+
+        Returns
+        -------
+        dict
+            Read-only values of the attributes in ``LIBRARY_ATTR``
+
+        """
+        with self._lock:
+            entry = self._entry(h5path, cache)
+            values = {attr: entry[pty] for attr, pty in LIBRARY_ATTR.items()}
+            if sparse:
+                if "sparseDecay" not in entry:
+                    entry["sparseDecay"] = _readonly(
+                        csc_matrix(entry["decayMatrix"]))
+                values["decaymtx"] = entry["sparseDecay"]
+            return values
+
+    def blend(self, h5path, wgtFY, cache=False, sparse=False):
+        """Fission yields and nu weighted between thermal and fast
+
+        Parameters
+        ----------
+        h5path : str
+            Path of the HDF5 library
+        wgtFY : float
+            Weight of the thermal fission yields and nu
+        cache : bool or str, optional
+            Flag to read the library from its memory-mapped cache, or the
+            directory of the cache (see ``LibraryCache``)
+        sparse : bool, optional
+            Flag to return the fission yields as a CSC matrix
+
+        Returns
+        -------
+        fymtx : 2-dim array or scipy.sparse.csc_matrix
+            Read-only fission yields matrix
+        nu : 1-dim array
+            Read-only neutrons emitted per fission
+
+        """
+        with self._lock:
+            entry = self._entry(h5path, cache)
+            key = (entry["key"], float(wgtFY), bool(sparse))
+            if key in self._blends:
+                self._blends.move_to_end(key)
+                return self._blends[key]
+            fymtx = _weight(wgtFY, entry["thermalFY"], entry["fastFY"])
+            nu = _weight(wgtFY, entry["nu_thermal"], entry["nu_fast"])
+            if sparse:
+                fymtx = _readonly(csc_matrix(fymtx))
+            self._blends[key] = (fymtx, nu)
+            if len(self._blends) > self.maxblends:
+                self._blends.popitem(last=False)  # least recently used
+            return self._blends[key]
+
+    def clear(self):
+        """Release the libraries and blends (shared arrays are kept alive
+        by the objects that still reference them)"""
+        with self._lock:
+            self._libraries.clear()
+            self._blends.clear()
+
+    def _entry(self, h5path, cache):
+        """Read-only properties of a library, read once per file version"""
+        stat = os.stat(h5path)
+        key = (os.path.abspath(h5path), stat.st_size, stat.st_mtime_ns)
+        if key in self._libraries:
+            return self._libraries[key]
+        properties = list(LIBRARY_ATTR.values()) + BLEND_PROPERTIES
+        if cache:  # mapped values are already read-only
+            datalib = LibraryCache(h5path, None if cache is True else cache)
+            entry = {pty: datalib.getvalues(pty) for pty in properties}
+        else:
+            with h5py.File(h5path, "r") as f:
+                datalib = DecayData(f)
+                entry = {pty: _readonly(datalib.getvalues(pty))
+                         for pty in properties}
+        entry["IDlist"] = _readonly(np.array(entry["IDlist"], dtype=int))
+        entry["key"] = key
+        self._libraries[key] = entry
+        return entry
+
+
+def _weight(wgtFY, thermal, fast):
+    """Values weighted between thermal and fast (shared if not blended)"""
+    if wgtFY == 1.0:
+        return thermal
+    if wgtFY == 0.0:
+        return fast
+    return _readonly(wgtFY*thermal + (1-wgtFY)*fast)
+
+
+def _readonly(values):
+    """Mark an array or the arrays of a sparse matrix as read-only"""
+    if isinstance(values, csc_matrix):
+        for array in (values.data, values.indices, values.indptr):
+            array.flags.writeable = False
+    elif isinstance(values, np.ndarray):
+        values.flags.writeable = False
+    return values
+
+
+LIBRARY_REGISTRY = LibraryRegistry()
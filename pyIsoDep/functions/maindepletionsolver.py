@@ -15,18 +15,31 @@ Last updated on Thrus Oct 21 08:45:00 2021 @author: Matt Krecicki
 
 import numpy as np
 import time
+import warnings
+from scipy.sparse import issparse, csc_matrix
 from pyIsoDep.functions.batemansolvers import CramSolver, expmSolver,\
-    odeintSolver, adaptiveOdeintSolver
+    odeintSolver, adaptiveOdeintSolver, krylovSolver, stiffSolver, ttaSolver,\
+    autoSolver
+from pyIsoDep.functions.instrumentation import Instrumentation
+from pyIsoDep.functions.stepstorage import StepStorage, StepArray,\
+    STORAGE_WINDOW
+from pyIsoDep.functions.xshistory import XsHistory
+from pyIsoDep.functions.checkpoint import Checkpoint, CHECKPOINT_EVERY
 from pyIsoDep.functions.checkerrors import _inlist,\
-    _isequallength, _anynegative, _is1darray, _ispositive, _isarray
+    _isequallength, _anynegative, _is1darray, _ispositive, _isarray, _isint
 from pyIsoDep.functions.header import NAVO, BQ_2_CURIE,\
     TIME_UNITS_DICT, TIME_UNITS_LIST, DEPLETION_METHODS, DATA_ATTR,\
     BARN_2_CM2, IDX_XS, DECAY_MUST_ATTR, DECAY_EXPECTED_ATTR,\
-    TRANSMUATION_ATTR, DECAY_HEAT_ATTR, RADIOTOXICITY_ATTR, ACTIVITY_ATTR,\
-    MASS_ATTR
+    TRANSMUATION_ATTR, POSTPROCESS_ATTR, POSTPROCESS_METHODS,\
+    DEPLETION_INTEGRATORS, MAX_SUBSTEPS, SUBSTEP_ATOL, ISOTOPIC_TOTALS
 
 TO_PCM = 1E+5  # convert reactivity to pcm
 
+# Gauss points and weights of the fourth order commutator-free scheme used by
+# the predictor-corrector integrators (S. Blanes and P.C. Moan, 2006)
+CF4_NODES = np.array([0.5 - np.sqrt(3)/6, 0.5 + np.sqrt(3)/6])
+CF4_WGTS = np.array([0.25 + np.sqrt(3)/6, 0.25 - np.sqrt(3)/6])
+
 
 class MainDepletion:
     """A class to perform depletion or decay analysis
@@ -100,6 +113,8 @@ class MainDepletion:
         self._xsDataSets = xsDataSets
         self._timeframes = timeframes
         self._solveTime = None
+        self.profile = None
+        self.storage = None
 
         # Verify that same IDs and chains are used for all argv (i.e.data sets)
         # ---------------------------------------------------------------------
@@ -259,30 +274,94 @@ class MainDepletion:
         self.providedID = ID
         self.volume = vol
 
-    def SolveDepletion(self, method="cram", xsinterp=False, rtol=1E-10):
+    def SolveDepletion(self, method="cram", xsinterp=False, rtol=1E-10,
+                       sparse=False, solveropts=None, integrator="ce",
+                       substeps=1, steptol=None, storage=None,
+                       window=STORAGE_WINDOW, checkpoint=None,
+                       checkevery=CHECKPOINT_EVERY):
         """Solve the Bateman equations that include transmutation and decay
 
         Parameters
         ----------
         method : str
-            Method used to solve the Bateman equations
+            Method used to solve the Bateman equations. "auto" selects
+            ``expm`` or ``cram`` for each step, from the size, sparsity, and
+            norm of the matrix, with an accuracy of ``rtol``.
         xsinterp : bool
             Flag to indicate whether interpolation in between timesteps is
             allowed to be performed for the transmutation data.
         rtol : float, optional
             Isotopic concentration convergence criteria, relative difference.
             The default is 1E-10
+        sparse : bool, optional
+            Flag to indicate whether the Bateman matrix is passed to the
+            solver in a sparse (CSC) format. The matrix is always sparse if
+            the data sets were created with ``sparse=True``.
+            The default is False
+        solveropts : dict, optional
+            Additional keyword arguments passed to the solver of ``method``,
+            e.g. ``{"cachesize": 4}`` for ``cram``, ``{"tol": 1E-8}`` for
+            ``krylov``, ``{"integrator": "Radau"}`` for ``stiff``, or
+            ``{"cutoff": 1E-10}`` for ``tta``.
+            The default is None
+        integrator : str, optional
+            Time integration scheme {"ce", "cecm", "celi", "leqi"}. "ce"
+            keeps the flux of the beginning of the step. The predictor-
+            corrector schemes re-normalize the flux (to the power) and
+            interpolate the cross sections within the step. The default
+            is "ce".
+        substeps : int, optional
+            Number of substeps in each depletion step. The flux is
+            re-normalized to the power in each substep, while the results are
+            only reported for the depletion steps. The default is 1.
+        steptol : float, optional
+            Error target of the substeps. The number of substeps is doubled
+            (up to ``MAX_SUBSTEPS``) until the relative change in the
+            concentrations is lower than ``steptol``. A RuntimeWarning lists
+            the steps that do not meet the target. The default is None.
+        storage : str, optional
+            Name of an HDF5 file to which ``Nt`` is streamed step by step
+            (see ``StepStorage``). The isotopic results of the
+            post-processing methods are also written to the file, block by
+            block. The default is None, i.e. ``Nt`` is kept in memory.
+        window : int, optional
+            Number of time points of ``Nt`` kept in memory when ``storage``
+            is used. The default is ``STORAGE_WINDOW``.
+        checkpoint : str, optional
+            Name of an HDF5 file to which the state of the solution is
+            written every ``checkevery`` completed steps (see
+            ``Checkpoint``), so that it can be continued with ``Resume``.
+            The default is None.
+        checkevery : int, optional
+            Number of completed steps between the checkpoints. The default
+            is ``CHECKPOINT_EVERY``.
 
         Attributes
         ----------
-        Nt : 2-dim array
+        Nt : 2-dim array or StepArray
             Concentrations for all the isotopes as a function of time
+        XS : XsHistory
+            Weighted cross sections for all the isotopes as a function of
+            time, stored as references to the cross sections of the data
+            sets and interpolation weights
+        storage : StepStorage
+            The HDF5 file of ``Nt`` or None
+        nsubsteps : 1-dim array
+            Number of substeps used in each depletion step
+        solverStats : dict
+            Statistics of the solver (e.g., iterations of ``krylov`` or
+            internal steps of ``odeint``) or None if the solver does not
+            record any
+        stepSolvers : list
+            Solver used in each step, i.e. ``method``, or the solvers
+            selected in each step by the ``auto`` method (e.g. "cram16")
 
         Raises
         ------
         ValueError
             If ``method`` is not defined.
             If any of the attribures in ``TRANSMUATION_ATTR`` do not exist.
+            If a checkpoint is used with the ``adaptive`` method.
 
         Examples
         --------
@@ -292,13 +371,20 @@ class MainDepletion:
 
         # Check potential errors
         # ---------------------------------------------------------------------
-        _inlist(method, "Method to solve Bateman eqs", DEPLETION_METHODS)
-        if method == "cram":
-            singleDepletion = CramSolver()
-        elif method == "expm":
-            singleDepletion = expmSolver()
-        elif method == "odeint":
-            singleDepletion = odeintSolver(rtol=rtol)
+        singleDepletion = self._setSolver(method, rtol, solveropts)
+        _inlist(integrator, "Depletion integrator", DEPLETION_INTEGRATORS)
+        _isint(substeps, "Number of substeps")
+        _ispositive(substeps, "Number of substeps")
+        if steptol is not None:
+            _ispositive(steptol, "Error target of the substeps")
+        if method == "adaptive" and integrator != "ce":
+            raise ValueError("The adaptive method cannot be used with the {} "
+                             "integrator".format(integrator))
+        if checkpoint is not None and method == "adaptive":
+            raise ValueError("Checkpoints cannot be used with the adaptive "
+                             "method")
+        if checkpoint is not None and not isinstance(checkpoint, Checkpoint):
+            checkpoint = Checkpoint(checkpoint, checkevery)
 
         if self.power is None and self.flux is None:
             raise ValueError("Either power or flux must be defined when "
@@ -312,57 +398,156 @@ class MainDepletion:
                                      .format(attr, key))
 
         # Nt will store the concentrations as a function of time
-        self.Nt = np.zeros((self.nIsotopes, self.nsteps + 1))
-        self.Nt[:, 0] = self.N0  # initial concentrations
-        # Nt will store all the weighted cross sections as a function of time
-        self.XS = np.zeros((self.nIsotopes, len(IDX_XS), self.nsteps + 1))
+        # XS will store all the weighted cross sections as a function of time
+        self._allocateSteps(storage, window, xs=True)
+        self.profile = Instrumentation(self.nsteps)
+        profile = self.profile
 
         tic = time.perf_counter()  # start timer
 
         if method == "adaptive":  # if adaptive time mesh required
+            # the steps are profiled by the solver, where the interpolation
+            # and normalization within the steps are timed as "solver"
             adptDepletion = adaptiveOdeintSolver(self, xsinterp, rtol=rtol)
             adptDepletion.solve()
-            self = adptDepletion.dep
+            self._flushSteps()
             toc = time.perf_counter()
             self._solveTime = toc - tic
+            self._xsintrp = xsinterp
+            self.solverStats = adptDepletion.stats
+            self.stepSolvers = [method] * self.nsteps
             return
 
-        for idx, dt in enumerate(self.timesteps):
+        mtxCache = {}  # Bateman matrix of the previous (sub)step
+        prevRates = None  # rates and time step of the previous (sub)step
+        self.nsubsteps = np.zeros(self.nsteps, dtype=int)
+        self.stepSolvers = []
+        unconverged = []  # steps that did not meet steptol
+        start = 0  # first step that is solved
+        if checkpoint is not None and checkpoint.options is None:
+            checkpoint.create(self, {
+                "method": method, "xsinterp": xsinterp, "rtol": rtol,
+                "sparse": sparse, "solveropts": solveropts,
+                "integrator": integrator, "substeps": substeps,
+                "steptol": steptol})
+        elif checkpoint is not None:  # the completed steps are not solved
+            prevRates = checkpoint.restore(self)
+            start = checkpoint.step
+        for idx in range(start, self.nsteps):
+            dt = self.timesteps[idx]
+            ncalls = self._solverCalls(singleDepletion)
+            profile.startStep(idx, singleDepletion)
 
             # Obtain the interpolated fission energy, xs, and transmutation mtx
             # -----------------------------------------------------------------
-            fissE, sigf, transmutationmtx, xsTable =\
-                self._getInterpXS(self.timepoints[idx], xsinterp)
+            with profile.timer("xs"):
+                fissE, sigf, transmutationmtx, _ =\
+                    self._getInterpXS(self.timepoints[idx], xsinterp)
 
             # Store the weighted cross sections:
             # -----------------------------------------------------------------
-            self.XS[:, :, idx] = xsTable
-
-            # flux is used directly
-            # -----------------------------------------------------------------
-            if not self.flagPower:
-                # calculate power for this step
-                self.power[idx] = (self.flux[idx] * sigf * self.Nt[:, idx] *
-                                   fissE * self.volume).sum()
-
-            # power is provided and needs to be converted to flux
-            # -----------------------------------------------------------------
-            else:
-                self.flux[idx] = self.power[idx] / (
-                        sigf * self.Nt[:, idx] * fissE * self.volume).sum()
-
-            # define the overall matrix to represent Bateman equations
-            # -----------------------------------------------------------------
-            mtxA = transmutationmtx*self.flux[idx] + self.decaymtx
+            self._recordXS(idx, xsinterp)
+
+            with profile.timer("normalization"):
+                # flux is used directly
+                # -------------------------------------------------------------
+                if not self.flagPower:
+                    # calculate power for this step
+                    self.power[idx] = (self.flux[idx] * sigf *
+                                       self.Nt[:, idx] * fissE *
+                                       self.volume).sum()
+
+                # power is provided and needs to be converted to flux
+                # -------------------------------------------------------------
+                else:
+                    self.flux[idx] = self.power[idx] / (
+                            sigf * self.Nt[:, idx] * fissE *
+                            self.volume).sum()
 
             # solve and obtain the concentrations after a single depletion
+            # (the cross sections are shared by all the substeps)
             # -----------------------------------------------------------------
-            self.Nt[:, idx+1] =\
-                singleDepletion.solve(mtxA, self.Nt[:, idx], dt)
-
+            interval = (singleDepletion, integrator, idx, dt,
+                        (self.flux[idx], transmutationmtx), prevRates,
+                        (sigf, fissE), xsinterp, sparse, mtxCache)
+            nsub = substeps
+            Nt1, prevRates1 = self._solveInterval(nsub, *interval)
+            # the number of substeps is doubled until the error target is met
+            err = 0.0
+            while steptol is not None and 2*nsub <= MAX_SUBSTEPS:
+                nsub = 2*nsub
+                Nt2, prevRates1 = self._solveInterval(nsub, *interval)
+                absNt2 = np.abs(Nt2)
+                err = (np.abs(Nt2 - Nt1) /
+                       (absNt2 + SUBSTEP_ATOL*absNt2.max())).max()
+                Nt1 = Nt2
+                if err <= steptol:
+                    break
+            if steptol is not None and not err <= steptol:
+                unconverged.append(idx)
+            self.Nt[:, idx+1] = Nt1
+            self.nsubsteps[idx] = nsub
+            self.stepSolvers.append(
+                self._stepSolver(method, singleDepletion, ncalls))
+            profile.endStep(singleDepletion)
+            prevRates = prevRates1
+            if checkpoint is not None and checkpoint.due(idx+1, self.nsteps):
+                checkpoint.write(self, idx+1, prevRates,
+                                 time.perf_counter() - tic)
+
+        if unconverged:
+            warnings.warn("The error target steptol={} was not met with {} "
+                          "substeps in steps {}".format(
+                              steptol, MAX_SUBSTEPS, unconverged),
+                          RuntimeWarning)
+        self._flushSteps()
         toc = time.perf_counter()
         self._solveTime = toc - tic
+        if checkpoint is not None:  # time of the steps before the restart
+            self._solveTime += checkpoint._solveTime0
         self._xsintrp = xsinterp
+        self.solverStats = getattr(singleDepletion, "stats", None)
+
+    def Resume(self, checkpoint, checkevery=None, storage=None,
+               window=STORAGE_WINDOW):
+        """Continue a depletion solution from its last checkpoint
+
+        The completed steps are read from the checkpoint written by
+        ``SolveDepletion`` and the remaining steps are solved with the same
+        options. The depletion object must be defined with the same data
+        sets, scenario, and initial composition.
+
+        Parameters
+        ----------
+        checkpoint : str
+            Name of the HDF5 checkpoint file, which is updated with the
+            remaining steps
+        checkevery : int, optional
+            Number of completed steps between the checkpoints. The default
+            is None, i.e. the one of the checkpoint.
+        storage : str, optional
+            Name of an HDF5 file to which ``Nt`` is streamed step by step.
+            The default is None, i.e. ``Nt`` is kept in memory.
+        window : int, optional
+            Number of time points of ``Nt`` kept in memory when ``storage``
+            is used. The default is ``STORAGE_WINDOW``.
+
+        Raises
+        ------
+        ValueError
+            If the scenario, time frames, or initial composition differ from
+            the ones of the checkpoint.
+
+        Examples
+        --------
+        >>> dep.SolveDepletion("cram", checkpoint="run.chk", checkevery=20)
+        >>> # ... the run is killed and the depletion object is defined again
+        >>> dep.Resume("run.chk")
+        """
+
+        checkpoint = Checkpoint.load(checkpoint, checkevery)
+        self.SolveDepletion(storage=storage, window=window,
+                            checkpoint=checkpoint, **checkpoint.options)
 
     def NoDepletion(self, xsinterp=False):
         """No depletion solution at all"""
@@ -375,22 +560,20 @@ class MainDepletion:
                                      .format(attr, key))
 
         # Nt will store the concentrations as a function of time
-        self.Nt = np.zeros((self.nIsotopes, self.nsteps + 1))
-        self.Nt[:, 0] = self.N0  # initial concentrations
-        # Nt will store all the weighted cross sections as a function of time
-        self.XS = np.zeros((self.nIsotopes, len(IDX_XS), self.nsteps + 1))
+        # XS will store all the weighted cross sections as a function of time
+        self._allocateSteps(None, None, xs=True)
 
         tic = time.perf_counter()  # start timer
         for idx, dt in enumerate(self.timesteps):
 
             # Obtain the interpolated fission energy, xs, and transmutation mtx
             # -----------------------------------------------------------------
-            fissE, sigf, transmutationmtx, xsTable =\
+            fissE, sigf, transmutationmtx, _ =\
                 self._getInterpXS(self.timepoints[idx], xsinterp)
 
             # Store the weighted cross sections:
             # -----------------------------------------------------------------
-            self.XS[:, :, idx] = xsTable
+            self._recordXS(idx, xsinterp)
 
             # No depletion - power/flux do not exist
             # -----------------------------------------------------------------
@@ -403,21 +586,48 @@ class MainDepletion:
         self._solveTime = toc - tic
         self._xsintrp = xsinterp
 
-    def SolveDecay(self, method="cram", rtol=1E-10):
+    def SolveDecay(self, method="cram", rtol=1E-10, sparse=False,
+                   solveropts=None, storage=None, window=STORAGE_WINDOW):
         """Solve the Bateman equations with only the decay chains
 
         Parameters
         ----------
         method : str
-            Method used to solve the decay chains
+            Method used to solve the decay chains ("auto" selects the
+            solver for each step)
         rtol : float, optional
             Isotopic concentration convergence criteria, relative difference.
             The default is 1E-10
+        sparse : bool, optional
+            Flag to indicate whether the decay matrix is passed to the
+            solver in a sparse (CSC) format. The matrix is always sparse if
+            the data sets were created with ``sparse=True``.
+            The default is False
+        solveropts : dict, optional
+            Additional keyword arguments passed to the solver of ``method``,
+            e.g. ``{"order": 16, "fastorder": 8, "fastdt": 3600.0}`` for
+            ``cram``, ``{"tol": 1E-8}`` for ``krylov``,
+            ``{"integrator": "Radau"}`` for ``stiff``, or
+            ``{"cutoff": 1E-10}`` for ``tta``.
+            The default is None
+        storage : str, optional
+            Name of an HDF5 file to which ``Nt`` is streamed step by step.
+            The default is None, i.e. ``Nt`` is kept in memory.
+        window : int, optional
+            Number of time points of ``Nt`` kept in memory when ``storage``
+            is used. The default is ``STORAGE_WINDOW``.
 
         Attributes
         ----------
-        Nt : 2-dim array
+        Nt : 2-dim array or StepArray
             Concentrations for all the isotopes as a function of time
+        solverStats : dict
+            Statistics of the solver (e.g., iterations of ``krylov`` or
+            internal steps of ``odeint``) or None if the solver does not
+            record any
+        stepSolvers : list
+            Solver used in each step, i.e. ``method``, or the solvers
+            selected in each step by the ``auto`` method (e.g. "cram16")
 
         Raises
         ------
@@ -432,42 +642,263 @@ class MainDepletion:
 
         # Check potential errors
         # ---------------------------------------------------------------------
-        _inlist(method, "Method to solve Bateman eqs", DEPLETION_METHODS)
-        if method == "cram":
-            singleDepletion = CramSolver()
-        elif method == "expm":
-            singleDepletion = expmSolver()
-        elif method == "odeint":
-            singleDepletion = odeintSolver(rtol=rtol)
+        singleDepletion = self._setSolver(method, rtol, solveropts,
+                                          decay=True)
 
         # Nt will store the concentrations as a function of time
-        self.Nt = np.zeros((self.nIsotopes, self.nsteps + 1))
-        self.Nt[:, 0] = self.N0  # initial concentrations
+        self._allocateSteps(storage, window, xs=False)
         tic = time.perf_counter()
 
-        if method == "adaptive":  # if adaptive time mesh required
-            adptDepletion = adaptiveOdeintSolver(self, False, rtol=rtol)
-            adptDepletion.solve()
-            self = adptDepletion.dep
-            toc = time.perf_counter()
-            self._solveTime = toc - tic
-            return
-
-        for idx, dt in enumerate(self.timesteps):
+        if method == "adaptive":  # the decay matrix is constant in time
+            singleDepletion = odeintSolver(rtol=rtol)
+        self.profile = Instrumentation(self.nsteps)
+        profile = self.profile
 
-            # define the overall matrix to represent Bateman equations
-            # -----------------------------------------------------------------
+        # define the overall matrix to represent Bateman equations
+        # ---------------------------------------------------------------------
+        with profile.timer("matrix"):
             mtxA = self.decaymtx
+            if sparse:
+                mtxA = csc_matrix(mtxA)
+
+        self.stepSolvers = []
+        for idx, dt in enumerate(self.timesteps):
 
             # solve and obtain the concentrations after a single depletion
             # -----------------------------------------------------------------
-            self.Nt[:, idx+1] =\
-                singleDepletion.solve(mtxA, self.Nt[:, idx], dt)
+            ncalls = self._solverCalls(singleDepletion)
+            profile.startStep(idx, singleDepletion)
+            with profile.timer("solver"):
+                self.Nt[:, idx+1] =\
+                    singleDepletion.solve(mtxA, self.Nt[:, idx], dt)
+            self.stepSolvers.append(
+                self._stepSolver(method, singleDepletion, ncalls))
+            profile.endStep(singleDepletion)
+        self._flushSteps()
         toc = time.perf_counter()
         self._solveTime = toc - tic
+        self.solverStats = getattr(singleDepletion, "stats", None)
 
-    def _getInterpXS(self, currtime, interpFlag):
-        """Obtains the transmutation data required to solve depletion"""
+    def _setSolver(self, method, rtol, solveropts, decay=False):
+        """Creates the solver used for each of the depletion steps"""
+
+        _inlist(method, "Method to solve Bateman eqs", DEPLETION_METHODS)
+        if solveropts is None:
+            solveropts = {}
+        if method == "cram":
+            return CramSolver(**solveropts)
+        elif method == "expm":
+            return expmSolver(**solveropts)
+        elif method == "odeint":
+            return odeintSolver(rtol=rtol, **solveropts)
+        elif method == "krylov":
+            return krylovSolver(**solveropts)
+        elif method == "stiff":
+            return stiffSolver(rtol=rtol, **solveropts)
+        elif method == "tta":
+            return ttaSolver(**solveropts)
+        elif method == "auto":
+            return autoSolver(rtol=rtol, decay=decay, **solveropts)
+        return None  # adaptive solver is created with the depletion object
+
+    def _allocateSteps(self, storage, window, xs=True):
+        """Arrays (or HDF5 datasets) of the values of all the time points"""
+        if self.storage is not None:  # results of a previous solution
+            self.storage.close()
+            self.storage = None
+        shapeNt = self.N0.shape + (self.nsteps + 1,)  # time on the last axis
+        if storage is None:
+            self.Nt = np.zeros(shapeNt)
+        else:
+            self.storage = StepStorage(storage, window)
+            self.Nt = self.storage.create("Nt", shapeNt)
+        self.Nt[..., 0] = self.N0  # initial concentrations
+        if xs:  # references to the cross sections of the time frames
+            self.XS = XsHistory([self._xsDataSets[timeframe].xsData
+                                 for timeframe in self._timeframes],
+                                self.nsteps + 1)
+
+    def _recordXS(self, idx, xsinterp):
+        """Stores the time frames and weight of the cross sections of idx"""
+        self.XS.record(idx, *self._getFrames(self.timepoints[idx], xsinterp))
+
+    def _flushSteps(self):
+        """Writes the time points kept in memory to the storage"""
+        if self.storage is not None:
+            self.storage.flush()
+
+    def _postprocessTime(self, name, tic):
+        """Adds the time of a post-processing method to the profile"""
+        if self.profile is not None:
+            self.profile.postprocess[name] = time.perf_counter() - tic
+
+    def _isotopeRows(self, isotopes):
+        """Rows of the isotopes in the full list or all the rows if None"""
+        if isotopes is None:
+            return slice(None)
+        _isarray(isotopes, "Isotopes Id")
+        isotopes = np.array(isotopes, dtype=int)
+        missing = isotopes[~np.isin(isotopes, self.fullId)]
+        if missing.size:
+            raise KeyError("Isotopes {} do not exist in the data"
+                           .format(missing))
+        return np.nonzero(np.isin(self.fullId, isotopes))[0]
+
+    @staticmethod
+    def _solverCalls(solver):
+        """Number of solutions recorded by the auto solver"""
+        return len(solver.stats["solver"]) if isinstance(solver, autoSolver)\
+            else 0
+
+    @staticmethod
+    def _stepSolver(method, solver, ncalls):
+        """Solvers used in a step, from the calls after ncalls"""
+
+        if not isinstance(solver, autoSolver):
+            return method
+        names = solver.stats["solver"][ncalls:]
+        return "/".join(sorted(set(names), key=names.index))
+
+    def _getBatemanMtx(self, transmutationmtx, flux, sparse):
+        """Combines the transmutation and decay matrices for a given flux"""
+
+        mtxA = transmutationmtx*flux + self.decaymtx
+        if sparse or issparse(transmutationmtx) or issparse(self.decaymtx):
+            mtxA = csc_matrix(mtxA)
+        return mtxA
+
+    def _solveInterval(self, nsub, solver, integrator, idx, dt, rates,
+                       prevRates, fission, xsinterp, sparse, mtxCache):
+        """Concentrations at the end of a depletion step using substeps
+
+        The flux is re-normalized to the power at the beginning of each
+        substep with the cross sections of the step (``fission`` holds the
+        fission xs and energy). Returns the concentrations and the rates of
+        the last substep.
+
+        """
+
+        n0 = self.Nt[:, idx]
+        ddt = dt / nsub
+        for sub in range(nsub):
+            if sub > 0 and integrator != "ce":
+                rates = self._getRates(n0, idx, sub*ddt, xsinterp)
+            elif sub > 0 and self.flagPower:
+                sigf, fissE = fission
+                with self.profile.timer("normalization"):
+                    rates = (self.power[idx] / (
+                        sigf * n0 * fissE * self.volume).sum(), rates[1])
+
+            if integrator == "ce":
+                # the same matrix object is kept if the flux and transmutation
+                # data did not change, so cached factorizations can be reused
+                if mtxCache.get("rates") != (rates[0], id(rates[1])):
+                    with self.profile.timer("matrix"):
+                        mtxCache["mtx"] = self._getBatemanMtx(
+                            rates[1], rates[0], sparse)
+                    mtxCache["rates"] = (rates[0], id(rates[1]))
+                    mtxCache["trmtx"] = rates[1]  # keeps the id valid
+                with self.profile.timer("solver"):
+                    n1 = solver.solve(mtxCache["mtx"], n0, ddt)
+            else:
+                n1 = self._predictorCorrector(solver, integrator, idx,
+                                              sub*ddt, ddt, n0, rates,
+                                              prevRates, xsinterp, sparse)
+            prevRates = (rates, ddt)
+            n0 = n1
+        return n0, prevRates
+
+    def _getRates(self, n, idx, t, xsinterp):
+        """Flux and transmutation matrix for n at time t [s] in step idx"""
+
+        currtime = self.timepoints[idx] + t / TIME_UNITS_DICT[self.timeunits]
+        with self.profile.timer("xs"):
+            fissE, sigf, transmutationmtx, _ =\
+                self._getInterpXS(currtime, xsinterp)
+        if not self.flagPower:
+            return self.flux[idx], transmutationmtx
+        with self.profile.timer("normalization"):
+            flux = self.power[idx] / (sigf * n * fissE * self.volume).sum()
+        return flux, transmutationmtx
+
+    def _predictorCorrector(self, solver, integrator, idx, t0, dt, n0, rates,
+                            prevRates, xsinterp, sparse):
+        """Concentrations at the end of a step with a predictor-corrector
+
+        The step starts at time ``t0`` [s] from the beginning of the
+        depletion step ``idx``. ``rates`` are the flux and transmutation
+        matrix at the beginning of the step, and ``prevRates`` the ones of
+        the previous step together with its time step (None for the first
+        step).
+
+        """
+
+        def getRates(n, t):
+            """flux and transmutation matrix for n at time t in the step"""
+            return self._getRates(n, idx, t0 + t, xsinterp)
+
+        if integrator == "cecm":
+            # predictor to the middle of the step, corrector with its rates
+            nMid = self._solveRates(solver, [1.0], [rates], n0, dt/2, sparse)
+            return self._solveRates(solver, [1.0], [getRates(nMid, dt/2)],
+                                    n0, dt, sparse)
+
+        times, ratesList = [0.0], [rates]
+        if integrator == "leqi" and prevRates is not None:
+            # linear extrapolation from the previous step (predictor)
+            times, ratesList = [-prevRates[1], 0.0], [prevRates[0], rates]
+            n1 = self._solveCF4(solver, times, ratesList, n0, dt, sparse)
+        else:
+            # constant extrapolation (predictor)
+            n1 = self._solveRates(solver, [1.0], [rates], n0, dt, sparse)
+        # linear or quadratic interpolation with the end of step (corrector)
+        times.append(dt)
+        ratesList.append(getRates(n1, dt))
+        return self._solveCF4(solver, times, ratesList, n0, dt, sparse)
+
+    def _solveCF4(self, solver, times, ratesList, n0, dt, sparse):
+        """Commutator-free solution with rates interpolated in time
+
+        The rates are interpolated (Lagrange polynomial through ``times``) to
+        the two Gauss points of the step, and combined into two exponentials.
+
+        """
+
+        times = np.array(times, dtype=float)
+        lagrange = np.ones((len(CF4_NODES), len(times)))
+        for k, tk in enumerate(times):
+            for j, tj in enumerate(times):
+                if j != k:
+                    lagrange[:, k] *= (CF4_NODES*dt - tj) / (tk - tj)
+        n1 = n0
+        for wgts in (CF4_WGTS, CF4_WGTS[::-1]):
+            n1 = self._solveRates(solver, wgts @ lagrange, ratesList, n1, dt,
+                                  sparse)
+        return n1
+
+    def _solveRates(self, solver, wgts, ratesList, n0, dt, sparse):
+        """Solve exp(dt*sum(wgt*A(rates)))*n0 for a combination of rates"""
+
+        # sum(wgt*A) = sum(wgt)*(decay + sum(wgt*flux*transmutation)/sum(wgt))
+        wgtSum = sum(wgts)
+        trWgts = {}
+        for wgt, (flux, transmutationmtx) in zip(wgts, ratesList):
+            key = id(transmutationmtx)
+            trWgts[key] = (trWgts.get(key, (0.0,))[0] + wgt*flux/wgtSum,
+                           transmutationmtx)
+        with self.profile.timer("matrix"):
+            if len(trWgts) == 1:
+                flux, transmutationmtx = list(trWgts.values())[0]
+            else:
+                transmutationmtx = sum(wgt*mtx
+                                       for wgt, mtx in trWgts.values())
+                flux = 1.0
+            mtxA = self._getBatemanMtx(transmutationmtx, flux, sparse)
+        with self.profile.timer("solver"):
+            return solver.solve(mtxA, n0, wgtSum*dt)
+
+    def _getFrames(self, currtime, interpFlag):
+        """Indices of the time frames around currtime and interpolation wgt"""
 
         timeframes = self._timeframes
         # Find the index of closest data with a time below the current time
@@ -485,14 +916,24 @@ class MainDepletion:
 
         # Cross sections are not interpolated
         if not interpFlag or idx0 == idx1:
+            return idx0, idx0, 0.0
+        wgt = (currtime-timeframes[idx0])/(timeframes[idx1]-timeframes[idx0])
+        return idx0, idx1, wgt
+
+    def _getInterpXS(self, currtime, interpFlag):
+        """Obtains the transmutation data required to solve depletion"""
+
+        timeframes = self._timeframes
+        idx0, idx1, wgt = self._getFrames(currtime, interpFlag)
+
+        # Cross sections are not interpolated
+        if idx0 == idx1:
             data = self._xsDataSets[timeframes[idx0]]
             fissE = data.EfissJoule  # fission energy in joules
             sigf = data.xsData[:, IDX_XS["f"]] / BARN_2_CM2  # fission xs barns
             transmutationmtx = data.transmutationmtx
             xsTable = data.xsData
         else:
-            wgt =\
-                (currtime-timeframes[idx0])/(timeframes[idx1]-timeframes[idx0])
             data0 = self._xsDataSets[timeframes[idx0]]
             data1 = self._xsDataSets[timeframes[idx1]]
             fissE0 = data0.EfissJoule
@@ -507,14 +948,64 @@ class MainDepletion:
             transmutationmtx =\
                 (1-wgt)*transmutationmtx0 + wgt*transmutationmtx1
             # weighted cross sections
-            xsTable = (1-wgt)*data0.xsData + wgt*data0.xsData
+            xsTable = (1-wgt)*data0.xsData + wgt*data1.xsData
             xsTable[:, 0] = data0.xsData[:, 0]
 
         return fissE, sigf, transmutationmtx, xsTable
 
-    def DecayHeat(self):
+    def PostProcess(self, methods=None, totalsOnly=False):
+        """Calculate several derived quantities in a single pass
+
+        The activity is computed once and shared by all the ``methods``.
+        If only the totals are requested, these are obtained with a single
+        product of the weights of all the ``methods`` (e.g., ``Q*lmbda``)
+        with the concentrations, without the isotopic matrices.
+        If ``Nt`` is streamed to a ``storage`` file, the concentrations are
+        read block by block, and the isotopic quantities are written to
+        datasets of the file (``StepArray`` attributes) instead of being
+        kept in memory.
+
+        Parameters
+        ----------
+        methods : list, optional
+            Post-processing methods {"Activity", "DecayHeat",
+            "Radiotoxicity", "Mass"}. The default is None, i.e. all methods.
+        totalsOnly : bool, optional
+            Flag to compute only the totals (``totalAtCurie``, ``totalQt``,
+            ``totalToxIngestion``, ``totalToxInhalation``, ``totalMassgr``).
+            The default is False.
+
+        Raises
+        ------
+        KeyError
+            If any of the ``methods`` does not exist.
+        ValueError
+            If any of the attributes required by the ``methods`` is missing.
+
+        Examples
+        --------
+        >>> dep.PostProcess(["DecayHeat", "Activity"], totalsOnly=True)
+        >>> dep.totalQt
+        array([21.82682687, 22.79949867])
+
+        """
+        tic = time.perf_counter()
+        if methods is None:
+            methods = POSTPROCESS_METHODS
+        _isarray(methods, "Post-processing methods")
+        for method in methods:
+            _inlist(method, "Post-processing method", POSTPROCESS_METHODS)
+        self._derivedQuantities(methods, totalsOnly)
+        self._postprocessTime("PostProcess", tic)
+
+    def DecayHeat(self, totalsOnly=False):
         """Calculate decay heat in Watts
 
+        Parameters
+        ----------
+        totalsOnly : bool, optional
+            Flag to compute only ``totalQt``. The default is False.
+
         Attributes
         ----------
         At : 2-dim array
@@ -524,25 +1015,19 @@ class MainDepletion:
         totalQt : 1-dim array
             Total decay heat in Watts as a function of time
         """
+        tic = time.perf_counter()
+        self._derivedQuantities(["DecayHeat"], totalsOnly)
+        self._postprocessTime("DecayHeat", tic)
 
-        # check that all the attributes exist
-        for attr in DECAY_HEAT_ATTR:
-            if not hasattr(self, attr):
-                raise ValueError("No attribute <{}> in data".format(attr))
-
-        mtxQ = np.tile(self.Q, (self.nsteps + 1, 1))  # Q-values [Watts/Bq]
-        mtxL = np.tile(self.lmbda, (self.nsteps + 1, 1))  # Decay constants
-        mtxQ = mtxQ.transpose()
-        mtxL = mtxL.transpose()
-        # Activity, becquerel
-        self.At = self.volume * mtxL * self.Nt / BARN_2_CM2
-        # Calculate Decay heat
-        self.Qt = self.At * mtxQ
-        self.totalQt = self.Qt.sum(axis=0)
-
-    def Radiotoxicity(self):
+    def Radiotoxicity(self, totalsOnly=False):
         """Calculate radiotoxicity in Sv
 
+        Parameters
+        ----------
+        totalsOnly : bool, optional
+            Flag to compute only the total radiotoxicities.
+            The default is False.
+
         Attributes
         ----------
         At : 2-dim array
@@ -556,31 +1041,18 @@ class MainDepletion:
         totalToxInhalation : 2-dim array
             Total inhalation radiotoxicity in Sv against time
         """
+        tic = time.perf_counter()
+        self._derivedQuantities(["Radiotoxicity"], totalsOnly)
+        self._postprocessTime("Radiotoxicity", tic)
 
-        # check that all the attributes exist
-        for attr in RADIOTOXICITY_ATTR:
-            if not hasattr(self, attr):
-                raise ValueError("No attribute <{}> in data".format(attr))
-
-        # Ingestion coefficients [Sv/Bq]
-        mtxToxIng = np.tile(self.ingestion, (self.nsteps + 1, 1))
-        # Inhalation coefficients [Sv/Bq]
-        mtxToxInh = np.tile(self.inhalation, (self.nsteps + 1, 1))
-        mtxToxIng = mtxToxIng.transpose()
-        mtxToxInh = mtxToxInh.transpose()
-        mtxL = np.tile(self.lmbda, (self.nsteps + 1, 1))  # Decay constants
-        mtxL = mtxL.transpose()
-        # Activity, becquerel
-        self.At = self.volume * mtxL * self.Nt / BARN_2_CM2
-        # Calculate Radotoxicity
-        self.toxicityIngestion = self.At * mtxToxIng
-        self.toxicityInhalation = self.At * mtxToxInh
-        self.totalToxIngestion = self.toxicityIngestion.sum(axis=0)
-        self.totalToxInhalation = self.toxicityInhalation.sum(axis=0)
-
-    def Activity(self):
+    def Activity(self, totalsOnly=False):
         """Calculate isotopic and total actitvity in Cuire
 
+        Parameters
+        ----------
+        totalsOnly : bool, optional
+            Flag to compute only ``totalAtCurie``. The default is False.
+
         Attributes
         ----------
         At : 2-dim array
@@ -590,21 +1062,18 @@ class MainDepletion:
         totalAtCurie : 1-dim array
             Total acitivity in Curie as a function of time
         """
+        tic = time.perf_counter()
+        self._derivedQuantities(["Activity"], totalsOnly)
+        self._postprocessTime("Activity", tic)
 
-        # check that all the attributes exist
-        for attr in ACTIVITY_ATTR:
-            if not hasattr(self, attr):
-                raise ValueError("No attribute <{}> in data".format(attr))
-
-        mtxL = np.tile(self.lmbda, (self.nsteps + 1, 1))  # Decay constants
-        mtxL = mtxL.transpose()
-        # Activity, becquerel
-        self.AtCurie = self.volume * mtxL * self.Nt / BARN_2_CM2 / BQ_2_CURIE
-        self.totalAtCurie = self.AtCurie.sum(axis=0)
-
-    def Mass(self):
+    def Mass(self, totalsOnly=False):
         """Calculate isotopic and total masses in grams
 
+        Parameters
+        ----------
+        totalsOnly : bool, optional
+            Flag to compute only ``totalMassgr``. The default is False.
+
         Attributes
         ----------
         mass : 2-dim array
@@ -612,78 +1081,198 @@ class MainDepletion:
         totalmass : 1-dim array
             Total mass in grams as a function of time
         """
+        tic = time.perf_counter()
+        self._derivedQuantities(["Mass"], totalsOnly)
+        self._postprocessTime("Mass", tic)
+
+    def _derivedQuantities(self, methods, totalsOnly):
+        """Isotopic and total quantities of the post-processing methods"""
+
         # check that all the attributes exist
-        for attr in MASS_ATTR:
-            if not hasattr(self, attr):
-                raise ValueError("No attribute <{}> in data".format(attr))
+        for method in methods:
+            for attr in POSTPROCESS_ATTR[method]:
+                if not hasattr(self, attr):
+                    raise ValueError("No attribute <{}> in data".format(attr))
+
+        # Weights of the concentrations for each quantity
+        weights = {}
+        activity = bool(set(methods) & {"Activity", "DecayHeat",
+                                        "Radiotoxicity"})
+        if activity:  # Activity, becquerel
+            actWgt = self.volume * np.asarray(self.lmbda, float) / BARN_2_CM2
+        if "Activity" in methods:
+            weights["totalAtCurie"] = actWgt / BQ_2_CURIE
+        if "DecayHeat" in methods:  # Q-values [Watts/Bq]
+            weights["totalQt"] = actWgt * np.asarray(self.Q, float)
+        if "Radiotoxicity" in methods:  # Ingestion/inhalation [Sv/Bq]
+            weights["totalToxIngestion"] =\
+                actWgt * np.asarray(self.ingestion, float)
+            weights["totalToxInhalation"] =\
+                actWgt * np.asarray(self.inhalation, float)
+        if "Mass" in methods:  # Mass in grams
+            weights["totalMassgr"] =\
+                self.volume * np.asarray(self.AW, float) / NAVO
+
+        if totalsOnly:
+            totals = self._totals(np.array(list(weights.values())))
+            for attr, total in zip(weights, totals):
+                setattr(self, attr, total)
+            return
+
+        def isotopic(first, Nt):
+            """Isotopic quantities and totals for the concentrations Nt"""
+            values = {}
+            if "totalMassgr" in weights:
+                values["massgr"] = weights["totalMassgr"][:, None] * Nt
+            if activity:
+                At = actWgt[:, None] * Nt  # shared by all the quantities
+                values["At"] = At
+            if "Activity" in methods:
+                values["AtCurie"] = At / BQ_2_CURIE
+            if "DecayHeat" in methods:
+                values["Qt"] = At * np.asarray(self.Q, float)[:, None]
+            if "Radiotoxicity" in methods:
+                values["toxicityIngestion"] =\
+                    At * np.asarray(self.ingestion, float)[:, None]
+                values["toxicityInhalation"] =\
+                    At * np.asarray(self.inhalation, float)[:, None]
+            return values, {total: values[attr].sum(axis=0)
+                            for attr, total in ISOTOPIC_TOTALS.items()
+                            if attr in values}
+
+        if isinstance(self.Nt, StepArray):
+            # stored concentrations are processed and written block by block
+            values, totals = self._storeBlocks(isotopic, self.Nt.shape[-1])
+        else:
+            values, totals = isotopic(0, self.Nt)
+        for attr, vals in list(values.items()) + list(totals.items()):
+            setattr(self, attr, vals)
 
-        mtxAW = np.tile(self.AW, (self.nsteps + 1, 1))  # Atomic Weight
-        mtxAW = mtxAW.transpose()
-        # Mass in grams
-        self.massgr = self.volume * mtxAW * self.Nt / NAVO
-        self.totalMassgr = self.massgr.sum(axis=0)
+    def _storeBlocks(self, isotopic, npoints):
+        """Isotopic values of blocks of time points written to the storage
 
-    def Reactivity(self, nonLeakageP=1.0):
+        The stored concentrations of the first ``npoints`` time points are
+        read block by block. ``isotopic(first, Nt)`` returns two dictionaries
+        with the isotopic values and with the totals for the concentrations
+        ``Nt`` of the block that starts at ``first``. Returns the
+        ``StepArray`` of each isotopic quantity and the totals of all the
+        time points.
+
+        """
+        arrays, totals = {}, {}
+        for first, Nt in self.Nt.blocks():
+            if first >= npoints:
+                break
+            values, blockTotals = isotopic(first, Nt[..., :npoints-first])
+            for attr, vals in values.items():
+                if attr not in arrays:
+                    arrays[attr] = self.storage.create(
+                        attr, vals.shape[:-1] + (npoints,))
+                arrays[attr].writeBlock(first, vals)
+            for attr, vals in blockTotals.items():
+                totals.setdefault(attr, []).append(vals)
+        return arrays, {attr: np.hstack(vals) for attr, vals in totals.items()}
+
+    def _totals(self, weights):
+        """Products of the weights with the concentrations of all times"""
+        if not isinstance(self.Nt, StepArray):
+            return weights @ self.Nt
+        # the stored concentrations are read block by block
+        return np.hstack([weights @ Nt for _, Nt in self.Nt.blocks()])
+
+    def Reactivity(self, nonLeakageP=1.0, isotopes=None):
         """Isotopic reactivity worth using first order perturbation theory.
 
+        The sensitivities of the multiplication factor to the concentrations,
+        dkeff/dNj = (nu_j*sigf_j*SIG_ABS - siga_j*SIG_NSF) / SIG_ABS**2,
+        are evaluated for all the isotopes and time points at once.
+
+        Parameters
+        ----------
+        nonLeakageP : float, optional
+            Non-leakage probability applied to the multiplication factor.
+            The default is 1.0
+        isotopes : list or array, optional
+            Identifiers (ZZAAA0/1) of the isotopes for which the reactivity
+            worth is evaluated. The worth of the other isotopes is zero.
+            The default is None, i.e. all the isotopes.
+
         Attributes
         ----------
-        reactivityworth : 2-dim array
-            Reactivity worth in pcm for all the isotopes as a function of time
-        reactivity : 1-dim array
+        keff : 1-dim array
+            Multiplication factor as a function of time
+        Rho : 1-dim array
             Total reactivity in pcm
+        dRho : 2-dim array or StepArray
+            Reactivity worth in pcm for all the isotopes as a function of
+            time, written block by block to the ``storage`` file if used
+        dRhoToRho : 2-dim array or StepArray
+            Reactivity worth relative to the total reactivity
 
-        """
+        Raises
+        ------
+        ValueError
+            If the attribute ``nu`` does not exist.
+        KeyError
+            If any of the ``isotopes`` does not exist in the data.
 
-        abs_xs = np.zeros((self.nIsotopes, self.nsteps))
-        fiss_xs = np.zeros((self.nIsotopes, self.nsteps))
-        self.dRho = np.zeros((self.nIsotopes, self.nsteps))
-        self.dRhoToRho = np.zeros((self.nIsotopes, self.nsteps))
-        self.Rho = np.zeros(self.nsteps)
-        self.keff = np.zeros(self.nsteps)
-        # macroscopic cross sections
-        self.SIG_ABS = np.zeros(self.nsteps)
-        self.SIG_NSF = np.zeros(self.nsteps)
-        self.SIG_FISS = np.zeros(self.nsteps)
+        """
+        tic = time.perf_counter()
 
         if self.nu is None:
             raise ValueError("Attribute nu does not exist. Please define in "
                              "Transmutation Data.")
+        rows = self._isotopeRows(isotopes)
+
+        nu = np.array(self.nu, dtype=float)
 
-        for i in range(self.nsteps):
-            abs_xs[:, i] = self.XS[:, IDX_XS['abs'], i]
-            fiss_xs[:, i] = self.XS[:, IDX_XS['f'], i]
+        def worth(first, Nt):
+            """Reactivity worth for the concentrations Nt from step first"""
 
-            # Multiplication factor at the specific time point
-            self.SIG_FISS[i] = (self.Nt[:, i] * fiss_xs[:, i]).sum()
-            self.SIG_NSF[i] = (self.Nt[:, i] * self.nu * fiss_xs[:, i]).sum()
-            self.SIG_ABS[i] = (self.Nt[:, i] * abs_xs[:, i]).sum()
+            # cross sections at the beginning of the steps
+            steps = slice(first, first + Nt.shape[-1])
+            abs_xs = self.XS[:, IDX_XS['abs'], steps]
+            fiss_xs = self.XS[:, IDX_XS['f'], steps]
 
-            self.keff[i] = self.SIG_NSF[i] / self.SIG_ABS[i]
+            # macroscopic cross sections
+            SIG_FISS = (Nt * fiss_xs).sum(axis=0)
+            SIG_NSF = (Nt * nu[:, None] * fiss_xs).sum(axis=0)
+            SIG_ABS = (Nt * abs_xs).sum(axis=0)
 
-            # Total reactivity at the specific time point
-            self.Rho[i] = TO_PCM * (1 - 1/self.keff[i])
+            # Multiplication factor and total reactivity at the time points
+            keff = SIG_NSF / SIG_ABS
+            Rho = TO_PCM * (1 - 1/keff)
 
             # Calculate the sensitivity of Nj to keff -> dkeff/dNj
-            dkeff2dN = np.zeros(self.nIsotopes)
-            for j in range(self.nIsotopes):
-                dkeff2dN[j] =\
-                    (self.nu[j]*fiss_xs[j, i]*(
-                        self.Nt[:, i]*abs_xs[:, i]).sum()-abs_xs[j, i]*(
-                            self.Nt[:, i]*self.nu*fiss_xs[:, i]).sum())/(
-                                self.Nt[:, i]*abs_xs[:, i]).sum()**2
+            dkeff2dN = (nu[rows, None] * fiss_xs[rows] * SIG_ABS -
+                        abs_xs[rows] * SIG_NSF) / SIG_ABS**2
 
             # Perturbed multiplication factor without the isotope j
             # dkeff/dNj*DeltaNj = DeltaKeff
-            keff_wIsot = self.keff[i] + dkeff2dN*self.Nt[:, i]
-
-            # reactivity without the isotope j
-            rho_wIsot = TO_PCM * (1 - 1/keff_wIsot)
+            keff_wIsot = keff + dkeff2dN * Nt[rows]
 
             # reactivity worth
-            self.dRho[:, i] = rho_wIsot - self.Rho[i]
-            self.dRhoToRho[:, i] = self.dRho[:, i] / self.Rho[i]
+            dRho = np.zeros((self.nIsotopes, Nt.shape[-1]))
+            dRhoToRho = np.zeros((self.nIsotopes, Nt.shape[-1]))
+            dRho[rows] = TO_PCM * (1 - 1/keff_wIsot) - Rho
+            dRhoToRho[rows] = dRho[rows] / Rho
+            return {"dRho": dRho, "dRhoToRho": dRhoToRho},\
+                {"SIG_FISS": SIG_FISS, "SIG_NSF": SIG_NSF, "SIG_ABS": SIG_ABS}
+
+        # concentrations at the beginning of the steps
+        if isinstance(self.Nt, StepArray):
+            # stored concentrations are processed and written block by block
+            values, totals = self._storeBlocks(worth, self.nsteps)
+        else:
+            values, totals = worth(0, self.Nt[:, :self.nsteps])
+        for attr, vals in list(values.items()) + list(totals.items()):
+            setattr(self, attr, vals)
+
+        # Multiplication factor and total reactivity at all the time points
+        self.keff = self.SIG_NSF / self.SIG_ABS
+        self.Rho = TO_PCM * (1 - 1/self.keff)
 
         # Include the leakage probability
         self.keff = self.keff * nonLeakageP
         self.Rho = TO_PCM * (1 - 1/self.keff)
+        self._postprocessTime("Reactivity", tic)
@@ -12,6 +12,7 @@ import numpy as np
 import pandas as pa
 import h5py
 import matplotlib.pyplot as plt
+from scipy.sparse import issparse
 
 
 from pyIsoDep.functions.checkerrors import _inlist, _isarray, _isstr,\
@@ -20,6 +21,9 @@ from pyIsoDep.functions.header import TIME_UNITS_DICT,\
     TIME_UNITS_LIST, FONT_SIZE, HDF5_GROUPS, DATA_ATTR, ZAI_DICT,\
     TIME_UNITS_CONV_MTX, INTERVAL_ATTRIBUTES, RANK_ATTRIBUTES, RANK_PARAMETERS
 from pyIsoDep.functions.generatedata import TransmutationData
+from pyIsoDep.functions.instrumentation import Instrumentation
+from pyIsoDep.functions.stepstorage import StepArray
+from pyIsoDep.functions.xshistory import XsHistory
 
 
 class Results:
@@ -29,8 +33,15 @@ class Results:
 
     Parameters
     ----------
-    Nt : 2-dim adday
-        Nuclide densities as a function of time
+    results : MainDepletion object or str
+        The depletion results or the name of an hdf5 file with results
+    includeXS : bool, optional
+        Flag to recover the cross section libaries from the hdf5 file
+    lazy : bool, optional
+        Flag to keep the isotopic results (e.g. ``Nt``) of the hdf5 file as
+        ``StepArray`` objects that read the requested values from the
+        file. The file remains open until ``close`` is called (or the
+        ``with`` block is exited). The default is False.
 
 
     Attributes
@@ -42,20 +53,38 @@ class Results:
     --------
     >>> dep = Results(depscenario)
     >>> dep = Results("dep.h5")
+    >>> with Results("dep.h5", lazy=True) as dep:
+    >>>     dep.getvalues("Nt", [922350])
 
     """
 
-    def __init__(self, results, includeXS=True):
+    def __init__(self, results, includeXS=True, lazy=False):
         """reset by copying all the attributes from the results container"""
         if type(results) is str:
-            self.__recover(results, includeXS)
+            self.__recover(results, includeXS, lazy)
         else:
             self.__dict__ = results.__dict__.copy()
+            self._file = None  # the storage file belongs to the results
 
-    def __buildGroup(self, f, key, attrs):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Close the hdf5 file of the lazily recovered results"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __buildGroup(self, f, key, attrs, lazy=False):
         """function reconstructs a single groups results data from hdf5 file"""
         for i in attrs:
             try:
+                if lazy and f[key][i].ndim == 2:  # isotopic results
+                    setattr(self, i, StepArray(f[key][i], window=0))
+                    continue
                 data = f[key][i][()]
                 if type(data) is bytes:
                     data = str(data, "utf-8")
@@ -74,16 +103,20 @@ class Results:
             xslibs[float(i)] = xslib
         self._xsDataSets = xslibs
 
-    def __recover(self, file, includeXS=True):
+    def __recover(self, file, includeXS=True, lazy=False):
         """function recovers all results data container from hdf5 file"""
         _isstr(file, "results hdf5 output file name")
         _isbool(includeXS, "flag to include xs libaries")
+        _isbool(lazy, "flag to read the isotopic results lazily")
         keys = list(HDF5_GROUPS.keys())
         keys.remove("xsData")
-        with h5py.File(file, "r+") as f:
+        f = h5py.File(file, "r" if lazy else "r+")
+        self._file = None
+        try:
             for i in keys:
                 try:
-                    self.__buildGroup(f, i, HDF5_GROUPS[i])
+                    self.__buildGroup(f, i, HDF5_GROUPS[i],
+                                      lazy and i == "results")
                 except:
                     print("{} not found in results".format(i))
             if includeXS:
@@ -91,6 +124,36 @@ class Results:
                     self.__buildCrossSectionLibary(f, HDF5_GROUPS["xsData"])
                 except:
                     print("XS libaries not found in results")
+            self.profile = None
+            if "profile" in f:
+                self.__buildProfile(f["profile"])
+            if includeXS and "xsHistory" in f:
+                self.__buildXsHistory(f["xsHistory"])
+        except BaseException:
+            f.close()
+            raise
+        if lazy:  # the lazy results are read from the open file
+            self._file = f
+        else:
+            f.close()
+
+    def __buildProfile(self, group):
+        """function rebuilds the timings and solver counters from hdf5 file"""
+        profile = Instrumentation(len(group["timings"]["solver"]))
+        for key in ["timings", "counters"]:
+            for name, data in group[key].items():
+                getattr(profile, key)[name] = data[()]
+        for name, data in group["postprocess"].items():
+            profile.postprocess[name] = float(data[()])
+        self.profile = profile
+
+    def __buildXsHistory(self, group):
+        """function rebuilds the xs history from the recovered libaries"""
+        tables = [self._xsDataSets[float(str(tf))].xsData
+                  for tf in self._timeframes]
+        self.XS = XsHistory(tables, len(group["weights"]))
+        self.XS.frames = group["frames"][()]
+        self.XS.weights = group["weights"][()]
 
     def __exportGroup(self, group, ATTR, obj=None):
         """function exports a groups results data to hdf5 file"""
@@ -101,6 +164,12 @@ class Results:
                     data = getattr(obj, i)
                 else:
                     data = getattr(self, i)
+                if issparse(data):  # sparse matrices are stored as dense
+                    data = data.toarray()
+                if isinstance(data, StepArray):  # copied chunk by chunk
+                    data.flush()
+                    group.copy(data.dataset, group, name=i)
+                    continue
                 if type(data) in [np.ndarray, list]:                 
                     if type(data) is list: data = np.asarray(data)
                     group.create_dataset(i, data=data, dtype=str(data.dtype))
@@ -112,6 +181,13 @@ class Results:
             except:
                 pass
             
+    def __exportProfile(self, group):
+        """function exports the timings and solver counters to hdf5 file"""
+        for key in ["timings", "counters", "postprocess"]:
+            subgroup = group.create_group(key)
+            for name, data in getattr(self.profile, key).items():
+                subgroup.create_dataset(name, data=data)
+
     def __exportXsSet(self, name, xslib, group):
         """function exports cross section data set to hdf5 file"""
         subgroup = group.create_group(str(name))
@@ -193,10 +269,16 @@ class Results:
                     self.__exportGroup(f.create_group(i), HDF5_GROUPS[i])
                 except:
                     pass
+            if getattr(self, "profile", None) is not None:
+                self.__exportProfile(f.create_group("profile"))
             if includeXS:
                 xs = f.create_group("xsData")
                 for i in list(self._xsDataSets.keys()):               
                     self.__exportXsSet(i, self._xsDataSets[i], xs)
+                if isinstance(getattr(self, "XS", None), XsHistory):
+                    history = f.create_group("xsHistory")
+                    history.create_dataset("frames", data=self.XS.frames)
+                    history.create_dataset("weights", data=self.XS.weights)
 
 
     def plot(self, attribute, timeUnits="seconds",
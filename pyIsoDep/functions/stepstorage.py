@@ -0,0 +1,263 @@
+"""stepstorage
+
+Chunked HDF5 storage of the values of all the time points.
+
+The concentrations ``Nt`` hold a column (the last axis) for each time point,
+so that long depletion histories require large arrays, e.g. 140 MB for 1743
+nuclides and 10,000 steps (and the post-processed isotopic values as much
+again). ``StepStorage`` streams these columns into chunked and compressed
+datasets of an HDF5 file. Only a window of the last written columns is kept
+in memory and is written to the file once the window is full. The values are
+read back from the file when indexed, or in blocks of time points with
+``blocks``, so that the memory footprint is bounded by the window and the
+size of the blocks. The post-processed isotopic values are computed for each
+block and written back with ``writeBlock``. The cross sections are not
+streamed, since ``XsHistory`` only stores the time frames and weights of
+each step.
+
+"""
+
+import numpy as np
+import h5py
+
+from pyIsoDep.functions.checkerrors import _isstr, _isint, _ispositive
+
+STORAGE_WINDOW = 64  # number of time points kept in memory
+STORAGE_CHUNK_BYTES = 2**20  # size of the chunks of the HDF5 datasets
+STORAGE_COMPRESSION = "gzip"  # compression filter of the HDF5 datasets
+
+
+class StepStorage:
+    """HDF5 file with the values of all the time points
+
+    Parameters
+    ----------
+    filename : str
+        Name of the HDF5 file, which is overwritten if it exists
+    window : int, optional
+        Number of time points of each array kept in memory. The default is
+        ``STORAGE_WINDOW``
+
+    Attributes
+    ----------
+    file : h5py.File
+        The open HDF5 file
+    arrays : dict
+        ``StepArray`` objects of the datasets created in the file
+
+    Examples
+    --------
+    >>> storage = StepStorage("steps.h5", window=16)
+    >>> Nt = storage.create("Nt", (1743, 10001))
+    >>> Nt[:, 0] = N0
+
+    """
+
+    def __init__(self, filename, window=STORAGE_WINDOW):
+        """Create the HDF5 file"""
+        _isstr(filename, "Storage file name")
+        _isint(window, "Storage window")
+        _ispositive(window, "Storage window")
+        self.filename = filename
+        self.window = window
+        self.file = h5py.File(filename, "w")
+        self.arrays = {}
+
+    def create(self, name, shape):
+        """Chunked and compressed dataset with the time points on the last axis
+
+        The array of an existing dataset (e.g., of a repeated post-processing)
+        is reused and overwritten.
+
+        Parameters
+        ----------
+        name : str
+            Name of the dataset
+        shape : tuple
+            Shape of the array, where the last axis are the time points
+
+        Returns
+        -------
+        StepArray
+            Array that streams the written time points to the dataset
+
+        Raises
+        ------
+        ValueError
+            If a dataset of a different shape already exists
+
+        """
+        if name in self.arrays:
+            if self.arrays[name].shape != tuple(shape):
+                raise ValueError("Dataset {} of shape {} already exists"
+                                 .format(name, self.arrays[name].shape))
+            return self.arrays[name]
+        colsize = 8 * int(np.prod(shape[:-1]))  # bytes of a time point
+        chunkLen = min(shape[-1], max(1, STORAGE_CHUNK_BYTES // colsize))
+        dataset = self.file.create_dataset(
+            name, shape=shape, dtype=float, chunks=shape[:-1] + (chunkLen,),
+            compression=STORAGE_COMPRESSION, shuffle=True)
+        self.arrays[name] = StepArray(dataset, self.window)
+        return self.arrays[name]
+
+    def flush(self):
+        """Write the windows of all the arrays to the file"""
+        for array in self.arrays.values():
+            array.flush()
+        self.file.flush()
+
+    def close(self):
+        """Write the windows and close the file"""
+        if self.file:
+            self.flush()
+            self.file.close()
+
+
+class StepArray:
+    """Array of the values of all the time points stored in an HDF5 dataset
+
+    The values are written for a single time point at a time, e.g.
+    ``Nt[:, idx] = vals``, and are kept in a window of ``window`` consecutive
+    time points. The window is written to the dataset once a time point
+    outside of it is written, or when the values are read from the dataset.
+
+    Parameters
+    ----------
+    dataset : h5py.Dataset
+        Dataset with the time points on the last axis
+    window : int, optional
+        Number of time points kept in memory. Zero writes the values directly
+        to the dataset. The default is ``STORAGE_WINDOW``
+
+    Attributes
+    ----------
+    shape : tuple
+        Shape of the array
+    ndim : int
+        Number of dimensions
+
+    """
+
+    def __init__(self, dataset, window=STORAGE_WINDOW):
+        """Keep an empty window of the dataset"""
+        self.dataset = dataset
+        self.shape = dataset.shape
+        self.ndim = len(self.shape)
+        self.dtype = dataset.dtype
+        self.window = window
+        self._buffer = np.zeros(self.shape[:-1] + (window,))
+        self._written = np.zeros(window, dtype=bool)
+        self._first = 0  # time point of the first column in the window
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        """All the values read from the dataset"""
+        self.flush()
+        values = self.dataset[()]
+        return values if dtype is None else values.astype(dtype)
+
+    def __setitem__(self, key, value):
+        """Write the values of a single time point"""
+        key, idx = self._timeKey(key)
+        if idx is None:
+            raise IndexError("Values must be written for a single time point")
+        if not self.window:
+            self.dataset[key + (idx,)] = value
+            return
+        pos = idx - self._first
+        if not 0 <= pos < self.window:
+            self.flush()
+            self._first, pos = idx, 0
+        if not self._written[pos]:
+            if any(not isinstance(k, slice) or k != slice(None)
+                   for k in key):  # partial time point
+                self._buffer[..., pos] = self.dataset[..., idx]
+            self._written[pos] = True
+        self._buffer[key + (pos,)] = value
+
+    def __getitem__(self, key):
+        """Read the values from the window or the dataset"""
+        timeKey, idx = self._timeKey(key)
+        if idx is not None:
+            pos = idx - self._first
+            if 0 <= pos < self.window and self._written[pos]:
+                return self._buffer[timeKey + (pos,)].copy()
+            key = timeKey + (idx,)
+        elif not isinstance(key, tuple):
+            key = (key,)
+        self.flush()
+        rows = key[0]
+        if isinstance(rows, (list, np.ndarray)):
+            # datasets are indexed with sorted and unique rows
+            rows, order = np.unique(rows, return_inverse=True)
+            return self.dataset[(rows,) + key[1:]][order]
+        return self.dataset[key]
+
+    def flush(self):
+        """Write the time points of the window to the dataset"""
+        positions = np.nonzero(self._written)[0]
+        if not positions.size:
+            return
+        # consecutive time points are written together
+        breaks = np.nonzero(np.diff(positions) > 1)[0] + 1
+        for group in np.split(positions, breaks):
+            first, last = group[0], group[-1] + 1
+            self.dataset[..., self._first+first:self._first+last] =\
+                self._buffer[..., first:last]
+        self._written[:] = False
+
+    def writeBlock(self, first, values):
+        """Write the values of consecutive time points to the dataset
+
+        Parameters
+        ----------
+        first : int
+            Index of the first time point
+        values : array
+            Values with the time points of the block on the last axis
+
+        """
+        self.flush()
+        self.dataset[..., first:first+values.shape[-1]] = values
+
+    def blocks(self, size=None):
+        """Values of consecutive time points read block by block
+
+        Parameters
+        ----------
+        size : int, optional
+            Number of time points in each block. The default is the window
+            (or the chunks of the dataset if larger).
+
+        Yields
+        ------
+        first : int
+            Index of the first time point of the block
+        values : array
+            Values of the time points in the block
+
+        """
+        self.flush()
+        if size is None:
+            size = max(self.window, self.dataset.chunks[-1])
+        for first in range(0, self.shape[-1], size):
+            yield first, self.dataset[..., first:first+size]
+
+    def _timeKey(self, key):
+        """Indices of the leading axes and the time point (None if not int)"""
+        if not isinstance(key, tuple):
+            key = (key,)
+        if key[0] is Ellipsis:
+            key = (slice(None),) * (self.ndim - len(key) + 1) + key[1:]
+        idx = key[-1]
+        if len(key) != self.ndim or\
+                not isinstance(idx, (int, np.integer)):
+            return key, None
+        if idx < 0:
+            idx += self.shape[-1]
+        if not 0 <= idx < self.shape[-1]:
+            raise IndexError("Time point {} is outside of the {} time points"
+                             .format(key[-1], self.shape[-1]))
+        return key[:-1], int(idx)
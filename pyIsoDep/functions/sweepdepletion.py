@@ -0,0 +1,340 @@
+"""sweepdepletion
+
+Run a sweep of depletion scenarios (power/flux histories, time-step
+schedules, and initial compositions) over a process pool.
+
+The arrays of the transmutation data sets are copied once to a shared memory
+block. Each worker process attaches to that block when it starts, so the
+decay, fission yield, and transmutation matrices are not pickled for every
+case. The ``Results`` returned by the workers do not carry the data sets,
+which are re-attached from the data of the calling process.
+
+"""
+
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from scipy.sparse import issparse
+
+from pyIsoDep.functions.maindepletionsolver import MainDepletion
+from pyIsoDep.functions.postprocessresults import Results
+from pyIsoDep.functions.checkerrors import _isint, _isnonnegative, _inlist,\
+    _islist
+from pyIsoDep.functions.header import DEPLETION_METHODS,\
+    DEPLETION_INTEGRATORS
+
+SHM_ALIGN = 64  # alignment (bytes) of the arrays in the shared memory block
+POST_METHODS = ["DecayHeat", "Radiotoxicity", "Activity", "Mass",
+                "Reactivity"]
+
+# Data sets rebuilt in each worker process on the shared memory block
+_WORKER = {}
+
+
+class SweepDepletion:
+    """Solve many depletion scenarios that share the same data sets
+
+    Parameters
+    ----------
+    timeframes : array
+        Time frames for all the stored objects (can be used to interpolate xs)
+    argv : TransmutationData Objects
+        Data sets used for all the cases, as in ``MainDepletion``
+    nworkers : int, optional
+        Number of worker processes. If zero, the cases are solved serially in
+        the current process. The default (None) uses the number of CPUs.
+
+    Attributes
+    ----------
+    cases : list
+        Dictionaries with the ``SetDepScenario`` and ``SetInitialComposition``
+        arguments of each case
+
+    Examples
+    --------
+    >>> sweep = SweepDepletion(0.0, data, nworkers=4)
+    >>> sweep.SetGrid(ID, [N0a, N0b], timesteps=[[5, 5], [10, 10]],
+    >>>               power=[[1E+6, 1E+6], [2E+6, 1E+6]], timeUnits="days")
+    >>> res = sweep.Run(method="cram", sparse=True)
+
+    """
+
+    def __init__(self, timeframes=0.0, *argv, nworkers=None):
+        """reset the sweep and validate the data sets"""
+
+        if nworkers is not None:
+            _isint(nworkers, "Number of workers")
+            _isnonnegative(nworkers, "Number of workers")
+        # the data sets are checked by the depletion object
+        MainDepletion(timeframes, *argv)
+        self._timeframes = timeframes
+        self._dataSets = argv
+        self.nworkers = nworkers
+        self.cases = []
+
+    def AddCase(self, ID, N0, vol=1.0, power=None, flux=None,
+                timeUnits="seconds", timesteps=None, timepoints=None):
+        """Add a single case to the sweep
+
+        The arguments are identical to the ones of ``SetDepScenario`` and
+        ``SetInitialComposition`` of ``MainDepletion``.
+
+        """
+
+        self.cases.append({"ID": ID, "N0": N0, "vol": vol, "power": power,
+                           "flux": flux, "timeUnits": timeUnits,
+                           "timesteps": timesteps, "timepoints": timepoints})
+
+    def SetGrid(self, ID, compositions, timesteps, power=None, flux=None,
+                vol=1.0, timeUnits="seconds"):
+        """Define the cases as all the combinations of the inputs
+
+        Parameters
+        ----------
+        ID : array
+            Identification of isotopes following ZZAAA0/1 format
+        compositions : list
+            Initial isotopic concentrations #/cm/b, one array for each case
+        timesteps : list
+            Time-step schedules, one array for each case
+        power : list
+            Power histories in Watts. Each power history is combined with all
+            the time-step schedules of the same length.
+        flux : list
+            Flux histories in n/cm**2/s, if power is not provided.
+        vol : float
+            Volume of the system in cm**3.
+        timeUnits : string
+            Time units {"seconds", "minutes", "hours", "days"}
+
+        Raises
+        ------
+        ValueError
+            If neither power nor flux are provided
+            If no history is matched by a time-step schedule
+
+        """
+
+        _islist(compositions, "Initial compositions")
+        _islist(timesteps, "Time-step schedules")
+        if power is not None:
+            _islist(power, "Power histories")
+            histories, key = power, "power"
+        elif flux is not None:
+            _islist(flux, "Flux histories")
+            histories, key = flux, "flux"
+        else:
+            raise ValueError("Either power or flux histories must be provided")
+
+        self.cases = []
+        for history, steps, N0 in itertools.product(histories, timesteps,
+                                                    compositions):
+            if len(history) != len(steps):
+                continue
+            self.AddCase(ID, N0, vol=vol, timeUnits=timeUnits,
+                         timesteps=steps, **{key: history})
+        if not self.cases:
+            raise ValueError("None of the {} histories has the length of a "
+                             "time-step schedule".format(key))
+
+    def Run(self, method="cram", xsinterp=False, rtol=1E-10, sparse=False,
+            solveropts=None, postprocess=None, integrator="ce"):
+        """Solve all the cases
+
+        Parameters
+        ----------
+        method : str
+            Method used to solve the Bateman equations
+        xsinterp : bool
+            Flag to indicate whether interpolation in between timesteps is
+            allowed to be performed for the transmutation data.
+        rtol : float, optional
+            Isotopic concentration convergence criteria, relative difference.
+        sparse : bool, optional
+            Flag to indicate whether the Bateman matrix is passed to the
+            solver in a sparse (CSC) format.
+        solveropts : dict, optional
+            Additional keyword arguments passed to the solver of ``method``
+        postprocess : list, optional
+            Post-processing methods executed for each case, e.g.
+            ``["DecayHeat", "Mass"]``
+        integrator : str, optional
+            Time integration scheme {"ce", "cecm", "celi", "leqi"}
+
+        Returns
+        -------
+        list
+            ``Results`` objects in the order of ``cases``
+
+        """
+
+        _inlist(method, "Method to solve Bateman eqs", DEPLETION_METHODS)
+        if postprocess is None:
+            postprocess = []
+        for name in postprocess:
+            _inlist(name, "Post-processing method", POST_METHODS)
+        if not self.cases:
+            raise ValueError("No cases were defined. Use SetGrid or AddCase")
+        _inlist(integrator, "Depletion integrator", DEPLETION_INTEGRATORS)
+        solveArgs = {"method": method, "xsinterp": xsinterp, "rtol": rtol,
+                     "sparse": sparse, "solveropts": solveropts,
+                     "integrator": integrator}
+
+        if self.nworkers == 0:
+            _WORKER["data"] = self._dataSets
+            _WORKER["timeframes"] = self._timeframes
+            try:
+                output = [_solveCase(case, solveArgs, postprocess)
+                          for case in self.cases]
+            finally:
+                _WORKER.clear()
+        else:
+            shm, skeletons = _shareDataSets(self._dataSets)
+            try:
+                with ProcessPoolExecutor(
+                        max_workers=self.nworkers, initializer=_attachWorker,
+                        initargs=(shm.name, skeletons,
+                                  self._timeframes)) as pool:
+                    output = list(pool.map(
+                        _solveCase, self.cases,
+                        itertools.repeat(solveArgs),
+                        itertools.repeat(postprocess)))
+            finally:
+                shm.close()
+                shm.unlink()
+
+        # re-attach the data sets of the current process
+        results = []
+        for res, refs in output:
+            res._xsDataSets = dict(zip(np.array(self._timeframes, ndmin=1),
+                                       self._dataSets))
+            for attr, (dataIdx, dataAttr) in refs.items():
+                setattr(res, attr, getattr(self._dataSets[dataIdx], dataAttr))
+            results.append(res)
+        return results
+
+
+def _shareDataSets(dataSets):
+    """Copy the arrays of the data sets into a single shared memory block
+
+    Every data set is described by a skeleton dictionary, in which the arrays
+    are replaced by ``(offset, shape, dtype)`` tuples and sparse matrices by
+    the descriptors of their components.
+
+    """
+
+    arrays = []  # arrays copied to the shared memory block
+
+    def describe(arr):
+        arrays.append(arr)
+        return ("array", len(arrays)-1, arr.shape, arr.dtype.str)
+
+    skeletons = []
+    for data in dataSets:
+        skeleton = {}
+        for attr, val in data.__dict__.items():
+            if issparse(val):
+                val = val.tocsc()
+                skeleton[attr] = ("csc", val.shape, describe(val.data),
+                                  describe(val.indices), describe(val.indptr))
+            elif isinstance(val, np.ndarray) and val.dtype != object:
+                skeleton[attr] = describe(val)
+            else:
+                skeleton[attr] = ("value", val)
+        skeletons.append(skeleton)
+
+    offsets = np.zeros(len(arrays) + 1, dtype=int)
+    for idx, arr in enumerate(arrays):
+        nbytes = -(-arr.nbytes // SHM_ALIGN) * SHM_ALIGN
+        offsets[idx+1] = offsets[idx] + nbytes
+    shm = shared_memory.SharedMemory(create=True, size=max(offsets[-1], 1))
+    for idx, arr in enumerate(arrays):
+        view = np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf,
+                          offset=offsets[idx])
+        view[...] = arr
+
+    # replace the array indices with offsets
+    def locate(desc):
+        return ("array", int(offsets[desc[1]]), desc[2], desc[3])
+
+    for skeleton in skeletons:
+        for attr, desc in skeleton.items():
+            if desc[0] == "array":
+                skeleton[attr] = locate(desc)
+            elif desc[0] == "csc":
+                skeleton[attr] = desc[:2] + tuple(locate(d) for d in desc[2:])
+    return shm, skeletons
+
+
+def _attachWorker(shmName, skeletons, timeframes):
+    """Rebuild the data sets of a worker on the shared memory block"""
+
+    from pyIsoDep.functions.generatedata import TransmutationData
+    from scipy.sparse import csc_matrix
+
+    shm = shared_memory.SharedMemory(name=shmName)
+
+    def view(desc):
+        arr = np.ndarray(desc[2], dtype=np.dtype(desc[3]), buffer=shm.buf,
+                         offset=desc[1])
+        arr.flags.writeable = False  # the block is shared by all workers
+        return arr
+
+    dataSets = []
+    for skeleton in skeletons:
+        data = TransmutationData.__new__(TransmutationData)
+        for attr, desc in skeleton.items():
+            if desc[0] == "array":
+                val = view(desc)
+            elif desc[0] == "csc":
+                val = csc_matrix((view(desc[2]), view(desc[3]),
+                                  view(desc[4])), shape=desc[1])
+            else:
+                val = desc[1]
+            setattr(data, attr, val)
+        dataSets.append(data)
+
+    _WORKER["shm"] = shm  # keep the block mapped for the worker lifetime
+    _WORKER["data"] = dataSets
+    _WORKER["timeframes"] = timeframes
+
+
+def _solveCase(case, solveArgs, postprocess):
+    """Solve a single case with the data sets of the worker
+
+    Returns
+    -------
+    res : Results
+        Results of the case without the data sets
+    refs : dict
+        Attributes of ``res`` that refer to the data sets, given as
+        ``(index of the data set, attribute name)``
+
+    """
+
+    dataSets = _WORKER["data"]
+    dep = MainDepletion(_WORKER["timeframes"], *dataSets)
+    dep.SetDepScenario(power=case["power"], flux=case["flux"],
+                       timeUnits=case["timeUnits"],
+                       timesteps=case["timesteps"],
+                       timepoints=case["timepoints"])
+    dep.SetInitialComposition(case["ID"], case["N0"], vol=case["vol"])
+    dep.SolveDepletion(**solveArgs)
+    for name in postprocess:
+        getattr(dep, name)()
+
+    res = Results(dep)
+    del res._xsDataSets
+    shared = {}
+    for dataIdx, data in enumerate(dataSets):
+        for attr, val in data.__dict__.items():
+            if isinstance(val, np.ndarray) or issparse(val):
+                shared.setdefault(id(val), (dataIdx, attr))
+    refs = {}
+    for attr, val in list(res.__dict__.items()):
+        if id(val) in shared:
+            refs[attr] = shared[id(val)]
+            delattr(res, attr)
+    return res, refs
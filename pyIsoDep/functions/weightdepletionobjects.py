@@ -11,7 +11,11 @@ Last updated on Wed Feb 09 15:30:00 2022 @author: Dan Kotlyar
 
 import copy
 
+import numpy as np
+
 from pyIsoDep.functions.header import NOT_WEIGHT_ATTR
+from pyIsoDep.functions.stepstorage import StepArray
+from pyIsoDep.functions.xshistory import XsHistory
 
 
 def WeightDepObjects(*argv):
@@ -30,6 +34,8 @@ def WeightDepObjects(*argv):
 
         for key, values in objDep.__dict__.items():
             if key not in NOT_WEIGHT_ATTR:
+                if isinstance(values, (StepArray, XsHistory)):
+                    values = np.asarray(values)  # weighted in memory
                 setvals = values * objDep.volume / volT
                 if idx > 0:
                     setvals += getattr(wgtDepObj, key)
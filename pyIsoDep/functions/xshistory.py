@@ -0,0 +1,97 @@
+"""xshistory
+
+Weighted cross sections of all the time points stored as references.
+
+The cross sections used in each depletion step are either the ``xsData``
+table of a single transmutation data set (time frame), or are linearly
+interpolated between the tables of two time frames. Instead of a copy of the
+table for each time point (``nIsotopes x 16 x npoints``), ``XsHistory``
+stores the indices of the two time frames and the interpolation weight of
+each time point, and reconstructs the tables of the requested time points
+on demand. Each distinct (frames, weight) combination is reconstructed once.
+
+"""
+
+import numpy as np
+
+from pyIsoDep.functions.header import IDX_XS
+
+
+class XsHistory:
+    """Cross sections of all the time points as references to the data sets
+
+    Parameters
+    ----------
+    tables : list
+        ``xsData`` tables (nIsotopes x 16) of all the time frames
+    npoints : int
+        Number of time points
+
+    Attributes
+    ----------
+    frames : 2-dim array
+        Indices of the two time frames used for each time point, or -1 for
+        the time points that were not recorded
+    weights : 1-dim array
+        Interpolation weight of the second time frame for each time point
+    shape : tuple
+        Shape of the reconstructed cross sections, (nIsotopes, 16, npoints)
+
+    Examples
+    --------
+    >>> dep.XS.frames[:, :3]
+    array([[0, 0, 1],
+           [0, 1, 1]])
+    >>> dep.XS[:, IDX_XS["f"], :]  # fission xs for all the time points
+
+    """
+
+    def __init__(self, tables, npoints):
+        """Reset all the time points to unrecorded"""
+        self.tables = list(tables)
+        self.frames = np.full((2, npoints), -1, dtype=int)
+        self.weights = np.zeros(npoints)
+        self.shape = (len(self.tables[0]), len(IDX_XS), npoints)
+        self.ndim = 3
+
+    def record(self, idx, idx0, idx1, wgt):
+        """Stores the time frames and weight of the time point ``idx``"""
+        self.frames[:, idx] = idx0, idx1
+        self.weights[idx] = wgt if idx0 != idx1 else 0.0
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        """The cross sections of all the time points"""
+        values = self[:, :, :]
+        return values if dtype is None else values.astype(dtype)
+
+    def __getitem__(self, key):
+        """Reconstruct the cross sections of the indexed time points"""
+        if not isinstance(key, tuple):
+            key = (key,)
+        if key[0] is Ellipsis:
+            key = (slice(None),) * (4 - len(key)) + key[1:]
+        key = key + (slice(None),) * (3 - len(key))
+        points = np.arange(self.shape[-1])[key[-1]]
+
+        # reconstruct each distinct combination of frames and weight once
+        combinations = np.vstack((self.frames[:, np.ravel(points)],
+                                  self.weights[np.ravel(points)]))
+        uniqComb, order = np.unique(combinations, axis=1,
+                                    return_inverse=True)
+        values = np.stack([self._table(int(idx0), int(idx1), wgt)[key[:-1]]
+                           for idx0, idx1, wgt in uniqComb.T], axis=-1)
+        values = values[..., np.ravel(order)]
+        return values[..., 0] if np.ndim(points) == 0 else values
+
+    def _table(self, idx0, idx1, wgt):
+        """Cross sections table of the time frames and weight"""
+        if idx0 < 0:  # the time point was not recorded
+            return np.zeros(self.shape[:-1])
+        if idx0 == idx1:
+            return self.tables[idx0]
+        xsTable = (1-wgt)*self.tables[idx0] + wgt*self.tables[idx1]
+        xsTable[:, IDX_XS["id"]] = self.tables[idx0][:, IDX_XS["id"]]
+        return xsTable
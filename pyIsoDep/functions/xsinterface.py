@@ -299,7 +299,7 @@ class XsInterface:
     def _sortsets(numdepn, numpert, states, xssets):
         """sorts the data into multidimensional arrays"""
         # store the unique values foe each dependency
-        uniqDep = np.empty(numdepn, dtype=np.object)
+        uniqDep = np.empty(numdepn, dtype=object)
         lenDep = np.empty(numdepn, dtype=int)
 
         for idx in range(numdepn):
@@ -307,7 +307,7 @@ class XsInterface:
             lenDep[idx] = len(uniqDep[idx])
 
         # A matrix to store all the objects/xs sets for all dependencies
-        xssetsMtx = np.empty(lenDep, dtype=np.object)
+        xssetsMtx = np.empty(lenDep, dtype=object)
 
         if numdepn == 1:
             for ix, xval in enumerate(uniqDep[0]):
@@ -0,0 +1,140 @@
+"""test_batchdepletion
+
+Tests that multiple materials depleted together with ``BatchDepletion``
+reproduce the results of individual ``MainDepletion`` calculations.
+
+"""
+
+import pytest
+import numpy as np
+from pyIsoDep.functions.maindepletionsolver import MainDepletion
+from pyIsoDep.functions.batchdepletion import BatchDepletion
+from pyIsoDep.functions.generatedata import TransmutationData
+from pyIsoDep.functions.xshistory import XsHistory
+from pyIsoDep.functions.stepstorage import StepArray
+
+from pyIsoDep.tests.pregenerated_xs import flux, ID, N0, sig_c,\
+    sig_c2m, sig_n2n, sig_n3n, sig_f
+
+
+# -----------------------------------------------------------------------------
+#                            DATA GENERATION
+# -----------------------------------------------------------------------------
+data = TransmutationData(libraryFlag=True, wgtFY=1.0, sparse=True)
+data.ReadData(ID, sig_f=sig_f, sig_c=sig_c, sig_c2m=sig_c2m,
+              sig_n2n=sig_n2n, sig_n3n=sig_n3n, flagBarns=False)
+
+N0BATCH = np.array([N0, 0.5*N0, 2.0*N0])
+VOLUMES = [1.0, 2.0, 0.5]
+TIMESTEPS = [5.0, 10.0]
+
+
+def _single(N0i, vol, solveopts=None, **scenario):
+    """Deplete a single material with the main depletion solver"""
+    dep = MainDepletion(0.0, data)
+    dep.SetDepScenario(timeUnits="days", timesteps=TIMESTEPS, **scenario)
+    dep.SetInitialComposition(ID, N0i, vol=vol)
+    dep.SolveDepletion(method="cram", sparse=True, **(solveopts or {}))
+    return dep
+
+
+def test_batch_power_depletion():
+    """Materials with different power histories (a matrix per material)"""
+
+    power = np.array([[1E+6, 2E+6], [5E+5, 5E+5], [3E+6, 1E+6]])
+    dep = BatchDepletion(0.0, data)
+    dep.SetDepScenario(power=power, timeUnits="days", timesteps=TIMESTEPS)
+    dep.SetInitialComposition(ID, N0BATCH, vol=VOLUMES)
+    dep.SolveDepletion(method="cram", sparse=True)
+    assert dep.Nt.shape == (data.nIsotopes, 3, len(TIMESTEPS)+1)
+
+    # the pole systems of all the materials are solved in a single pass
+    Nt = dep.Nt.copy()
+    dep.SolveDepletion(method="cram", sparse=True,
+                       solveropts={"nthreads": 4})
+    assert np.array_equal(dep.Nt, Nt)
+    assert dep.solverStats["factorizations"] == [7] * 3 * len(TIMESTEPS)
+
+    for region in range(3):
+        ref = _single(N0BATCH[region], VOLUMES[region],
+                      power=list(power[region]))
+        assert dep.flux[region] == pytest.approx(ref.flux, rel=1E-10)
+        # CRAM round-off is relative to the largest concentration
+        assert dep.Nt[:, region, :] == pytest.approx(ref.Nt, rel=1E-8,
+                                                     abs=1E-12*N0.max())
+        # a single material is post-processed as a regular depletion object
+        depRegion = dep.GetRegion(region)
+        assert type(depRegion) is MainDepletion
+        assert not hasattr(depRegion, "nregions")
+        depRegion.DecayHeat()
+        ref.DecayHeat()
+        assert depRegion.totalQt == pytest.approx(ref.totalQt, rel=1E-8)
+
+
+def test_batch_flux_depletion():
+    """Materials with a shared flux history (multiple right-hand sides)"""
+
+    dep = BatchDepletion(0.0, data)
+    dep.SetDepScenario(flux=[flux, 2*flux], timeUnits="days",
+                       timesteps=TIMESTEPS)
+    dep.SetInitialComposition(ID, N0BATCH, vol=VOLUMES)
+    dep.SolveDepletion(method="cram")
+
+    ref = _single(N0BATCH[1], VOLUMES[1], flux=[flux, 2*flux])
+    assert dep.Nt[:, 1, :] == pytest.approx(ref.Nt, rel=1E-8,
+                                        abs=1E-12*N0.max())
+    assert dep.power[1] == pytest.approx(ref.power, rel=1E-10)
+
+    dep.SolveDecay(method="cram", sparse=True)
+    assert dep.Nt[:, :, 0] == pytest.approx(dep.N0)
+
+
+def test_batch_integrators(tmp_path):
+    """Predictor-corrector, substeps, and storage of multiple materials"""
+
+    power = np.array([[100.0, 200.0], [50.0, 50.0]])
+    opts = {"integrator": "cecm", "substeps": 2}
+    dep = BatchDepletion(0.0, data)
+    dep.SetDepScenario(power=power, timeUnits="days", timesteps=TIMESTEPS)
+    dep.SetInitialComposition(ID, N0BATCH[:2], vol=VOLUMES[:2])
+    dep.SolveDepletion(method="cram", storage=str(tmp_path / "batch.h5"),
+                       window=1, **opts)
+    assert isinstance(dep.Nt, StepArray)
+    assert isinstance(dep.XS, XsHistory)
+    assert list(dep.nsubsteps) == [2, 2]
+    assert dep.profile.timings["solver"].all()
+
+    for region in range(2):
+        ref = _single(N0BATCH[region], VOLUMES[region], solveopts=opts,
+                      power=list(power[region]))
+        assert np.asarray(dep.Nt)[:, region, :] == pytest.approx(
+            ref.Nt, rel=1E-8, abs=1E-12*N0.max())
+        depRegion = dep.GetRegion(region)
+        assert isinstance(depRegion.XS, type(ref.XS))
+        assert np.asarray(depRegion.XS) == pytest.approx(np.asarray(ref.XS))
+        assert depRegion.flux == pytest.approx(ref.flux, rel=1E-10)
+
+
+def test_badBatchDepletion():
+    """Errors for the batch depletion definitions"""
+
+    dep = BatchDepletion(0.0, data)
+    with pytest.raises(ValueError, match="power*"):
+        dep.SetDepScenario(power=[[1E+6], [2E+6]], timeUnits="days",
+                           timesteps=TIMESTEPS)
+    dep.SetDepScenario(power=[[1E+6, 1E+6]]*2, timeUnits="days",
+                       timesteps=TIMESTEPS)
+    with pytest.raises(ValueError, match="Volumes*"):
+        dep.SetInitialComposition(ID, N0BATCH, vol=[1.0, 2.0])
+    dep.SetInitialComposition(ID, N0BATCH)
+    for method in ["PostProcess", "DecayHeat", "Reactivity", "Resume"]:
+        with pytest.raises(TypeError, match="GetRegion*"):
+            getattr(dep, method)()
+    with pytest.raises(KeyError, match="Method*"):
+        dep.SolveDepletion(method="odeint")
+    with pytest.raises(KeyError, match="Integrator*"):
+        dep.SolveDepletion(method="cram", integrator="leqi")
+    with pytest.raises(ValueError, match="power/flux history*"):
+        dep.SolveDepletion(method="cram")
+    with pytest.raises(ValueError, match="Index of the material*"):
+        dep.GetRegion(3)
@@ -0,0 +1,96 @@
+"""test_checkpoint
+
+Tests that a depletion solution that is stopped and resumed from its
+checkpoint is identical to an uninterrupted solution.
+
+"""
+
+import pytest
+import numpy as np
+import h5py
+from pyIsoDep.functions.maindepletionsolver import MainDepletion
+from pyIsoDep.functions.generatedata import TransmutationData
+from pyIsoDep.functions.checkpoint import Checkpoint
+
+from pyIsoDep.tests.pregenerated_xs import ID, N0, sig_c,\
+    sig_c2m, sig_n2n, sig_n3n, sig_f
+
+
+# -----------------------------------------------------------------------------
+#                            DATA GENERATION
+# -----------------------------------------------------------------------------
+data = TransmutationData(libraryFlag=True, wgtFY=1.0)
+data.ReadData(ID, sig_f=sig_f, sig_c=sig_c, sig_c2m=sig_c2m,
+              sig_n2n=sig_n2n, sig_n3n=sig_n3n, flagBarns=False)
+data2 = TransmutationData(libraryFlag=True, wgtFY=1.0)
+data2.ReadData(ID, sig_f=1.1*sig_f, sig_c=1.1*sig_c, sig_c2m=sig_c2m,
+               sig_n2n=sig_n2n, sig_n3n=sig_n3n, flagBarns=False)
+
+OPTIONS = {"method": "cram", "xsinterp": True, "integrator": "leqi",
+           "sparse": True, "substeps": 2}
+
+
+def _depletion(power=1E+04):
+    """Depletion with two data sets and five steps of constant power"""
+    dep = MainDepletion([0.0, 50.0], data, data2)
+    dep.SetDepScenario(power=[power]*5, timeUnits="days",
+                       timesteps=[10.0]*5)
+    dep.SetInitialComposition(ID, N0, vol=2.0)
+    return dep
+
+
+def _recordSteps(dep, solved, stop=None):
+    """Record the solved steps and stop the solution at the step stop"""
+    solveInterval = dep._solveInterval
+
+    def recorded(nsub, solver, integrator, idx, *args):
+        if idx == stop:
+            raise KeyboardInterrupt
+        solved.append(idx)
+        return solveInterval(nsub, solver, integrator, idx, *args)
+
+    dep._solveInterval = recorded
+
+
+def test_resume(tmp_path):
+    """Test that the resumed solution does not solve the completed steps"""
+
+    ref = _depletion()
+    ref.SolveDepletion(**OPTIONS)
+
+    # the solution is killed in the fourth step
+    filename = str(tmp_path / "run.chk")
+    dep = _depletion()
+    _recordSteps(dep, [], stop=3)
+    with pytest.raises(KeyboardInterrupt):
+        dep.SolveDepletion(checkpoint=filename, checkevery=2, **OPTIONS)
+    chk = Checkpoint.load(filename)
+    assert chk.step == 2 and chk.every == 2
+    assert chk.options["integrator"] == "leqi"
+    # a checkpoint of the fourth step that was killed while being written
+    with h5py.File(filename, "a") as f:
+        f["Nt"][:, 3] = -1.0
+        f["flux"][2:] = 1E+30
+        f["profile/timings/solver"][2:] = 1E+06
+        f["prevRates/flux"][4] = 1E+30
+
+    # only the steps after the checkpoint are solved
+    dep = _depletion()
+    solved = []
+    _recordSteps(dep, solved)
+    dep.Resume(filename)
+    assert solved == [2, 3, 4]
+    assert dep.Nt == pytest.approx(ref.Nt, rel=1E-13)
+    assert dep.flux == pytest.approx(ref.flux, rel=1E-13)
+    assert np.asarray(dep.XS) == pytest.approx(np.asarray(ref.XS))
+    assert list(dep.nsubsteps) == list(ref.nsubsteps)
+    assert dep.stepSolvers == ref.stepSolvers
+    assert dep.profile.timings["solver"].all()
+    assert (dep.profile.timings["solver"] < 1E+06).all()
+    assert Checkpoint.load(filename).step == 5
+
+    # the checkpoint must match the scenario
+    with pytest.raises(ValueError, match="The scenario*"):
+        _depletion(power=2E+04).Resume(filename)
+    with pytest.raises(ValueError, match="Checkpoints cannot*"):
+        _depletion().SolveDepletion("adaptive", checkpoint=filename)
@@ -0,0 +1,85 @@
+"""test_decaytable
+
+Tests that the decay tables reproduce the compositions, decay heat, and
+activity obtained with ``MainDepletion.SolveDecay``.
+
+"""
+
+import pytest
+import numpy as np
+from pyIsoDep.functions.maindepletionsolver import MainDepletion
+from pyIsoDep.functions.generatedata import TransmutationData
+from pyIsoDep.functions.decaytable import DecayTable
+
+from pyIsoDep.tests.pregenerated_xs import ID, N0
+
+
+# -----------------------------------------------------------------------------
+#                            DATA GENERATION
+# -----------------------------------------------------------------------------
+data = TransmutationData(libraryFlag=True, wgtFY=1.0)
+
+
+def _decay(timepoints, vol):
+    """Decay of the reference composition with SolveDecay"""
+    dep = MainDepletion(0.0, data)
+    dep.SetDepScenario(power=None, flux=[0.0]*(len(timepoints)-1),
+                       timeUnits="hours", timepoints=timepoints)
+    dep.SetInitialComposition(ID, N0, vol=vol)
+    dep.SolveDecay("expm")
+    dep.DecayHeat()
+    dep.Activity()
+    return dep
+
+
+def test_cooling_times():
+    """Test the propagators solved for each cooling time"""
+
+    table = DecayTable(data, timepoints=[48.0, 1.0, 1000.0],
+                       timeUnits="hours")
+    assert table.timepoints == pytest.approx([0.0, 1.0, 48.0, 1000.0])
+    dep = _decay(table.timepoints, 2.0)
+
+    Nt = table.Compositions(dep.N0)
+    assert Nt == pytest.approx(dep.Nt, rel=1E-8, abs=1E-12*dep.N0.max())
+    assert table.DecayHeat(dep.N0, 2.0) == pytest.approx(
+        dep.totalQt, rel=1E-8, abs=1E-12*dep.totalQt[0])
+    assert table.Activity(dep.N0, 2.0) == pytest.approx(
+        dep.totalAtCurie, rel=1E-8, abs=1E-12*dep.totalAtCurie[0])
+
+    # several compositions are solved together
+    N0multi = np.array([dep.N0, 0.5*dep.N0])
+    Ntmulti = table.Compositions(N0multi)
+    assert Ntmulti.shape == (data.nIsotopes, 2, 4)
+    assert Ntmulti[:, 1, :] == pytest.approx(0.5*Nt)
+    heat = table.DecayHeat(N0multi, vol=[2.0, 1.0])
+    assert heat[1] == pytest.approx(0.25*heat[0])
+
+
+def test_doublings():
+    """Test the propagators of the doublings obtained by squaring"""
+
+    table = DecayTable(data, tmin=0.5, ndoublings=10, timeUnits="hours")
+    assert table.timepoints == pytest.approx(
+        np.append(0.0, 0.5*2.0**np.arange(11)))
+    dep = _decay(table.timepoints, 1.0)
+
+    assert table.DecayHeat(dep.N0) == pytest.approx(
+        dep.totalQt, rel=1E-6, abs=1E-10*dep.totalQt[0])
+    assert table.Activity(dep.N0) == pytest.approx(
+        dep.totalAtCurie, rel=1E-6, abs=1E-10*dep.totalAtCurie[0])
+
+
+def test_badDecayTable():
+    """Errors for the decay table definitions"""
+
+    with pytest.raises(ValueError, match="Either timepoints or tmin*"):
+        DecayTable(data, tmin=1.0)
+    with pytest.raises(ValueError, match="Cooling times*"):
+        DecayTable(data, timepoints=[-1.0, 1.0])
+    with pytest.raises(ValueError, match="No attribute*"):
+        DecayTable(TransmutationData(libraryFlag=False), tmin=1.0,
+                   ndoublings=2)
+    table = DecayTable(data, timepoints=[1.0])
+    with pytest.raises(ValueError, match="Compositions must have*"):
+        table.DecayHeat(N0[:10])
@@ -9,7 +9,10 @@ Last updated on Sat Oct 16 00:30:00 2021 @author: Dan Kotlyar
 
 """
 
-from pyIsoDep.functions.generatedata import TransmutationData
+import numpy as np
+import pytest
+
+from pyIsoDep.functions.generatedata import TransmutationData, _productRows
 
 # import pre-generated data containing set of cross sections
 from pyIsoDep.tests.pregenerated_xs import ID, sig_c, sig_c2m,\
@@ -32,3 +35,29 @@ data.ReadData(ID, sig_f=sig_f, sig_c=sig_c, sig_c2m=sig_c2m,
 
 toc = timeit.timeit()
 print("Time elapsed for reading data = {} seconds ".format(toc-tic))
+
+
+def test_transmutation_matrix():
+    """Test that reaction products are placed in the correct entries"""
+
+    ids = [922350, 922360, 912340]
+    xs = TransmutationData(libraryFlag=True, wgtFY=1.0)
+    xs.ReadData(ids, sig_c=[10.0, 0.0, 0.0], sig_d=[2.0, 0.0, 0.0],
+                sig_np=[3.0, 0.0, 0.0])
+    idx = {zaid: np.where(xs.fullId == zaid)[0][0] for zaid in ids}
+    trmtx = xs.transmutationmtx
+
+    # capture of U235 leads to U236
+    assert trmtx[idx[922360], idx[922350]] == pytest.approx(10.0E-24)
+    # (n,d) and (n,np) of U235 both lead to Pa234
+    assert trmtx[idx[912340], idx[922350]] == pytest.approx(5.0E-24)
+    # the absorption is removed from the diagonal
+    assert trmtx[idx[922350], idx[922350]] == pytest.approx(-15.0E-24)
+
+
+def test_product_rows():
+    """Test the rows of the products in an unsorted list of nuclides"""
+
+    fullId = np.array([922350, 541350, 942390, 10010])
+    products = np.array([942390, 10010, 922340, 999990, 0, 922350])
+    assert list(_productRows(fullId, products)) == [2, 3, -1, -1, -1, 0]
@@ -0,0 +1,70 @@
+"""test_librarycache
+
+Tests that the memory-mapped cache of the library holds the same data sets
+as the HDF5 library, and that it is converted only once.
+
+"""
+
+import os
+
+import numpy as np
+import pytest
+import h5py
+
+from pyIsoDep import setDataPath
+from pyIsoDep.functions.generatedata import TransmutationData
+from pyIsoDep.functions.librarycache import LibraryCache
+from pyIsoDep.functions.loaddecaydata import DecayData
+from pyIsoDep.functions.header import H5_PATH
+
+
+def test_library_cache(tmp_path, monkeypatch):
+    """Test the cached data sets against the HDF5 library"""
+
+    h5path = str(tmp_path / "library.h5")
+    with h5py.File(h5path, "w") as f:
+        f.create_dataset("AW", data=np.array([1.0, 235.0]))
+        f["AW"].attrs["description"] = "Atomic weights"
+        f.create_dataset("decayMatrix", data=np.arange(4.0).reshape(2, 2))
+        f.create_dataset("nuclides", data=2)
+    cachedir = str(tmp_path / "cache")
+    table = LibraryCache(h5path, cachedir)
+    assert sorted(table.properties()) == ["AW", "decayMatrix", "nuclides"]
+    assert table.description("AW") == "Atomic weights"
+    assert table.getvalues("nuclides") == 2
+    decaymtx = table.getvalues("decayMatrix")
+    assert decaymtx == pytest.approx(np.arange(4.0).reshape(2, 2))
+    assert type(decaymtx) is np.ndarray and not decaymtx.flags.writeable
+    with pytest.raises(KeyError, match="Property*"):
+        table.getvalues("BR")
+    with pytest.raises(KeyError, match="No description*"):
+        table.description("decayMatrix")
+
+    # the library is not read again once converted
+    monkeypatch.setattr(h5py, "File", None)
+    assert LibraryCache(h5path, cachedir).path == table.path
+    assert os.listdir(cachedir) == [os.path.basename(table.path)]
+    monkeypatch.undo()
+
+    # a modified library is converted again
+    with h5py.File(h5path, "a") as f:
+        f["AW"][0] = 2.0
+    os.utime(h5path, ns=(0, os.stat(h5path).st_mtime_ns + 1))
+    table = LibraryCache(h5path, cachedir)
+    assert table.getvalues("AW") == pytest.approx([2.0, 235.0])
+    assert len(os.listdir(cachedir)) == 2
+
+
+def test_cached_transmutation_data(tmp_path):
+    """Test the data sets of the default library read from the cache"""
+
+    data = TransmutationData(libraryFlag=True, wgtFY=0.5)
+    cached = TransmutationData(libraryFlag=True, wgtFY=0.5,
+                               cache=str(tmp_path))
+    for attr in ["fullId", "AW", "Q", "BR", "lmbda", "decaymtx",
+                 "ingestion", "inhalation", "fymtx", "nu"]:
+        assert np.array_equal(getattr(cached, attr), getattr(data, attr))
+    assert not cached.decaymtx.flags.writeable
+    table = DecayData(setDataPath(H5_PATH))
+    assert LibraryCache(setDataPath(H5_PATH), str(tmp_path)).properties() ==\
+        table.properties()
@@ -0,0 +1,68 @@
+"""test_libraryregistry
+
+Tests that the data sets of the library and the blended fission yields are
+shared read-only arrays, and that the least recently used blends are evicted.
+
+"""
+
+import numpy as np
+import pytest
+import h5py
+
+from pyIsoDep import setDataPath
+from pyIsoDep.functions.generatedata import TransmutationData
+from pyIsoDep.functions.libraryregistry import LibraryRegistry,\
+    LIBRARY_REGISTRY, LIBRARY_ATTR
+from pyIsoDep.functions.loaddecaydata import DecayData
+from pyIsoDep.functions.header import H5_PATH
+
+
+def test_shared_data_sets():
+    """Test the data sets shared by the objects of the default library"""
+
+    data1 = TransmutationData(libraryFlag=True, wgtFY=0.3)
+    data2 = TransmutationData(libraryFlag=True, wgtFY=0.3)
+    data3 = TransmutationData(libraryFlag=True, wgtFY=0.7)
+    assert data1.fymtx is data2.fymtx and data1.nu is data2.nu
+    assert data1.decaymtx is data3.decaymtx
+    assert data1.fymtx is not data3.fymtx
+    assert not data1.fymtx.flags.writeable
+    assert not data1.decaymtx.flags.writeable
+
+    table = DecayData(setDataPath(H5_PATH))
+    assert data3.fymtx == pytest.approx(
+        0.7*table.getvalues("thermalFY") + 0.3*table.getvalues("fastFY"))
+    assert data3.nu == pytest.approx(
+        0.7*table.getvalues("nu_thermal") + 0.3*table.getvalues("nu_fast"))
+    assert np.array_equal(data1.decaymtx, table.getvalues("decayMatrix"))
+    sparse = TransmutationData(libraryFlag=True, wgtFY=0.3, sparse=True)
+    assert np.array_equal(sparse.fymtx.toarray(), data1.fymtx)
+    assert not sparse.fymtx.data.flags.writeable
+    assert LIBRARY_REGISTRY.library(setDataPath(H5_PATH), sparse=True)[
+        "decaymtx"] is sparse.decaymtx
+
+
+def test_registry_eviction(tmp_path):
+    """Test the least recently used blends"""
+
+    h5path = str(tmp_path / "library.h5")
+    with h5py.File(h5path, "w") as f:
+        for pty in LIBRARY_ATTR.values():
+            f.create_dataset(pty, data=np.ones(2))
+        f.create_dataset("thermalFY", data=np.eye(2))
+        f.create_dataset("fastFY", data=np.ones((2, 2)))
+        f.create_dataset("nu_thermal", data=np.array([2.0, 3.0]))
+        f.create_dataset("nu_fast", data=np.array([4.0, 5.0]))
+    registry = LibraryRegistry(maxblends=2)
+    fymtx, nu = registry.blend(h5path, 0.5)
+    assert fymtx == pytest.approx(np.array([[1.0, 0.5], [0.5, 1.0]]))
+    assert nu == pytest.approx([3.0, 4.0])
+    thermal, _ = registry.blend(h5path, 1.0)  # not blended
+    assert thermal is registry._entry(h5path, False)["thermalFY"]
+    assert registry.blend(h5path, 0.5)[0] is fymtx  # most recently used
+    registry.blend(h5path, 0.0)  # evicts 1.0
+    assert registry.blend(h5path, 0.5)[0] is fymtx
+    assert len(registry._blends) == 2
+    assert 1.0 not in [key[1] for key in registry._blends]
+    registry.clear()
+    assert registry.blend(h5path, 0.5)[0] is not fymtx
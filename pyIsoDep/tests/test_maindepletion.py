@@ -12,9 +12,14 @@ Last updated on Sun Oct 17 17:30:00 2021 @author: Dan Kotlyar
 
 import pytest
 import numpy as np
+from scipy.linalg import expm
+from scipy.sparse import csc_matrix
+from pyIsoDep.functions import maindepletionsolver
 from pyIsoDep.functions.maindepletionsolver import MainDepletion
 from pyIsoDep.functions.generatedata import TransmutationData
 from pyIsoDep.functions.postprocessresults import Results
+from pyIsoDep.functions.batemansolvers import CramSolver, ttaSolver,\
+    krylovSolver, odeintSolver
 
 from pyIsoDep.tests.pregenerated_xs import flux, ID, N0, sig_c,\
     sig_c2m, sig_n2n, sig_n3n, sig_f, compareNt
@@ -99,6 +104,505 @@ def test_odeint_depletion():
 
     assert dep.Nt[1656, 1] == pytest.approx(compareNt[1656], rel=0.001)
 
+    # the maximal number of odeint steps is exceeded for a long time step of
+    # a chain with rates over nine decades
+    rates = np.random.default_rng(1).permutation(np.logspace(-9, 0, 200))
+    chain = np.diag(-rates) + np.diag(rates[:-1], -1)
+    with pytest.warns(Warning), pytest.raises(ValueError, match="odeint*"):
+        odeintSolver().solve(chain, np.ones(200), 1E+6)
+
+
+def test_adaptive_depletion():
+    """Test that the adaptive solver runs with and without interpolation"""
+
+    dep = MainDepletion(0.0, data)
+    dep.SetDepScenario(power=None, flux=[flux], timeUnits="seconds",
+                       timesteps=[6.630851880276299780234694480896E+05],
+                       timepoints=None)
+    dep.SetInitialComposition(ID, N0, vol=1.0)
+    dep.SolveDepletion(method="adaptive")
+    assert dep.Nt[1656, 1] == pytest.approx(compareNt[1656], rel=0.001)
+    assert dep.solverStats["nst"][0] > 0
+    assert dep.XS[:, :, 0] == pytest.approx(data.xsData)
+    Nt = dep.Nt.copy()
+
+    # identical data sets are interpolated within the step
+    dep = MainDepletion([0.0, 1E+6], data, data)
+    dep.SetDepScenario(power=None, flux=[flux], timeUnits="seconds",
+                       timesteps=[6.630851880276299780234694480896E+05],
+                       timepoints=None)
+    dep.SetInitialComposition(ID, N0, vol=1.0)
+    dep.SolveDepletion(method="adaptive", xsinterp=True)
+    assert dep.Nt == pytest.approx(Nt, rel=1E-6, abs=1E-12*Nt.max())
+
+
+def test_predictor_corrector_depletion():
+    """Test that the predictor-corrector integrators reduce the step error"""
+
+    def deplete(nsteps, integrator, power=None, flux=None):
+        dep = MainDepletion(0.0, data)
+        dep.SetDepScenario(power=power, flux=flux, timeUnits="days",
+                           timesteps=[200.0/nsteps]*nsteps)
+        dep.SetInitialComposition(ID, N0, vol=1.0)
+        dep.SolveDepletion(method="cram", sparse=True, integrator=integrator)
+        return dep.Nt[:, -1]
+
+    # the flux is constant, so all the schemes are identical
+    NtCE = deplete(2, "ce", flux=[flux]*2)
+    for integrator in ["cecm", "celi", "leqi"]:
+        assert deplete(2, integrator, flux=[flux]*2) == pytest.approx(
+            NtCE, rel=1E-10, abs=1E-12*NtCE.max())
+
+    # the flux is re-normalized to the power within the steps
+    NtRef = deplete(32, "celi", power=[3E+3]*32)
+    idx = NtRef > 1E-6*NtRef.max()
+    errCE = np.abs(deplete(4, "ce", power=[3E+3]*4)[idx]/NtRef[idx] - 1).max()
+    for integrator in ["cecm", "celi", "leqi"]:
+        Nt = deplete(4, integrator, power=[3E+3]*4)
+        assert np.abs(Nt[idx]/NtRef[idx] - 1).max() < 0.5*errCE
+
+    with pytest.raises(KeyError, match="Depletion integrator*"):
+        deplete(2, "rk4", flux=[flux]*2)
+
+
+def test_substeps_depletion(monkeypatch):
+    """Test that substeps reproduce the solution with shorter time-steps"""
+
+    def deplete(timesteps, **kwargs):
+        dep = MainDepletion(0.0, data)
+        dep.SetDepScenario(power=[3E+3]*len(timesteps), timeUnits="days",
+                           timesteps=timesteps)
+        dep.SetInitialComposition(ID, N0, vol=1.0)
+        dep.SolveDepletion(method="cram", sparse=True, **kwargs)
+        return dep
+
+    depFine = deplete([25.0]*8)
+    dep = deplete([100.0, 100.0], substeps=4)
+    assert dep.Nt[:, -1] == pytest.approx(depFine.Nt[:, -1], rel=1E-8,
+                                          abs=1E-12*dep.Nt.max())
+    assert dep.flux == pytest.approx(depFine.flux[[0, 4]])
+    assert list(dep.nsubsteps) == [4, 4]
+
+    # the substeps are doubled until the error target is met
+    dep = deplete([25.0], steptol=0.1)
+    nsub = dep.nsubsteps[0]
+    assert nsub > 1
+    NtRef = deplete([25.0], substeps=nsub//2).Nt[:, -1]
+    idx = NtRef > 1E-10*NtRef.max()
+    assert np.abs(dep.Nt[idx, -1]/NtRef[idx] - 1).max() <= 0.1
+    assert dep.Nt == pytest.approx(deplete([25.0], substeps=nsub).Nt)
+
+    # the steps that do not meet the error target are reported
+    monkeypatch.setattr(maindepletionsolver, "MAX_SUBSTEPS", 4)
+    with pytest.warns(RuntimeWarning, match="The error target*"):
+        dep = deplete([25.0, 25.0], steptol=1E-12)
+    assert list(dep.nsubsteps) == [4, 4]
+
+    with pytest.raises(TypeError, match="Number of substeps*"):
+        deplete([200.0], substeps=2.5)
+
+
+def test_sparse_cram_depletion():
+    """Test that the sparse CRAM mode reproduces the dense solution"""
+    # -------------------------------------------------------------------------
+    #                            DEPLETION
+    # -------------------------------------------------------------------------
+    dep = MainDepletion(0.0, data)
+    # define metadata (steps, flux, and so on)
+    dep.SetDepScenario(power=None, flux=[flux], timeUnits="seconds",
+                       timesteps=[6.630851880276299780234694480896E+05],
+                       timepoints=None)
+    # set initial composition
+    dep.SetInitialComposition(ID, N0, vol=1.0)
+    # solve the Bateman equations
+    dep.SolveDepletion(method="cram", sparse=True)
+
+    assert dep.Nt[1656, 1] == pytest.approx(compareNt[1656], rel=0.001)
+
+
+def test_sparse_data_depletion():
+    """Test that sparse data sets are depleted properly"""
+    # -------------------------------------------------------------------------
+    #                            DATA GENERATION
+    # -------------------------------------------------------------------------
+    spdata = TransmutationData(libraryFlag=True, wgtFY=1.0, sparse=True)
+    spdata.ReadData(ID, sig_f=sig_f, sig_c=sig_c, sig_c2m=sig_c2m,
+                    sig_n2n=sig_n2n, sig_n3n=sig_n3n, flagBarns=False)
+    assert spdata.transmutationmtx.toarray() == pytest.approx(
+        data.transmutationmtx)
+    # -------------------------------------------------------------------------
+    #                            DEPLETION
+    # -------------------------------------------------------------------------
+    for method in ["cram", "expm"]:
+        dep = MainDepletion(0.0, spdata)
+        dep.SetDepScenario(power=None, flux=[flux], timeUnits="seconds",
+                           timesteps=[6.630851880276299780234694480896E+05],
+                           timepoints=None)
+        dep.SetInitialComposition(ID, N0, vol=1.0)
+        dep.SolveDepletion(method=method)
+        assert dep.Nt[1656, 1] == pytest.approx(compareNt[1656], rel=0.001)
+
+
+def test_krylov_depletion():
+    """Test that the Krylov solver reproduces the CRAM solution"""
+
+    dep = MainDepletion(0.0, data)
+    dep.SetDepScenario(power=None, flux=[flux], timeUnits="seconds",
+                       timesteps=[6.630851880276299780234694480896E+05],
+                       timepoints=None)
+    dep.SetInitialComposition(ID, N0, vol=1.0)
+    dep.SolveDepletion(method="krylov", sparse=True)
+    assert dep.Nt[1656, 1] == pytest.approx(compareNt[1656], rel=0.001)
+    assert len(dep.solverStats["iterations"]) == 1
+    Nt = dep.Nt.copy()
+
+    dep.SolveDepletion(method="cram", sparse=True)
+    assert Nt == pytest.approx(dep.Nt, rel=1E-4, abs=1E-9*dep.Nt.max())
+    assert dep.solverStats["poles"] == [7]
+
+    with pytest.raises(ValueError, match="Krylov solver did not reach*"):
+        dep.SolveDepletion(method="krylov", sparse=True,
+                           solveropts={"maxiter": 2})
+
+
+def test_krylov_stiff_chain():
+    """Test the Krylov solver for a chain with rates over six decades"""
+
+    rng = np.random.RandomState(0)
+    lmbda = 10**rng.uniform(-3, 3, 30)
+    A = np.diag(-lmbda) + np.diag(lmbda[:-1], -1)
+    n0 = rng.rand(30)
+    for dt in [1E+03, 1E+04]:  # expm of the projection overflows
+        n1 = krylovSolver().solve(A, n0, dt)
+        assert np.isfinite(n1).all()
+        assert n1 == pytest.approx(expm(A*dt) @ n0, rel=1E-8, abs=1E-12)
+
+
+def test_stiff_depletion():
+    """Test that the BDF/Radau/LSODA solvers reproduce the CRAM solution"""
+
+    dep = MainDepletion(0.0, data)
+    dep.SetDepScenario(power=None, flux=[flux], timeUnits="seconds",
+                       timesteps=[6.630851880276299780234694480896E+05],
+                       timepoints=None)
+    dep.SetInitialComposition(ID, N0, vol=1.0)
+    dep.SolveDepletion(method="cram", sparse=True)
+    Nt = dep.Nt.copy()
+    for integrator in ["BDF", "Radau", "LSODA"]:
+        dep.SolveDepletion(method="stiff", sparse=True, rtol=1E-8,
+                           solveropts={"integrator": integrator})
+        assert dep.Nt[1656, 1] == pytest.approx(compareNt[1656], rel=0.001)
+        assert dep.Nt == pytest.approx(Nt, rel=1E-4, abs=1E-9*Nt.max())
+        assert dep.solverStats["nlu"][0] > 0
+    with pytest.raises(KeyError, match="Stiff integrator*"):
+        dep.SolveDepletion(method="stiff", solveropts={"integrator": "RK45"})
+
+
+def test_cram_factorization_cache():
+    """Test that cached CRAM factorizations reproduce the direct solution"""
+
+    dep = MainDepletion(0.0, data)
+    dep.SetDepScenario(power=None, flux=[flux]*4, timeUnits="days",
+                       timesteps=[10.0, 10.0, 10.0, 5.0], timepoints=None)
+    dep.SetInitialComposition(ID, N0, vol=1.0)
+    dep.SolveDecay(method="cram", sparse=True, solveropts={"cachesize": 0})
+    Nt0 = dep.Nt.copy()
+    dep.SolveDecay(method="cram", sparse=True, solveropts={"cachesize": 1})
+    assert dep.Nt == pytest.approx(Nt0, rel=1E-12, abs=1E-30)
+
+    solver = CramSolver(cachesize=1)
+    mtxA = data.decaymtx
+    n1 = solver.solve(mtxA, dep.N0, 3600.)
+    factors = solver._factors[(id(mtxA), 3600., 14)][1]
+    assert solver.solve(mtxA, dep.N0, 3600.) == pytest.approx(n1)
+    assert solver._factors[(id(mtxA), 3600., 14)][1] is factors
+    solver.solve(mtxA, dep.N0, 7200.)
+    assert list(solver._factors) == [(id(mtxA), 7200., 14)]
+
+    # by default only the factorizations of sparse matrices are cached
+    solver = CramSolver()
+    solver.solve(mtxA, dep.N0, 3600.)
+    assert not solver._factors
+    solver.solve(csc_matrix(mtxA), dep.N0, 3600.)
+    assert len(solver._factors) == 1
+
+
+def test_cram_threads():
+    """Test that the poles solved with threads give identical results"""
+
+    dep = MainDepletion(0.0, data)
+    dep.SetDepScenario(power=None, flux=[flux]*2, timeUnits="days",
+                       timesteps=[10.0, 10.0], timepoints=None)
+    dep.SetInitialComposition(ID, N0, vol=1.0)
+    for sparse in [True, False]:
+        dep.SolveDepletion(method="cram", sparse=sparse)
+        Nt0 = dep.Nt.copy()
+        dep.SolveDepletion(method="cram", sparse=sparse,
+                           solveropts={"nthreads": 4})
+        assert np.array_equal(dep.Nt, Nt0)
+
+    # several matrices solved in a single pass, also in the IPF form
+    n0 = dep.Nt[:, 0]
+    matrices = [csc_matrix(data.decaymtx + f*data.transmutationmtx)
+                for f in [flux, 2*flux]]
+    for order in [14, 16]:
+        solver = CramSolver(nthreads=4, order=order)
+        nts = solver.solveMany(matrices, [n0, n0], 8.64E+5)
+        for mtxA, nt in zip(matrices, nts):
+            assert np.array_equal(
+                nt, CramSolver(order=order).solve(mtxA, n0, 8.64E+5))
+
+    with pytest.raises(ValueError, match="Number of threads*"):
+        CramSolver(nthreads=0)
+
+
+def test_cram_orders():
+    """Test the CRAM orders and the fast order for short steps"""
+
+    dep = MainDepletion(0.0, data)
+    dep.SetDepScenario(power=None, flux=[flux]*2, timeUnits="seconds",
+                       timesteps=[60.0, 6.630851880276299780234694480896E+05],
+                       timepoints=None)
+    dep.SetInitialComposition(ID, N0, vol=1.0)
+    dep.SolveDepletion(method="cram", sparse=True,
+                       solveropts={"order": 48})
+    Nt48 = dep.Nt.copy()
+    assert Nt48[1656, 2] == pytest.approx(compareNt[1656], rel=0.001)
+    atol = 1E-12 * N0.max()
+    for order in [14, 16]:
+        dep.SolveDepletion(method="cram", sparse=True,
+                           solveropts={"order": order})
+        assert dep.Nt == pytest.approx(Nt48, rel=1E-8, abs=atol)
+
+    # the first (short) step is solved with the fast order
+    dep.SolveDepletion(method="cram", sparse=True,
+                       solveropts={"order": 48, "fastorder": 8,
+                                   "fastdt": 60.0})
+    assert dep.Nt[:, 1] == pytest.approx(Nt48[:, 1], rel=1E-6,
+                                         abs=1E-7*N0.max())
+    assert not np.array_equal(dep.Nt[:, 1], Nt48[:, 1])
+
+    with pytest.raises(KeyError, match="Order of CRAM*"):
+        CramSolver(order=12)
+
+
+def test_tta_depletion():
+    """Test the TTA solver against expm for a simple xenon chain"""
+
+    xeID = [531350, 541350, 611490, 621490, 922350, 922380]
+    xeData = TransmutationData(libraryFlag=True, wgtFY=1.0)
+    xeData.ReadData(xeID, sig_f=[0.0, 0.0, 0.0, 0.0, 97., 3.8],
+                    sig_c=[6.8, 250537.62, 132.47, 6968.75, 5.0, 8.0],
+                    fymtx=[[0, 0, 0, 0, 0.06306, 0.06306],
+                           [0, 0, 0, 0, 0.00248, 0.00248],
+                           [0, 0, 0, 0, 0.01100, 0.01100],
+                           [0]*6, [0]*6, [0]*6],
+                    EfissMeV=[0.0, 0.0, 0.0, 0.0, 202.44, 202.44])
+    xeData.Condense(xeID)
+    xeN0 = [0.0, 0.0, 0.0, 0.0, 6.43230E-04, 2.58062E-03]
+    timepoints = np.linspace(0, 48.0, 5)
+    power = 330000000.*np.ones(len(timepoints)-1)
+
+    Nt = {}
+    for method in ["expm", "tta"]:
+        dep = MainDepletion(0.0, xeData)
+        dep.SetDepScenario(power=power, timeUnits="hours",
+                           timepoints=timepoints)
+        dep.SetInitialComposition(xeID, xeN0, vol=332097.750)
+        dep.SolveDepletion(method=method)
+        Nt[method] = dep.Nt
+    assert Nt["tta"] == pytest.approx(Nt["expm"], rel=1E-10,
+                                      abs=1E-12*max(xeN0))
+
+    # decay chain 1 -> 2 -> 3 and the analytic (Bateman) solution
+    lmbda1, lmbda2, dt = 1E-4, 3E-5, 3600.0
+    A = np.array([[-lmbda1, 0.0, 0.0],
+                  [lmbda1, -lmbda2, 0.0],
+                  [0.0, lmbda2, 0.0]])
+    n0 = np.array([1.0, 0.0, 0.0])
+    n2 = lmbda1 / (lmbda2 - lmbda1) *\
+        (np.exp(-lmbda1*dt) - np.exp(-lmbda2*dt))
+    tta = ttaSolver()
+    y1 = tta.solve(A, n0, dt)
+    assert y1 == pytest.approx([np.exp(-lmbda1*dt), n2,
+                                1.0 - np.exp(-lmbda1*dt) - n2], rel=1E-12)
+    # the propagator columns are kept for repeated steps
+    y2 = tta.solve(A, n0, dt)
+    assert tta.stats["chains"][0] > 0
+    assert tta.stats["chains"][1] == 0
+    assert np.array_equal(y1, y2)
+
+    with pytest.raises(ValueError, match="Cutoff of the TTA*"):
+        ttaSolver(cutoff=-1E-10)
+    with pytest.raises(ValueError, match="TTA solver followed*"):
+        ttaSolver(maxchains=1).solve(A, n0, dt)
+    with pytest.raises(ValueError, match="TTA solver is meant*"):
+        ttaSolver(maxnuclides=2).solve(A, n0, dt)
+
+
+def test_auto_depletion():
+    """Test the solvers selected by the auto method"""
+
+    dep = MainDepletion(0.0, data)
+    dep.SetDepScenario(power=None, flux=[flux]*2, timeUnits="seconds",
+                       timesteps=[60.0, 6.630851880276299780234694480896E+05],
+                       timepoints=None)
+    dep.SetInitialComposition(ID, N0, vol=1.0)
+    dep.SolveDepletion(method="auto", rtol=1E-10)
+    assert dep.stepSolvers == ["cram14", "cram14"]
+    assert dep.Nt[1656, 2] == pytest.approx(compareNt[1656], rel=0.001)
+    dep.SolveDepletion(method="auto", rtol=1E-14)
+    assert dep.stepSolvers == ["cram16", "cram16"]
+    dep.SolveDepletion(method="auto", solveropts={"densesize": 2000})
+    assert dep.stepSolvers == ["expm", "expm"]
+    dep.SolveDecay(method="auto")
+    assert dep.stepSolvers == ["cram14", "cram14"]
+    assert dep.solverStats["solver"] == ["cram14", "cram14"]
+    dep.SolveDepletion(method="cram")
+    assert dep.stepSolvers == ["cram", "cram"]
+
+
+def test_profile(tmp_path):
+    """Test the timings and solver counters of the depletion steps"""
+
+    dep = MainDepletion(0.0, data)
+    dep.SetDepScenario(power=None, flux=[flux]*2, timeUnits="seconds",
+                       timesteps=[3600.0, 3600.0], timepoints=None)
+    dep.SetInitialComposition(ID, N0, vol=1.0)
+    dep.SolveDepletion(method="cram", sparse=True)
+    dep.DecayHeat()
+    profile = dep.profile
+    for stage in ["xs", "normalization", "solver"]:
+        assert (profile.timings[stage] > 0.0).all()
+    # the matrix of the second step is the same (cached factorizations)
+    assert profile.timings["matrix"][0] > 0.0
+    assert profile.timings["matrix"][1] == 0.0
+    assert list(profile.counters["poles"]) == [7, 7]
+    assert list(profile.counters["factorizations"]) == [7, 0]
+    assert profile.counters["nnzLU"][0] >= profile.counters["nnzH"][0]
+    assert profile.fill()[0] >= 1.0 and profile.fill()[1] == 0.0
+    assert "DecayHeat" in profile.summary()
+
+    res = Results(dep)
+    res.export(str(tmp_path / "profile.h5"), includeXS=False)
+    res = Results(str(tmp_path / "profile.h5"), includeXS=False)
+    for key in ["timings", "counters"]:
+        for name, vals in getattr(profile, key).items():
+            assert np.array_equal(getattr(res.profile, key)[name], vals)
+    assert res.profile.postprocess == profile.postprocess
+
+    dep.SolveDepletion(method="odeint", integrator="cecm")
+    assert (dep.profile.counters["nfe"] > 0).all()
+    with pytest.raises(KeyError, match="The solver did not*"):
+        dep.profile.fill()
+    # the adaptive solver times the interpolation within the steps as solver
+    dep.SolveDepletion(method="adaptive")
+    assert (dep.profile.timings["solver"] > 0.0).all()
+    assert (dep.profile.timings["matrix"] == 0.0).all()
+
+
+def test_postprocess():
+    """Test the fused post-processing against the separate methods"""
+
+    dep = MainDepletion(0.0, data)
+    dep.SetDepScenario(power=None, flux=[flux, flux], timeUnits="days",
+                       timesteps=[5.0, 5.0], timepoints=None)
+    dep.SetInitialComposition(ID, N0, vol=2.0)
+    dep.SolveDepletion(method="cram")
+    dep.DecayHeat()
+    dep.Radiotoxicity()
+    dep.Activity()
+    dep.Mass()
+    attrs = ["At", "Qt", "AtCurie", "toxicityIngestion", "toxicityInhalation",
+             "massgr"]
+    totals = ["totalQt", "totalAtCurie", "totalToxIngestion",
+              "totalToxInhalation", "totalMassgr"]
+    ref = {attr: getattr(dep, attr) for attr in attrs + totals}
+    assert ref["Qt"] == pytest.approx(
+        2.0*dep.Q[:, None]*dep.lmbda[:, None]*dep.Nt*1E+24)
+    assert ref["massgr"] == pytest.approx(
+        2.0*dep.AW[:, None]*dep.Nt/0.602214199)
+
+    dep = MainDepletion(0.0, data)
+    dep.SetDepScenario(power=None, flux=[flux, flux], timeUnits="days",
+                       timesteps=[5.0, 5.0], timepoints=None)
+    dep.SetInitialComposition(ID, N0, vol=2.0)
+    dep.SolveDepletion(method="cram")
+    dep.PostProcess(["DecayHeat", "Mass"], totalsOnly=True)
+    assert dep.totalQt == pytest.approx(ref["totalQt"], rel=1E-12)
+    assert dep.totalMassgr == pytest.approx(ref["totalMassgr"], rel=1E-12)
+    assert not hasattr(dep, "Qt") and not hasattr(dep, "totalAtCurie")
+    dep.PostProcess()
+    for attr in attrs + totals:
+        assert getattr(dep, attr) == pytest.approx(ref[attr], rel=1E-12)
+    assert "PostProcess" in dep.profile.postprocess
+    with pytest.raises(KeyError, match="Post-processing method*"):
+        dep.PostProcess(["Reactivity"])
+
+
+def test_reactivity():
+    """Test the reactivity worth against a per-isotope evaluation"""
+
+    dep = MainDepletion(0.0, data)
+    dep.SetDepScenario(power=None, flux=[flux, flux], timeUnits="days",
+                       timesteps=[5.0, 5.0], timepoints=None)
+    dep.SetInitialComposition(ID, N0, vol=1.0)
+    dep.SolveDepletion(method="cram")
+    dep.Reactivity(nonLeakageP=0.9)
+
+    # first order perturbation of keff for each isotope j and step i
+    sigA = dep.XS[:, 1, :]
+    nuSigF = dep.nu[:, None] * dep.XS[:, 2, :]
+    for i in range(dep.nsteps):
+        nsf = (dep.Nt[:, i]*nuSigF[:, i]).sum()
+        sa = (dep.Nt[:, i]*sigA[:, i]).sum()
+        keff = nsf / sa
+        assert dep.keff[i] == pytest.approx(0.9*keff, rel=1E-12)
+        assert dep.Rho[i] == pytest.approx(1E+05*(1 - 1/(0.9*keff)))
+        for j in np.argsort(dep.Nt[:, i])[-20:]:
+            dkeff = (nuSigF[j, i]*sa - sigA[j, i]*nsf) / sa**2
+            dRho = 1E+05*(1/keff - 1/(keff + dkeff*dep.Nt[j, i]))
+            assert dep.dRho[j, i] == pytest.approx(dRho, rel=1E-8)
+            assert dep.dRhoToRho[j, i] == pytest.approx(
+                dRho / (1E+05*(1 - 1/keff)), rel=1E-8)
+
+    # worth of a subset of the isotopes
+    dRho = dep.dRho.copy()
+    subset = [922350, 942390, 541350]
+    dep.Reactivity(nonLeakageP=0.9, isotopes=subset)
+    rows = np.isin(dep.fullId, subset)
+    assert dep.dRho[rows] == pytest.approx(dRho[rows], rel=1E-12)
+    assert not dep.dRho[~rows].any()
+    with pytest.raises(KeyError, match="Isotopes*"):
+        dep.Reactivity(isotopes=[922350, 10])
+
+
+def test_xs_history(tmp_path):
+    """Test the interpolated cross sections stored as references"""
+
+    data2 = TransmutationData(libraryFlag=True, wgtFY=1.0)
+    data2.ReadData(ID, sig_f=1.1*sig_f, sig_c=1.1*sig_c, sig_c2m=sig_c2m,
+                   sig_n2n=sig_n2n, sig_n3n=sig_n3n, flagBarns=False)
+    dep = MainDepletion([0.0, 20.0], data, data2)
+    dep.SetDepScenario(power=None, flux=[flux]*4, timeUnits="days",
+                       timesteps=[5.0]*4, timepoints=None)
+    dep.SetInitialComposition(ID, N0, vol=1.0)
+    dep.SolveDepletion(method="cram", xsinterp=True)
+    assert dep.XS.frames.shape == (2, 5) and dep.XS.weights.shape == (5,)
+    for idx, wgt in enumerate([0.0, 0.25, 0.5, 0.75]):
+        xsTable = (1-wgt)*data.xsData + wgt*data2.xsData
+        assert dep.XS[:, 1:, idx] == pytest.approx(xsTable[:, 1:], rel=1E-12)
+        assert dep.XS[:, 0, idx] == pytest.approx(data.xsData[:, 0])
+    assert np.asarray(dep.XS)[:, :, 1] == pytest.approx(dep.XS[:, :, 1])
+    assert not dep.XS[:, :, -1].any()  # not used for depletion
+    dep.Reactivity()
+    assert np.isfinite(dep.keff).all()
+
+    # the history is exported and recovered with the xs libaries
+    Results(dep).export(str(tmp_path / "results.h5"))
+    res = Results(str(tmp_path / "results.h5"))
+    assert np.asarray(res.XS) == pytest.approx(np.asarray(dep.XS))
+
 
 def test_badMainDepletion():
     """Errors for the main depletion definitions"""
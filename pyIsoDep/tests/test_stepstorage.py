@@ -0,0 +1,125 @@
+"""test_stepstorage
+
+Tests that the concentrations streamed to the HDF5 storage are identical to
+the ones kept in memory, and that the results are read lazily from the
+exported files.
+
+"""
+
+import pytest
+import numpy as np
+import h5py
+from pyIsoDep.functions.maindepletionsolver import MainDepletion
+from pyIsoDep.functions.generatedata import TransmutationData
+from pyIsoDep.functions.postprocessresults import Results
+from pyIsoDep.functions import stepstorage
+from pyIsoDep.functions.stepstorage import StepStorage, StepArray
+from pyIsoDep.functions.xshistory import XsHistory
+
+from pyIsoDep.tests.pregenerated_xs import ID, N0, sig_c,\
+    sig_c2m, sig_n2n, sig_n3n, sig_f
+
+
+# -----------------------------------------------------------------------------
+#                            DATA GENERATION
+# -----------------------------------------------------------------------------
+data = TransmutationData(libraryFlag=True, wgtFY=1.0)
+data.ReadData(ID, sig_f=sig_f, sig_c=sig_c, sig_c2m=sig_c2m,
+              sig_n2n=sig_n2n, sig_n3n=sig_n3n, flagBarns=False)
+
+
+def _depletion(**kwargs):
+    """Five depletion steps with a constant power"""
+    dep = MainDepletion(0.0, data)
+    dep.SetDepScenario(power=[1E+04]*5, timeUnits="days",
+                       timesteps=[10.0]*5)
+    dep.SetInitialComposition(ID, N0, vol=2.0)
+    dep.SolveDepletion(method="cram", **kwargs)
+    return dep
+
+
+def test_step_array(tmp_path):
+    """Test the window and the reading of the stored time points"""
+
+    storage = StepStorage(str(tmp_path / "steps.h5"), window=3)
+    values = np.random.default_rng(1).random((5, 4, 10))
+    array = storage.create("values", values.shape)
+    for idx in range(10):
+        array[:, :, idx] = values[:, :, idx]
+        assert array[..., idx] == pytest.approx(values[..., idx])
+        assert array._written.sum() == idx % 3 + 1  # only the window
+    assert np.asarray(array) == pytest.approx(values)
+    assert array[[3, 1, 3], 2, :] == pytest.approx(values[[3, 1, 3], 2, :])
+    assert array[:, 0, -1] == pytest.approx(values[:, 0, -1])
+    blocks = [block for _, block in array.blocks(4)]
+    assert [block.shape[-1] for block in blocks] == [4, 4, 2]
+    array[1, 2, 5] = 7.0  # values of a part of a time point
+    assert array[:, :, 5] == pytest.approx(
+        np.where(np.arange(5)[:, None] == 1,
+                 np.where(np.arange(4) == 2, 7.0, values[:, :, 5]),
+                 values[:, :, 5]))
+    with pytest.raises(IndexError, match="Values must be written*"):
+        array[:, :, 1:3] = 0.0
+    with pytest.raises(IndexError, match="Time point*"):
+        array[:, :, 10]
+    storage.close()
+
+
+def test_storage_depletion(tmp_path, monkeypatch):
+    """Test the depletion with the HDF5 storage of Nt"""
+
+    ref = _depletion()
+    ref.PostProcess(["DecayHeat", "Mass"])
+    filename = str(tmp_path / "steps.h5")
+    # chunks of a single time point, i.e. blocks of the two points of window
+    monkeypatch.setattr(stepstorage, "STORAGE_CHUNK_BYTES", 1)
+    dep = _depletion(storage=filename, window=2)
+    assert isinstance(dep.Nt, StepArray) and isinstance(dep.XS, XsHistory)
+    assert list(dep.storage.file) == ["Nt"]
+    assert dep.Nt[:, :] == pytest.approx(ref.Nt, rel=1E-14)
+    assert np.asarray(dep.XS) == pytest.approx(np.asarray(ref.XS))
+    assert dep.flux == pytest.approx(ref.flux, rel=1E-14)
+    dep.PostProcess(["DecayHeat", "Mass"], totalsOnly=True)
+    assert dep.totalQt == pytest.approx(ref.totalQt, rel=1E-12)
+    assert dep.totalMassgr == pytest.approx(ref.totalMassgr, rel=1E-12)
+    # the isotopic values are written block by block to the file
+    dep.DecayHeat()
+    dep.DecayHeat()  # the datasets are overwritten
+    assert isinstance(dep.Qt, StepArray) and isinstance(dep.At, StepArray)
+    assert sorted(dep.storage.file) == ["At", "Nt", "Qt"]
+    assert dep.Qt[:, :] == pytest.approx(ref.Qt, rel=1E-12)
+    assert dep.totalQt == pytest.approx(ref.totalQt, rel=1E-12)
+    dep.Reactivity(isotopes=[922350, 942390])
+    ref.Reactivity(isotopes=[922350, 942390])
+    assert isinstance(dep.dRho, StepArray) and dep.dRho.shape == (
+        ref.nIsotopes, 5)
+    assert dep.dRho[:, :] == pytest.approx(ref.dRho, rel=1E-12)
+    assert dep.keff == pytest.approx(ref.keff, rel=1E-12)
+
+    # the results are exported and read lazily
+    Results(dep).export(str(tmp_path / "results.h5"))
+    with Results(str(tmp_path / "results.h5"), lazy=True) as res:
+        assert isinstance(res.Nt, StepArray) and isinstance(res.Qt, StepArray)
+        assert res.getvalues("Nt", [922350, 541350]) == pytest.approx(
+            ref.Nt[[np.where(ref.fullId == 922350)[0][0],
+                    np.where(ref.fullId == 541350)[0][0]]])
+        assert res.totalQt == pytest.approx(ref.totalQt, rel=1E-12)
+        resfile = res._file
+    assert not resfile and res._file is None  # closed by the with block
+    res.close()
+
+    # the file is closed if the recovery fails
+    def failed(self, group):
+        raise RuntimeError("profile")
+    monkeypatch.setattr(Results, "_Results__buildProfile", failed)
+    with pytest.raises(RuntimeError, match="profile"):
+        Results(str(tmp_path / "results.h5"))
+    h5py.File(str(tmp_path / "results.h5"), "w").close()
+
+    # the decay results are stored in a new file
+    storage = dep.storage
+    dep.SolveDecay("cram", storage=str(tmp_path / "decay.h5"), window=3)
+    ref.SolveDecay("cram")
+    assert not storage.file  # the previous file is closed
+    assert list(dep.storage.file) == ["Nt"]
+    assert dep.Nt[:, :] == pytest.approx(ref.Nt, rel=1E-14)
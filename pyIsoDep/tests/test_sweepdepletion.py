@@ -0,0 +1,69 @@
+"""test_sweepdepletion
+
+Tests that the cases of a scenario sweep solved in worker processes
+reproduce the results of individual ``MainDepletion`` calculations.
+
+"""
+
+import pytest
+import numpy as np
+from pyIsoDep.functions.maindepletionsolver import MainDepletion
+from pyIsoDep.functions.sweepdepletion import SweepDepletion
+from pyIsoDep.functions.generatedata import TransmutationData
+
+from pyIsoDep.tests.pregenerated_xs import ID, N0, sig_c,\
+    sig_c2m, sig_n2n, sig_n3n, sig_f
+
+
+# -----------------------------------------------------------------------------
+#                            DATA GENERATION
+# -----------------------------------------------------------------------------
+data = TransmutationData(libraryFlag=True, wgtFY=1.0, sparse=True)
+data.ReadData(ID, sig_f=sig_f, sig_c=sig_c, sig_c2m=sig_c2m,
+              sig_n2n=sig_n2n, sig_n3n=sig_n3n, flagBarns=False)
+
+POWER = [[1E+6, 2E+6], [5E+5], [3E+6, 1E+6]]
+TIMESTEPS = [[5.0, 10.0], [20.0]]
+COMPOSITIONS = [N0, 0.5*N0]
+
+
+@pytest.mark.parametrize("nworkers", [0, 2])
+def test_sweep_depletion(nworkers):
+    """Cases solved in the sweep and individually are identical"""
+
+    sweep = SweepDepletion(0.0, data, nworkers=nworkers)
+    sweep.SetGrid(ID, COMPOSITIONS, TIMESTEPS, power=POWER, timeUnits="days")
+    assert len(sweep.cases) == 6
+    results = sweep.Run(method="cram", sparse=True, postprocess=["DecayHeat"])
+
+    for case, res in zip(sweep.cases, results):
+        dep = MainDepletion(0.0, data)
+        dep.SetDepScenario(power=case["power"], timeUnits="days",
+                           timesteps=case["timesteps"])
+        dep.SetInitialComposition(ID, case["N0"])
+        dep.SolveDepletion(method="cram", sparse=True)
+        dep.DecayHeat()
+        assert res.Nt == pytest.approx(dep.Nt, rel=1E-12, abs=1E-30)
+        assert res.totalQt == pytest.approx(dep.totalQt, rel=1E-12)
+        # data sets are re-attached from the current process
+        assert res.decaymtx is data.decaymtx
+        assert res._xsDataSets[0.0] is data
+        assert res.getvalues("Nt", [922350])[0] == pytest.approx(
+            dep.Nt[dep.fullId == 922350, :][0])
+
+
+def test_badSweepDepletion():
+    """Errors for the sweep definitions"""
+
+    sweep = SweepDepletion(0.0, data, nworkers=0)
+    with pytest.raises(ValueError, match="No cases*"):
+        sweep.Run()
+    with pytest.raises(ValueError, match="Either power or flux*"):
+        sweep.SetGrid(ID, COMPOSITIONS, TIMESTEPS)
+    with pytest.raises(ValueError, match="None of the power*"):
+        sweep.SetGrid(ID, COMPOSITIONS, [[1.0, 1.0, 1.0]], power=POWER)
+    sweep.AddCase(ID, N0, power=[1E+6], timesteps=[1.0])
+    with pytest.raises(KeyError, match="Post-processing*"):
+        sweep.Run(postprocess=["Nt"])
+    with pytest.raises(TypeError, match="Number of workers*"):
+        SweepDepletion(0.0, data, nworkers=1.5)